@@ -0,0 +1,399 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Scaling benchmark of the hot paths of solph.
+
+A synthetic energy system is generated for a given number of electricity
+buses, transformers, CHPs, storages, sources, sinks, transports and
+timesteps. The phases
+
+    entities            construction of the entities
+    build               OptimizationModel (standard or fast build)
+    write_lp            writing the problem file
+    solve               solving with the given solver
+    results             om.results()
+    results_dataframe   outputlib.ResultsDataFrame
+
+are timed separately. Every run is appended as one JSON object per line to
+the output file (default: stdout), together with the parameters, the
+commit of the working tree and the build statistics of the model, so the
+timings can be compared across commits.
+
+With `--csv` the loading of a synthetic data set of csv files with
+:func:`entities_from_csv <oemof.tools.entities_from_csv.entities_from_csv>`
+is timed instead (phase `load_csv`, by default 50000 entities with 10000
+time series).
+
+Usage:
+
+    python3 benchmarks/scaling.py --preset storage_invest --timesteps 8760
+    python3 benchmarks/scaling.py --buses 10 --transformers 20 --storages 5 \\
+        --sources 20 --sinks 10 --transports 10 --timesteps 168 \\
+        --fast-build both --output bench.jsonl
+    python3 benchmarks/scaling.py --csv --timesteps 8760
+
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from oemof.core import energy_system as es
+from oemof.core.network.entities import Bus
+from oemof.core.network.entities.components import sinks as sink
+from oemof.core.network.entities.components import sources as source
+from oemof.core.network.entities.components import transformers as transformer
+from oemof.core.network.entities.components import transports as transport
+from oemof.outputlib import to_pandas as tpd
+from oemof.solph import optimization_model as om
+from oemof.solph import predefined_objectives as predefined_objectives
+from oemof.tools.entities_from_csv import entities_from_csv
+
+
+# seed topologies of the examples
+PRESETS = {
+    # examples/storage_optimization/storage_invest.py
+    'storage_invest': dict(buses=1, transformers=1, chps=0, storages=1,
+                           sources=2, sinks=1, transports=0),
+    # examples/development_examples/two_regions_example_opt.py
+    'two_regions': dict(buses=2, transformers=4, chps=2, storages=0,
+                        sources=4, sinks=2, transports=2),
+}
+
+PHASES = ['entities', 'build', 'write_lp', 'solve', 'results',
+          'results_dataframe']
+
+# data set of the csv loader: 50000 entities, the sources and sinks with
+# one time series each
+CSV_PRESET = dict(buses=10000, transformers=30000, sources=5000,
+                  sinks=5000)
+
+
+def profiles(timesteps, rng):
+    r"""Returns synthetic hourly profiles (demand, wind, pv) with values in
+    [0, 1].
+
+    Parameters
+    ----------
+    timesteps : int
+    rng : numpy.random.RandomState
+    """
+    hours = np.arange(timesteps)
+    daily = np.sin(2 * np.pi * (hours % 24 - 6) / 24)
+    demand = 0.6 + 0.3 * daily + 0.05 * rng.standard_normal(timesteps)
+    wind = np.clip(0.4 + np.cumsum(rng.standard_normal(timesteps)) * 0.02 +
+                   0.1 * rng.standard_normal(timesteps), 0, 1)
+    pv = np.clip(daily, 0, None) * rng.uniform(0.5, 1, timesteps)
+    return np.clip(demand, 0, 1), wind, pv
+
+
+def energysystem(buses=1, transformers=1, chps=0, storages=0, sources=1,
+                 sinks=1, transports=0, timesteps=24, fast_build=False,
+                 seed=0):
+    r"""Creates a synthetic energy system.
+
+    All components are distributed round-robin over `buses` electricity
+    buses. Transformers and CHPs take gas from one gas bus fed by a
+    commodity source, CHPs feed a heat bus next to their electricity bus.
+    Sources alternate between wind and pv, transports connect neighbouring
+    electricity buses in a ring.
+
+    Parameters
+    ----------
+    buses, transformers, chps, storages, sources, sinks, transports : int
+        Number of the entities of every kind.
+    timesteps : int
+        Number of hourly timesteps.
+    fast_build : boolean
+        `fast_build` of the simulation.
+    seed : int
+        Seed of the synthetic profiles and parameters.
+
+    Returns
+    -------
+    :class:`EnergySystem <oemof.core.energy_system.EnergySystem>`
+    """
+    rng = np.random.RandomState(seed)
+    time_index = pd.date_range('1/1/2012', periods=timesteps, freq='H')
+    simulation = es.Simulation(
+        timesteps=range(timesteps), solver='glpk', fast_build=fast_build,
+        objective_options={'function': predefined_objectives.minimize_cost})
+    energysystem = es.EnergySystem(time_idx=time_index, simulation=simulation)
+
+    bgas = Bus(uid="bgas", type="gas", price=70, balanced=True, excess=False)
+    source.Commodity(uid="rgas", outputs=[bgas], sum_out_limit=10e10)
+    bel = [Bus(uid="bel_{0}".format(b), type="el", excess=True,
+               shortage=True, shortage_costs=10e4) for b in range(buses)]
+    bth = {}
+
+    def heat_bus(b):
+        if b not in bth:
+            bth[b] = Bus(uid="bth_{0}".format(b), type="th", excess=True)
+        return bth[b]
+
+    demand, wind, pv = profiles(timesteps, rng)
+    for k in range(sinks):
+        sink.Simple(uid="demand_{0}".format(k), inputs=[bel[k % buses]],
+                    val=(demand * rng.uniform(50, 150)).tolist())
+    for k in range(sources):
+        source.FixedSource(uid="res_{0}".format(k), outputs=[bel[k % buses]],
+                           val=(wind if k % 2 == 0 else pv).tolist(),
+                           out_max=[rng.uniform(20, 100)])
+    for k in range(transformers):
+        transformer.Simple(uid="pp_{0}".format(k), inputs=[bgas],
+                           outputs=[bel[k % buses]],
+                           opex_var=rng.uniform(10, 60),
+                           out_max=[rng.uniform(50, 200)],
+                           eta=[rng.uniform(0.35, 0.6)])
+    for k in range(chps):
+        transformer.CHP(uid="chp_{0}".format(k), inputs=[bgas],
+                        outputs=[bel[k % buses], heat_bus(k % buses)],
+                        opex_var=rng.uniform(10, 40),
+                        out_max=[rng.uniform(20, 60), rng.uniform(20, 60)],
+                        eta=[0.4, 0.45])
+    for k in range(storages):
+        transformer.Storage(uid="storage_{0}".format(k),
+                            inputs=[bel[k % buses]],
+                            outputs=[bel[k % buses]],
+                            eta_in=0.9, eta_out=0.9, cap_loss=0.001,
+                            cap_max=rng.uniform(100, 500), cap_min=0,
+                            cap_initial=0, c_rate_in=1/6, c_rate_out=1/6,
+                            opex_var=1)
+    for k in range(transports):
+        transport.Simple(uid="line_{0}".format(k), inputs=[bel[k % buses]],
+                         outputs=[bel[(k + 1) % buses]], out_max=[100],
+                         in_max=[100], eta=[0.97])
+    return energysystem
+
+
+def write_csv(directory, buses=1, transformers=1, sources=1, sinks=1,
+              timesteps=24, seed=0):
+    r"""Writes a synthetic data set for :func:`entities_from_csv
+    <oemof.tools.entities_from_csv.entities_from_csv>`: electricity buses
+    fed by simple transformers from one gas bus, fixed sources and simple
+    sinks with one time series each.
+
+    Returns
+    -------
+    dict
+        The paths of the files (argument `files` of `entities_from_csv`).
+    """
+    rng = np.random.RandomState(seed)
+    demand, wind, pv = profiles(timesteps, rng)
+    bus = ["bel_{0}".format(k % buses)
+           for k in range(max(buses, transformers, sources, sinks))]
+    tables = {
+        'busses': pd.DataFrame({
+            'uid': ['bgas'] + bus[:buses],
+            'type': ['gas'] + ['el'] * buses,
+            'price': [70] + [0] * buses,
+            'timeseries': False}),
+        'transformers': pd.DataFrame({
+            'uid': ["pp_{0}".format(k) for k in range(transformers)],
+            'class': 'Simple', 'input': 'bgas', 'output': bus[:transformers],
+            'eta': rng.uniform(0.35, 0.6, transformers),
+            'out_max': rng.uniform(50, 200, transformers), 'skip': False}),
+        'sources': pd.DataFrame({
+            'uid': ["res_{0}".format(k) for k in range(sources)],
+            'class': 'FixedSource', 'output': bus[:sources],
+            'out_max': rng.uniform(20, 100, sources)}),
+        'sinks': pd.DataFrame({
+            'uid': ["demand_{0}".format(k) for k in range(sinks)],
+            'class': 'Simple', 'input': bus[:sinks]})}
+    # one column per source and sink, scaled and shifted profiles
+    tables['sourcevalues'] = pd.DataFrame(
+        np.column_stack([np.roll(wind if k % 2 == 0 else pv, k % 24)
+                         for k in range(sources)]),
+        columns=tables['sources']['uid'])
+    tables['sinkvalues'] = pd.DataFrame(
+        np.outer(demand, rng.uniform(50, 150, sinks)),
+        columns=tables['sinks']['uid'])
+    files = {}
+    for key, table in tables.items():
+        files[key] = os.path.join(directory, key + '.csv')
+        table.to_csv(files[key], index=False)
+    return files
+
+
+def run_csv(parameters, seed=0):
+    r"""Writes a data set with :func:`write_csv` and times loading it with
+    `entities_from_csv` (phase `load_csv`).
+
+    Parameters
+    ----------
+    parameters : dict
+        Numbers of buses, transformers, sources and sinks and timesteps
+        (arguments of :func:`write_csv`).
+    seed : int
+
+    Returns
+    -------
+    dict
+        The record of the run.
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        files = write_csv(tmpdir, seed=seed, **parameters)
+        es.EnergySystem()
+        start = time.perf_counter()
+        entities = entities_from_csv(files)['entities']
+        timings = {'load_csv': time.perf_counter() - start}
+        logging.info("load_csv: {0:.3f} s".format(timings['load_csv']))
+    finally:
+        shutil.rmtree(tmpdir)
+    return {'date': datetime.datetime.now().isoformat(),
+            'commit': commit(),
+            'python': platform.python_version(),
+            'parameters': dict(parameters, entities=len(entities),
+                               seed=seed),
+            'timings': timings}
+
+
+def commit():
+    """Returns the commit of the working tree (None outside of git)."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(parameters, fast_build=False, solver='glpk', phases=PHASES,
+        problem_writer='pyomo', seed=0):
+    r"""Runs and times the phases for one energy system.
+
+    Parameters
+    ----------
+    parameters : dict
+        Numbers of entities and timesteps (arguments of
+        :func:`energysystem`).
+    fast_build : boolean
+    solver : string
+    phases : list
+        Phases to run, 'entities' and 'build' are always run. 'results' and
+        'results_dataframe' require 'solve'.
+    problem_writer : string
+        'pyomo' or 'oemof', used for 'write_lp' and 'solve'.
+    seed : int
+
+    Returns
+    -------
+    dict
+        The record of the run.
+    """
+    timings = {}
+
+    def timed(phase, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        timings[phase] = time.perf_counter() - start
+        logging.info("{0}: {1:.3f} s".format(phase, timings[phase]))
+        return result
+
+    energy_system = timed('entities', energysystem, fast_build=fast_build,
+                          seed=seed, **parameters)
+    model = timed('build', om.OptimizationModel, energysystem=energy_system)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        if 'write_lp' in phases:
+            timed('write_lp', model.write_lp_file, path=tmpdir,
+                  filename='benchmark.lp', problem_writer=problem_writer)
+        if 'solve' in phases:
+            timed('solve', model.solve, solver=solver,
+                  problem_writer=problem_writer)
+            if 'results' in phases:
+                energy_system.results = timed('results', model.results)
+                if 'results_dataframe' in phases:
+                    timed('results_dataframe', tpd.ResultsDataFrame,
+                          energy_system=energy_system)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    return {'date': datetime.datetime.now().isoformat(),
+            'commit': commit(),
+            'python': platform.python_version(),
+            'parameters': dict(parameters, fast_build=fast_build,
+                               solver=solver, problem_writer=problem_writer,
+                               seed=seed),
+            'timings': timings,
+            'build_stats': {name: record['time'] for name, record
+                            in model.build_stats.items()
+                            if record['kind'] in ('phase', 'block')}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Scaling benchmark of build, write, solve and results.")
+    parser.add_argument('--preset', choices=sorted(PRESETS),
+                        help="seed topology, overridden by the numbers below")
+    for kind in ['buses', 'transformers', 'chps', 'storages', 'sources',
+                 'sinks', 'transports']:
+        parser.add_argument('--' + kind, type=int)
+    parser.add_argument('--timesteps', type=int, nargs='+', default=[24],
+                        help="one run per number of timesteps")
+    parser.add_argument('--fast-build', choices=['on', 'off', 'both'],
+                        default='both')
+    parser.add_argument('--solver', default='glpk')
+    parser.add_argument('--problem-writer', default='pyomo',
+                        choices=['pyomo', 'oemof'])
+    parser.add_argument('--skip', nargs='*', default=[],
+                        choices=PHASES[2:], help="phases to skip")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--csv', action='store_true',
+                        help="time loading a csv data set (buses, " +
+                        "transformers, sources and sinks) instead")
+    parser.add_argument('--output', help="file the records are appended to")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(levelname)s:%(message)s",
+                        level=logging.WARNING)
+    parameters = dict(buses=1, transformers=1, chps=0, storages=0, sources=1,
+                      sinks=1, transports=0)
+    if args.csv:
+        parameters = dict(CSV_PRESET)
+    elif args.preset:
+        parameters.update(PRESETS[args.preset])
+    for kind in parameters:
+        if getattr(args, kind) is not None:
+            parameters[kind] = getattr(args, kind)
+    fast_builds = {'on': [True], 'off': [False],
+                   'both': [False, True]}[args.fast_build]
+    phases = [p for p in PHASES if p not in args.skip]
+
+    output = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        for timesteps in args.timesteps:
+            if args.csv:
+                record = run_csv(dict(parameters, timesteps=timesteps),
+                                 seed=args.seed)
+                output.write(json.dumps(record, sort_keys=True) + '\n')
+                output.flush()
+                continue
+            for fast_build in fast_builds:
+                record = run(dict(parameters, timesteps=timesteps),
+                             fast_build=fast_build, solver=args.solver,
+                             phases=phases,
+                             problem_writer=args.problem_writer,
+                             seed=args.seed)
+                output.write(json.dumps(record, sort_keys=True) + '\n')
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,13 +5,25 @@ Created on Mon Jul 20 15:53:14 2015
 @author: uwe
 """
 
+import multiprocessing
+import numbers
 import pickle
 import logging
 import os
+import traceback
 
-from oemof.core.network import Entity
+import numpy as np
+import pandas as pd
+
+from oemof.core.network import Entities, Entity
+from oemof.core.network.entities import Bus
+from oemof.core.network.entities.components import transformers as transformer
 from oemof.core.network.entities.components import transports as transport
 from oemof.solph.optimization_model import OptimizationModel as OM
+from oemof.solph.matrix_model import MatrixModel
+from oemof.solph import aggregation
+from oemof.solph import reduction
+from oemof.solph.results import Results
 
 
 class EnergySystem:
@@ -49,7 +61,16 @@ class EnergySystem:
         attribute, which is done automatically on :class:`EnergySystem`
         construction, newly created :class:`Entities
         <oemof.core.network.Entity>` are automatically added to this list on
-        construction.
+        construction. The list is an :class:`Entities
+        <oemof.core.network.Entities>` instance keeping the indexes
+        :attr:`by_uid` and :attr:`groups` (assigned lists are converted).
+    by_uid : dict
+        Entity of every uid.
+    groups : dict
+        Entities of every class and of all its base classes, e.g.
+        `groups[Bus]` or `groups[transformers.Simple]`.
+    bus_types : dict
+        Buses of every bus type.
     simulation : core.energy_system.Simulation object
         Simulation object that contains all necessary attributes to start the
         solver library. Defined in the :py:class:`Simulation
@@ -57,9 +78,9 @@ class EnergySystem:
     regions : list of core.energy_system.Region objects
         List of regions defined in the :py:class:`Region
         <oemof.core.energy_system.Simulation>` class.
-    results : dictionary
-        A dictionary holding the results produced by the energy system.
-        Is `None` while no results are produced.
+    results : :class:`Results <oemof.solph.results.Results>`
+        The results produced by the energy system (used like a nested
+        dictionary). Is `None` while no results are produced.
         Currently only set after a call to :meth:`optimize` after which it
         holds the return value of :meth:`om.results()
         <oemof.solph.optimization_model.OptimizationModel.results>`.
@@ -78,6 +99,32 @@ class EnergySystem:
         self.results = kwargs.get('results')
         self.time_idx = kwargs.get('time_idx')
 
+    @property
+    def entities(self):
+        return self._entities
+
+    @entities.setter
+    def entities(self, entities):
+        if not isinstance(entities, Entities):
+            entities = Entities(entities)
+        self._entities = entities
+
+    @property
+    def by_uid(self):
+        return self._entities.by_uid
+
+    @property
+    def groups(self):
+        return self._entities.groups
+
+    @property
+    def bus_types(self):
+        # the type of a bus is set after its registration
+        types = {}
+        for bus in self._entities.groups.get(Bus, []):
+            types.setdefault(bus.type, []).append(bus)
+        return types
+
     # TODO: Condense signature (use Buse)
     def connect(self, bus1, bus2, in_max, out_max, eta, transport_class):
         """Create two transport objects to connect two buses of the same type
@@ -108,7 +155,10 @@ class EnergySystem:
                             out_max=[out_max], in_max=[in_max], eta=[eta])
 
     # TODO: Add concept to make it possible to use another solver library.
-    def optimize(self, om=None):
+    def optimize(self, om=None, window=None, overlap=0, typical_periods=None,
+                 period_length=24, clustering='kmeans', merge_tolerance=None,
+                 max_duration=None, lazy_results=False, keep_model=True,
+                 reduce_topology=False):
         """Start optimizing the energy system using solph.
 
         Parameters
@@ -120,23 +170,431 @@ class EnergySystem:
             to this method is created using the current :class:`EnergySystem`
             instance as an argument.
             You only need to supply this if you want to observe any side
-            effects that solving has on the `om`.
+            effects that solving has on the `om`. A :class:`MatrixModel
+            <oemof.solph.matrix_model.MatrixModel>` is created instead if
+            `backend` of the simulation is 'scipy'.
+        window : int, optional
+            If given, the timesteps are optimized in a rolling horizon, i.e.
+            in windows of `window` timesteps which are solved one after
+            another (see :meth:`_optimize_rolling`). Can not be combined with
+            `om`.
+        overlap : int, optional
+            Number of timesteps every window is extended by. The results of
+            these timesteps are dropped, they are optimized again as part of
+            the next window (default: 0).
+        typical_periods : int, optional
+            If given, the model is built for this number of typical periods
+            only (see :meth:`_optimize_typical_periods`). Can not be combined
+            with `om`.
+        period_length : int, optional
+            Number of timesteps of a typical period (default: 24).
+        clustering : string, optional
+            Method to choose the typical periods, 'kmeans' (default) or
+            'kmedoids'.
+        merge_tolerance : float, optional
+            If given, consecutive timesteps with nearly identical time series
+            are merged to longer timesteps (see :meth:`_optimize_merged`).
+            Can not be combined with `om`.
+        max_duration : int, optional
+            Maximum number of timesteps merged to one timestep.
+        lazy_results : boolean, optional
+            If True, the results are :class:`LazyResults
+            <oemof.solph.results.LazyResults>`, which hold the solution
+            as one vector and slice `results[entity]` from it on first
+            access only (default: False).
+        keep_model : boolean, optional
+            If False, all components of the optimization model (also of a
+            given `om`) are deleted as soon as the results are extracted, so
+            their memory is returned before the results are post-processed
+            (see :meth:`OptimizationModel.release
+            <oemof.solph.optimization_model.OptimizationModel.release>`).
+            Default: True.
+        reduce_topology : boolean, optional
+            If True, the model is built for a reduced topology: chains of
+            simple transformers and transports over pass-through buses are
+            merged and the simple sinks of a bus are aggregated (see
+            :meth:`_optimize_reduced`). Can not be combined with `om`,
+            `window`, `typical_periods` or `merge_tolerance`.
 
         Returns
         -------
         self : :class:`EnergySystem`
         """
+        if reduce_topology:
+            if (om is not None or window is not None or
+                    typical_periods is not None or
+                    merge_tolerance is not None):
+                raise ValueError("A reduced topology can not be optimized " +
+                                 "with a given optimization model, a " +
+                                 "rolling horizon or aggregated timesteps.")
+            return self._optimize_reduced(lazy_results, keep_model)
+        if window is not None:
+            if om is not None:
+                raise ValueError("A rolling horizon can not be optimized " +
+                                 "with a given optimization model.")
+            return self._optimize_rolling(window, overlap, lazy_results,
+                                          keep_model)
+        if typical_periods is not None:
+            if om is not None:
+                raise ValueError("Typical periods can not be optimized " +
+                                 "with a given optimization model.")
+            return self._optimize_typical_periods(
+                typical_periods, period_length, clustering, lazy_results,
+                keep_model)
+        if merge_tolerance is not None:
+            if om is not None:
+                raise ValueError("Merged timesteps can not be optimized " +
+                                 "with a given optimization model.")
+            return self._optimize_merged(merge_tolerance, max_duration,
+                                         lazy_results, keep_model)
+
         if om is None:
-            om = OM(energysystem=self)
+            om = self._model()
+
+        self.results = self._solve(om, lazy_results, keep_model)
+        return self
 
+    def _solve(self, om, lazy_results=False, keep_model=True,
+               memory_mapped=True, read_model=None):
+        r"""Solves the model `om` with the solver options of the simulation
+        and returns its results (see :meth:`om.results()
+        <oemof.solph.optimization_model.OptimizationModel.results>`).
+
+        Parameters
+        ----------
+        om : :class:`OptimizationModel
+            <oemof.solph.optimization_model.OptimizationModel>` or
+            :class:`MatrixModel <oemof.solph.matrix_model.MatrixModel>`
+        lazy_results, keep_model : boolean
+            See :meth:`optimize`.
+        memory_mapped : boolean
+            If True (default), the results are memory-mapped in the
+            `results_dir` of the simulation (if it is set).
+        read_model : callable
+            Called as `read_model(om, results)` before the model is
+            released, its return value is returned instead of the results
+            (e.g. results expanded with values read from the model).
+        """
         om.solve(solver=self.simulation.solver, debug=self.simulation.debug,
                  verbose=self.simulation.verbose,
                  duals=self.simulation.duals,
-                 solve_kwargs=self.simulation.solve_kwargs)
+                 solve_kwargs=self.simulation.solve_kwargs,
+                 problem_writer=getattr(self.simulation, "problem_writer",
+                                        "pyomo"))
+        directory = None
+        if memory_mapped:
+            directory = getattr(self.simulation, "results_dir", None)
+        results = om.results(directory=directory, lazy=lazy_results)
+        if read_model is not None:
+            results = read_model(om, results)
+        if not keep_model:
+            om.release()
+        return results
+
+    def _model(self):
+        """Builds the optimization model of the `backend` of the simulation:
+        an :class:`OptimizationModel
+        <oemof.solph.optimization_model.OptimizationModel>` ('pyomo') or a
+        :class:`MatrixModel <oemof.solph.matrix_model.MatrixModel>`
+        ('scipy').
+        """
+        if getattr(self.simulation, "backend", "pyomo") == 'scipy':
+            return MatrixModel(energysystem=self)
+        return OM(energysystem=self)
+
+    def _optimize_rolling(self, window, overlap=0, lazy_results=False,
+                          keep_model=True):
+        r"""Optimizes the timesteps of the simulation in consecutive windows.
+
+        For every window a new :class:`OptimizationModel
+        <oemof.solph.optimization_model.OptimizationModel>` is built for
+        `window` + `overlap` timesteps and solved, so the memory is bounded
+        by the window length instead of the whole horizon. Time series of the
+        entities (attributes with one value per timestep, also as elements
+        of a list like `ub_out`) are cut to the window. The storage level
+        (`cap_initial`) and the status of milp components (`status_initial`)
+        at the end of a window are handed over to the next window. The
+        storage level at the last timestep of a window is free (see
+        `cap_final` of :class:`Storage
+        <oemof.core.network.entities.components.transformers.Storage>`),
+        only the level at the end of the horizon is fixed. A window does not
+        value the energy left in a storage, so use an `overlap` covering the
+        storage cycle to keep it from being emptied at the end of the kept
+        timesteps.
+
+        The results of the windows (without the overlap) are written into
+        results allocated for all timesteps (memory-mapped if
+        `results_dir` of the simulation is set), with the structure
+        returned by :meth:`om.results()
+        <oemof.solph.optimization_model.OptimizationModel.results>`. The
+        objective value is the cost of the stitched results: the costs of
+        the kept timesteps of all windows (see :meth:`om.timestep_costs()
+        <oemof.solph.optimization_model.OptimizationModel.timestep_costs>`)
+        and the costs bound to no timestep (e.g. fixed costs) once.
+        Investment results are not meaningful in a rolling horizon.
+
+        Parameters
+        ----------
+        window : int
+            Number of timesteps kept per window.
+        overlap : int
+            Number of timesteps every window is extended by.
+        lazy_results, keep_model : boolean
+            See :meth:`optimize`.
+
+        Returns
+        -------
+        self : :class:`EnergySystem`
+        """
+        timesteps = list(self.simulation.timesteps)
+        if timesteps != list(range(len(timesteps))):
+            raise ValueError("Rolling horizon requires the timesteps " +
+                             "0, 1, ..., n-1.")
+        if window < 1 or overlap < 0:
+            raise ValueError("Window must be positive, overlap must not " +
+                             "be negative.")
+        n = len(timesteps)
+        results_dir = getattr(self.simulation, "results_dir", None)
+        saved = {}
+        results = None
+        objective = 0.
+        final = {s: s.cap_initial if s.cap_final is None else s.cap_final
+                 for s in self.groups.get(transformer.Storage, [])}
+        try:
+            for start in range(0, n, window):
+                end = min(start + window + overlap, n)
+                keep = min(window, n - start)
+                _cut_time_series(self, n, slice(start, end), saved)
+                for storage, cap_final in final.items():
+                    saved.setdefault((storage, 'cap_final'),
+                                     storage.cap_final)
+                    storage.cap_final = cap_final if end == n else False
+                self.simulation.timesteps = range(end - start)
+                logging.info("Optimizing timesteps {0} to {1}.".format(
+                    start, start + keep - 1))
+
+                def read_window(om, window_results):
+                    # the overlap is optimized again by the next window
+                    costs, other = om.timestep_costs()
+                    _hand_over(self, om, keep - 1, saved)
+                    return (_stitch(results, window_results, start, keep, n,
+                                    results_dir),
+                            float(costs[:keep].sum()) +
+                            (other if start == 0 else 0.))
+                # the model is freed before the next window is built
+                results, costs = self._solve(
+                    self._model(), lazy_results, keep_model,
+                    memory_mapped=False, read_model=read_window)
+                objective += costs
+        finally:
+            self.simulation.timesteps = timesteps
+            _restore(saved)
+
+        results.objective = objective
+        self.results = results
+        return self
+
+    def _optimize_typical_periods(self, n_typical, period_length=24,
+                                  clustering='kmeans', lazy_results=False,
+                                  keep_model=True):
+        r"""Optimizes the energy system for typical periods.
+
+        The periods of the timesteps are clustered to `n_typical` typical
+        periods (see :func:`typical_periods
+        <oemof.solph.aggregation.typical_periods>`). The time series of the
+        entities are cut to the timesteps of the typical periods, which are
+        weighted by the number of periods they represent. The results are
+        expanded to all timesteps again (see :func:`expand_results
+        <oemof.solph.aggregation.expand_results>`).
+
+        Parameters
+        ----------
+        n_typical : int
+            Number of typical periods.
+        period_length : int
+            Number of timesteps of a period.
+        clustering : string
+            'kmeans' or 'kmedoids'
+        lazy_results, keep_model : boolean
+            See :meth:`optimize`.
 
-        self.results = om.results()
+        Returns
+        -------
+        self : :class:`EnergySystem`
+        """
+        timesteps = list(self.simulation.timesteps)
+        if timesteps != list(range(len(timesteps))):
+            raise ValueError("Typical periods require the timesteps " +
+                             "0, 1, ..., n-1.")
+        periods = aggregation.typical_periods(
+            aggregation.time_series(self), n_typical, period_length,
+            method=clustering)
+        logging.info("Optimizing {0} typical periods.".format(
+            len(periods.weights)))
+        index = periods.timesteps()
+        saved = {(self.simulation, 'timesteps'): self.simulation.timesteps,
+                 (self.simulation, 'timestep_weights'):
+                     getattr(self.simulation, "timestep_weights", None),
+                 (self.simulation, 'periods'):
+                     getattr(self.simulation, "periods", None)}
+        try:
+            _cut_time_series(self, len(timesteps), index, saved)
+            self.simulation.timesteps = range(len(index))
+            self.simulation.timestep_weights = periods.timestep_weights()
+            self.simulation.periods = periods
+            # the levels of the storages between the periods are read from
+            # the model when the results are expanded
+            self.results = self._solve(self._model(), lazy_results,
+                                       keep_model,
+                                       read_model=aggregation.expand_results)
+        finally:
+            _restore(saved)
         return self
 
+    def _optimize_merged(self, tolerance, max_duration=None,
+                         lazy_results=False, keep_model=True):
+        r"""Optimizes the energy system for merged timesteps.
+
+        Consecutive timesteps with nearly identical time series are merged
+        to segments (see :func:`merge_timesteps
+        <oemof.solph.aggregation.merge_timesteps>`). The model is built for
+        one timestep per segment with the number of merged timesteps as
+        duration and the means of the time series over the segment. The
+        results are expanded to all timesteps again (see
+        :func:`expand_merged_results
+        <oemof.solph.aggregation.expand_merged_results>`).
+
+        Parameters
+        ----------
+        tolerance : float
+            Maximum spread of the normalized time series inside of a
+            segment.
+        max_duration : int
+            Maximum number of timesteps of a segment.
+        lazy_results, keep_model : boolean
+            See :meth:`optimize`.
+
+        Returns
+        -------
+        self : :class:`EnergySystem`
+        """
+        timesteps = list(self.simulation.timesteps)
+        if timesteps != list(range(len(timesteps))):
+            raise ValueError("Merged timesteps require the timesteps " +
+                             "0, 1, ..., n-1.")
+        if getattr(self.simulation, "timestep_durations", None) is not None:
+            raise ValueError("The timesteps already have durations.")
+        segments = aggregation.merge_timesteps(
+            aggregation.time_series(self), tolerance, max_duration)
+        logging.info("Optimizing {0} merged timesteps.".format(
+            len(segments.durations)))
+        saved = {(self.simulation, 'timesteps'): self.simulation.timesteps,
+                 (self.simulation, 'timestep_durations'): None}
+        try:
+            _cut_time_series(self, len(timesteps), segments.slices(), saved)
+            self.simulation.timesteps = range(len(segments.durations))
+            self.simulation.timestep_durations = segments.durations
+            self.results = self._solve(
+                self._model(), lazy_results, keep_model,
+                read_model=lambda om, results:
+                    aggregation.expand_merged_results(om, results, segments))
+        finally:
+            _restore(saved)
+        return self
+
+    def _optimize_reduced(self, lazy_results=False, keep_model=True):
+        r"""Optimizes the energy system with a reduced topology.
+
+        The model is built for a reduced copy of the entities (see
+        :class:`TopologyReduction
+        <oemof.solph.reduction.TopologyReduction>`), the entities of the
+        energy system are not altered. The results are expanded to the
+        original entities, i.e. they hold the flows of all edges.
+
+        Parameters
+        ----------
+        lazy_results, keep_model : boolean
+            See :meth:`optimize`.
+
+        Returns
+        -------
+        self : :class:`EnergySystem`
+        """
+        reduced = reduction.reduce_topology(self.entities)
+        saved = {(self, 'entities'): self.entities}
+        try:
+            self.entities = reduced.entities
+            results = self._solve(self._model(), lazy_results, keep_model)
+        finally:
+            _restore(saved)
+        self.results = reduced.expand(results, self.simulation.timesteps)
+        return self
+
+    def optimize_many(self, scenarios, processes=None):
+        r"""Optimizes variants of the energy system in a pool of processes.
+
+        Every worker process unpickles a copy of the energy system once and
+        optimizes the scenarios it is given one after another, i.e. python
+        and its imports are started once per process and not per scenario.
+        The scenarios are applied to the copy and reverted afterwards, so
+        the :attr:`Entity.registry <oemof.core.network.Entity.registry>`
+        of the calling process is not touched.
+
+        Parameters
+        ----------
+        scenarios : list
+            List of scenarios. A scenario is either a :class:`Simulation`
+            or a dictionary mapping entity uids to dictionaries of attribute
+            values, e.g. {'demand': {'val': [...]}, 'pp_gas': {'opex_var':
+            40}}. The optional key 'simulation' holds a :class:`Simulation`
+            or a dictionary of simulation attributes.
+        processes : int, optional
+            Number of worker processes (default: number of cpus). If 1, the
+            scenarios are optimized in the calling process.
+
+        Yields
+        ------
+        tuple (index, results, error)
+            `index` is the position of the scenario in `scenarios`,
+            `results` is structured like the return value of
+            :meth:`om.results()
+            <oemof.solph.optimization_model.OptimizationModel.results>` and
+            keyed by the entities of this energy system. If the scenario
+            failed, `results` is None and `error` holds the traceback.
+            The tuples are yielded in the order the scenarios finish.
+
+        Note
+        ----
+        Customized `optimization_options` of the component classes are
+        only known to the workers if processes are forked (default on
+        linux).
+        """
+        entities = self.by_uid
+        if processes == 1:
+            tasks = map(_optimize_scenario,
+                        [(self, i, sc) for i, sc in enumerate(scenarios)])
+            pool = None
+        else:
+            pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                        initargs=(pickle.dumps(self),))
+            tasks = pool.imap_unordered(
+                _optimize_scenario,
+                [(None, i, sc) for i, sc in enumerate(scenarios)])
+        try:
+            for i, results, error in tasks:
+                if error is not None:
+                    logging.error("Scenario {0} failed:\n{1}".format(
+                        i, error))
+                    yield i, None, error
+                else:
+                    yield i, _results_from_uids(results, entities), None
+            if pool is not None:
+                pool.close()
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
     def dump(self, dpath=None, filename=None, keep_weather=True):
         r""" Dump an EnergySystem instance.
         """
@@ -170,12 +628,195 @@ class EnergySystem:
             filename = 'es_dump.oemof'
 
         self.__dict__ = pickle.load(open(os.path.join(dpath, filename), "rb"))
+        if 'entities' in self.__dict__:
+            # dumped before the entities were indexed
+            self.entities = self.__dict__.pop('entities')
         msg = ('Attributes restored from: {0}'.format(os.path.join(
             dpath, filename)))
         logging.debug(msg)
         return msg
 
 
+# marker for attributes which did not exist before a rolling horizon
+_MISSING = object()
+
+
+def _window(value, n, index):
+    """Returns the part `index` (slice or list of positions) of a time
+    series with n values, of every time series in a list or `value` itself if
+    it is no time series. If `index` is a list of slices, the means of the
+    slices are returned.
+    """
+    if isinstance(value, (list, tuple, np.ndarray, pd.Series)):
+        if (len(value) == n and
+                all(isinstance(v, numbers.Number) for v in value)):
+            if isinstance(index, list) and index and isinstance(index[0],
+                                                                slice):
+                return _segment_means(value, index)
+            if isinstance(value, pd.Series):
+                # values are looked up by position, e.g. val[e][t]
+                return value.iloc[index].reset_index(drop=True)
+            if isinstance(value, np.ndarray) or isinstance(index, slice):
+                return value[index]
+            return [value[i] for i in index]
+        if isinstance(value, list) and any(_window(v, n, index) is not v
+                                           for v in value):
+            return [_window(v, n, index) for v in value]
+    return value
+
+
+def _segment_means(value, segments):
+    """Means of a time series over the consecutive slices `segments`."""
+    starts = [s.start for s in segments]
+    lengths = np.diff(starts + [segments[-1].stop])
+    means = np.add.reduceat(np.asarray(value, dtype=float), starts) / lengths
+    if isinstance(value, pd.Series):
+        return pd.Series(means)
+    if isinstance(value, np.ndarray):
+        return means
+    return means.tolist()
+
+
+def _cut_time_series(energysystem, n, index, saved):
+    """Cuts all time series of the entities and the simulation (e.g.
+    `timestep_durations`) to the part `index` (see :func:`_window`). The
+    original values are stored in `saved`.
+    """
+    for obj in list(energysystem.entities) + [energysystem.simulation]:
+        for attribute, value in list(vars(obj).items()):
+            key = (obj, attribute)
+            value = saved.get(key, value)
+            part = _window(value, n, index)
+            if part is not value:
+                saved.setdefault(key, value)
+                setattr(obj, attribute, part)
+
+
+def _restore(saved):
+    """Restores the attributes stored in `saved`."""
+    for (obj, attribute), value in saved.items():
+        if value is _MISSING:
+            delattr(obj, attribute)
+        else:
+            setattr(obj, attribute, value)
+
+
+def _stitch(results, window_results, start, keep, n, directory=None):
+    """Writes the first `keep` timesteps of `window_results` to the timesteps
+    from `start` on of `results` for `n` timesteps, which are allocated
+    (memory-mapped in `directory` if given) for the first window (see
+    :meth:`Results.put <oemof.solph.results.Results.put>`).
+    """
+    if results is None:
+        results = type(window_results).allocate(
+            window_results.index, n, window_results.n_edges,
+            window_results.reduced_costs is not None, directory)
+    return results.put(start, window_results, keep)
+
+
+def _hand_over(energysystem, om, t, saved):
+    """Sets the storage levels and the status of milp components at position
+    `t` of the solved model `om` as initial values of the next window.
+    """
+    for entity in energysystem.entities:
+        block = None
+        if not isinstance(om, MatrixModel):
+            block = om.component(str(type(entity)))
+            if block is None:
+                continue
+        for attribute, var in [("cap_initial", "cap"),
+                               ("status_initial", "y")]:
+            if (attribute == "cap_initial" and
+                    not isinstance(entity, transformer.Storage)):
+                continue
+            if block is None:
+                value = om.value(entity.uid, var, t)
+            elif block.component(var) is None:
+                continue
+            else:
+                value = block.component(var)[entity.uid, t].value
+            if value is None:
+                continue
+            saved.setdefault((entity, attribute),
+                             getattr(entity, attribute, _MISSING))
+            if attribute == "status_initial":
+                value = int(round(value))
+            setattr(entity, attribute, value)
+
+
+# energy system of a worker process of EnergySystem.optimize_many()
+_worker_energysystem = None
+
+
+def _init_worker(dump):
+    global _worker_energysystem
+    _worker_energysystem = pickle.loads(dump)
+    Entity.registry = _worker_energysystem
+
+
+def _optimize_scenario(task):
+    """Applies a scenario to the energy system, optimizes it and reverts
+    the scenario. Returns (index, results keyed by uid, traceback).
+    """
+    energysystem, i, scenario = task
+    if energysystem is None:
+        energysystem = _worker_energysystem
+    if isinstance(scenario, Simulation):
+        scenario = {'simulation': scenario}
+    entities = energysystem.by_uid
+    saved = [(energysystem, 'results', energysystem.results)]
+    try:
+        for uid, attributes in scenario.items():
+            if uid == 'simulation' and isinstance(attributes, Simulation):
+                saved.append((energysystem, 'simulation',
+                              energysystem.simulation))
+                energysystem.simulation = attributes
+                continue
+            obj = (energysystem.simulation if uid == 'simulation' else
+                   entities[uid])
+            for attribute, value in attributes.items():
+                saved.append((obj, attribute,
+                              getattr(obj, attribute, _MISSING)))
+                setattr(obj, attribute, value)
+        energysystem.optimize(keep_model=False)
+        return i, _results_by_uid(energysystem.results), None
+    except Exception:
+        return i, None, traceback.format_exc()
+    finally:
+        for obj, attribute, value in reversed(saved):
+            if value is _MISSING:
+                delattr(obj, attribute)
+            else:
+                setattr(obj, attribute, value)
+
+
+def _results_by_uid(results):
+    """Replaces the entities in the results by their uids (e.g. to send the
+    results to another process).
+    """
+    def key(k):
+        return isinstance(k, Entity), getattr(k, 'uid', k)
+    return (results.objective, [(key(s), key(t)) for s, t in results.index],
+            results.array, results.n_edges,
+            {e.uid: a for e, a in results.attributes.items()},
+            None if results.reduced_costs is None
+            else results.reduced_costs.array, results.solver_status)
+
+
+def _results_from_uids(results, entities):
+    """Inverse of :func:`_results_by_uid` with the entities keyed by uid."""
+    (objective, index, array, n_edges, attributes, reduced_costs,
+     solver_status) = results
+
+    def entity(key):
+        is_entity, k = key
+        return entities[k] if is_entity else k
+    return Results([(entity(s), entity(t)) for s, t in index], array,
+                   n_edges, objective,
+                   {entities[uid]: a for uid, a in attributes.items()},
+                   reduced_costs, solver_status=solver_status)
+
+
 class Region:
     r"""Defining a region within an energy supply system.
 
@@ -277,10 +918,57 @@ class Simulation:
         If True, integer variables will be relaxed
         (only relevant for milp-problems)
     fast_build : boolean
-        If True, the standard way of pyomo constraint building is skipped and
-        a different function is used.
+        If True, the standard way of pyomo constraint building is skipped.
+        Every constraint family is assembled at once as sparse coefficient
+        arrays (see :func:`sparse_constraint
+        <oemof.solph.pyomo_fastbuild.sparse_constraint>`) and attached to
+        the model afterwards.
         (Warning: No guarantee that all expected 'standard' pyomo model
         functionalities work for the constructed model!)
+    problem_writer : string
+        'pyomo' (default) or 'oemof'. If 'oemof', the problem file is written
+        by :func:`write_problem <oemof.solph.problem_writer.write_problem>`
+        instead of pyomo's writer (see :meth:`OptimizationModel.solve
+        <oemof.solph.optimization_model.OptimizationModel.solve>`).
+    solution_reader : string
+        'pyomo' (default) or 'oemof'. If 'oemof', the solution files of glpk
+        and cbc are read directly into arrays (requires problem_writer
+        'oemof', see :py:mod:`oemof.solph.solution_reader`).
+    timestep_weights : list
+        Weight of every timestep in the objective and in sums over all
+        timesteps (e.g. global limits). Default: 1 for every timestep.
+    timestep_durations : list
+        Duration of every timestep in hours, used for the energies of the
+        flows in the objective, global limits and storage balances and for
+        the gradients. Default: 1 for every timestep.
+    build_stats : boolean or string
+        If True, the memory and the numbers of rows, columns and nonzeros of
+        the build are recorded in `om.build_stats` besides the wall times
+        (see :py:mod:`oemof.solph.build_stats`). If a filename is given, the
+        statistics are additionally dumped to this file as JSON.
+    periods : :class:`TypicalPeriods <oemof.solph.aggregation.TypicalPeriods>`
+        Set if the timesteps are made of typical periods (see
+        :meth:`EnergySystem.optimize`). Storages are linked over the
+        sequence of the periods.
+    results_dir : string
+        If given, the arrays of the results are memory-mapped files in this
+        scratch directory instead of arrays in memory (see
+        :class:`Results <oemof.solph.results.Results>`), e.g. for very long
+        horizons. In a rolling horizon the windows are written into the
+        files one after another. The files are deleted with the results.
+    backend : string
+        'pyomo' (default) or 'scipy'. If 'scipy', :meth:`EnergySystem.optimize`
+        assembles the problem as sparse matrices and solves it with HiGHS
+        in-process (see :class:`MatrixModel
+        <oemof.solph.matrix_model.MatrixModel>`, requires scipy >= 1.6,
+        for mixed integer problems scipy >= 1.9). Solvers
+        other than 'highs', 'highs-ds' and 'highs-ipm' are replaced by
+        'highs'.
+    presolve : boolean
+        If True, the fixed flows of sinks and fixed sources are folded into
+        the right hand sides of the rows after the model is built, so they
+        are not passed to the solver (see :py:mod:`oemof.solph.presolve`).
+        Presolved models can not be updated.
     """
     def __init__(self, **kwargs):
         ''
@@ -291,8 +979,19 @@ class Simulation:
         self.duals = kwargs.get('duals', False)
         self.timesteps = kwargs.get('timesteps')
         self.relaxed = kwargs.get('relaxed', False)
-        self.fast_build = kwargs.get('fast_build', False),
+        self.fast_build = kwargs.get('fast_build', False)
         self.solve_kwargs = kwargs.get('solve_kwargs', {})
+        self.problem_writer = kwargs.get('problem_writer', 'pyomo')
+        self.solution_reader = kwargs.get('solution_reader', 'pyomo')
+        self.timestep_weights = kwargs.get('timestep_weights')
+        self.timestep_durations = kwargs.get('timestep_durations')
+        self.build_stats = kwargs.get('build_stats', False)
+        self.periods = kwargs.get('periods')
+        self.results_dir = kwargs.get('results_dir')
+        self.backend = kwargs.get('backend', 'pyomo')
+        self.presolve = kwargs.get('presolve', False)
+        if self.backend not in ('pyomo', 'scipy'):
+            raise ValueError("Unknown backend: {0}".format(self.backend))
 
         if self.timesteps is None:
             raise ValueError('No timesteps defined!')
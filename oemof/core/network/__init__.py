@@ -51,11 +51,14 @@ class Entity:
         self.uid = kwargs["uid"]
         self.inputs = kwargs.get("inputs", [])
         self.outputs = kwargs.get("outputs", [])
+        # a new entity can only be in these lists if it was appended in this
+        # loop, i.e. as last element, scanning them is quadratic for buses
+        # with many components
         for e_in in self.inputs:
-            if self not in e_in.outputs:
+            if not e_in.outputs or e_in.outputs[-1] is not self:
                 e_in.outputs.append(self)
         for e_out in self.outputs:
-            if self not in e_out.inputs:
+            if not e_out.inputs or e_out.inputs[-1] is not self:
                 e_out.inputs.append(self)
         self.geo_data = kwargs.get("geo_data", None)
         self.regions = []
@@ -74,3 +77,96 @@ class Entity:
     def __str__(self):
         # TODO: @Günni: Unused privat method. No Docstring.
         return "<{0} #{1}>".format(type(self).__name__, self.uid)
+
+
+class Entities(list):
+    r"""List of the :class:`Entities <Entity>` of an energy system keeping
+    indexes to look entities up by uid or by class without scanning the
+    list.
+
+    Appending (e.g. the registration of a new entity) updates the indexes
+    in constant time, all other changes of the list rebuild them. Slices,
+    copies, products and sums with lists of entities are indexed
+    :class:`Entities` as well.
+
+    Parameters
+    ----------
+    entities : iterable
+        The initial entities.
+
+    Attributes
+    ----------
+    by_uid : dict
+        Entity of every uid (the last one if uids are not unique).
+    groups : dict
+        Entities of every class and of all its base classes (e.g.
+        `groups[Bus]`, `groups[Component]` or `groups[transformers.Simple]`),
+        in the order of the list.
+    """
+    def __init__(self, entities=()):
+        super().__init__(entities)
+        self._index()
+
+    def _index(self):
+        self.by_uid = {}
+        self.groups = {}
+        for entity in self:
+            self._add(entity)
+
+    def _add(self, entity):
+        self.by_uid[entity.uid] = entity
+        for cls in type(entity).__mro__[:-1]:
+            self.groups.setdefault(cls, []).append(entity)
+
+    def append(self, entity):
+        super().append(entity)
+        self._add(entity)
+
+    def extend(self, entities):
+        # copied first, the list may extend itself
+        for entity in list(entities):
+            self.append(entity)
+
+    def __iadd__(self, entities):
+        self.extend(entities)
+        return self
+
+    def __getitem__(self, key):
+        result = super().__getitem__(key)
+        if isinstance(key, slice):
+            return type(self)(result)
+        return result
+
+    def __add__(self, entities):
+        return type(self)(super().__add__(entities))
+
+    def __mul__(self, n):
+        return type(self)(super().__mul__(n))
+
+    __rmul__ = __mul__
+
+    def copy(self):
+        return type(self)(self)
+
+    def __reduce__(self):
+        # the indexes are rebuilt instead of pickled
+        return (type(self), (list(self),))
+
+
+def _reindexing(name):
+    """Method `name` of list rebuilding the indexes of :class:`Entities`."""
+    method = getattr(list, name)
+
+    def reindexing(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._index()
+        return result
+    reindexing.__name__ = name
+    reindexing.__doc__ = method.__doc__
+    return reindexing
+
+
+for _name in ['__setitem__', '__delitem__', '__imul__', 'insert', 'remove',
+              'pop', 'clear', 'sort', 'reverse']:
+    setattr(Entities, _name, _reindexing(_name))
+del _name
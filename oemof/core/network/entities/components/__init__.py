@@ -100,6 +100,10 @@ class Transformer(Component):
       efficiency of transformer at minimum load for conversion of input
       to output (order of elements corresponding to order of elements
       out outputs,out_min etc.)
+    status_initial : int
+        status of transformer (0: off, 1: on) before the first timestep. If
+        set, start ups and shut downs are also counted in the first timestep
+        (only milp models)
     """
     optimization_options = {}
 
@@ -117,7 +121,7 @@ class Transformer(Component):
         parameters = ['out_min', 'in_min', 'grad_pos', 'grad_neg',
                       't_min_off', 't_min_on', 'outages', 'input_costs',
                       'start_costs', 'stop_costs', 'ramp_costs',
-                      'output_price', 'eta_min']
+                      'output_price', 'eta_min', 'status_initial']
 
         for k in kwargs:
             if k in parameters:
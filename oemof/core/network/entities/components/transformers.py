@@ -130,6 +130,9 @@ class Storage(Transformer):
         absolut minimum state of charge
     cap_initial : float
         state of charge at timestep 0 (default cap_max*0.5)
+    cap_final : float or False
+        state of charge at the last timestep (default cap_initial), not
+        fixed if False
     add_cap_limit : float
         limit of additional installed capacity (only investment models)
     eta_in : float
@@ -157,6 +160,7 @@ class Storage(Transformer):
             self.cap_initial = self.cap_max*0.5
             logging.info('No initial storage capacity set. Setting capacity ' +
                          'to 0.5 of max. capacity for component: %s', self.uid)
+        self.cap_final = kwargs.get('cap_final', None)
         self.eta_in = kwargs.get('eta_in', 1)
         self.eta_out = kwargs.get('eta_out', 1)
         self.cap_loss = kwargs.get('cap_loss', 0)
@@ -2,7 +2,11 @@
 # -*- coding: utf-8
 
 import logging
+import numpy as np
 import pandas as pd
+
+from oemof.solph.results import stack
+
 try:
     import matplotlib.pyplot as plt
 except:
@@ -28,95 +32,73 @@ class ResultsDataFrame(pd.DataFrame):
         # default values if not arguments are passed
         es = kwargs.get('energy_system')
 
-        rows_list = []
+        # one entry (bus, type, obj_uid, values) per series, the frame is
+        # built from the codes of the levels without any work per timestep
+        series = []
         for k, v in es.results.items():
             if ('Bus' in str(k.__class__)):
                 if k in v.keys():
-                    for kk, vv in v.items():
-                        if(k is kk):
-                            # duals (results[bus][bus])
-                            row = {}
-                            row['bus_uid'] = k.uid
-                            row['bus_type'] = k.type
-                            row['type'] = 'other'
-                            row['obj_uid'] = 'duals'
-                            row['datetime'] = es.time_idx
-                            row['val'] = v.get(k)
-                            rows_list.append(row)
+                    # duals (results[bus][bus])
+                    series.append((k, 'other', 'duals', v[k]))
                 else:
                     for kk, vv in v.items():
                         if (isinstance(kk, str)):
-                            row = {}
                             # bus variables (results[bus]['some_key'])
-                            row['bus_uid'] = k.uid
-                            row['bus_type'] = k.type
-                            row['type'] = 'other'
-                            row['obj_uid'] = kk
-                            row['datetime'] = es.time_idx
-                            row['val'] = vv
-                            rows_list.append(row)
+                            series.append((k, 'other', kk, vv))
                         else:
                             # bus outputs (results[bus][component])
-                            row = {}
-                            row['bus_uid'] = k.uid
-                            row['bus_type'] = k.type
-                            row['type'] = 'output'
-                            row['obj_uid'] = kk.uid
-                            row['datetime'] = es.time_idx
-                            row['val'] = vv
-                            rows_list.append(row)
+                            series.append((k, 'output', kk.uid, vv))
             else:
                 if k in v.keys():
                     # self ref. components (results[component][component])
-                    for kk, vv in v.items():
-                        if(k is kk):
-                            # self ref. comp. (results[component][component])
-                            row = {}
-                            row['bus_uid'] = k.outputs[0].uid
-                            row['bus_type'] = k.outputs[0].type
-                            row['type'] = 'other'
-                            row['obj_uid'] = k.uid
-                            row['datetime'] = es.time_idx
-                            row['val'] = vv
-                            rows_list.append(row)
-                        else:
-                            # bus inputs (only self ref. components)
-                            row = {}
-                            row['bus_uid'] = k.outputs[0].uid
-                            row['bus_type'] = k.outputs[0].type
-                            row['type'] = 'input'
-                            row['obj_uid'] = k.uid
-                            row['datetime'] = es.time_idx
-                            row['val'] = v.get(k.outputs[0])
-                            rows_list.append(row)
+                    series.append((k.outputs[0], 'other', k.uid, v[k]))
+                    # bus inputs (only self ref. components)
+                    if len(v) > 1:
+                        series.append((k.outputs[0], 'input', k.uid,
+                                       v.get(k.outputs[0])))
                 else:
                     for kk, vv in v.items():
                         # bus inputs (results[component][bus])
-                        row = {}
-                        row['bus_uid'] = kk.uid
-                        row['bus_type'] = kk.type
-                        row['type'] = 'input'
-                        row['obj_uid'] = k.uid
-                        row['datetime'] = es.time_idx
-                        row['val'] = vv
-                        rows_list.append(row)
-
-        # split date and value lists to tuples
-        tuples = [
-            (item['bus_uid'], item['bus_type'], item['type'], item['obj_uid'],
-             date, val)
-            for item in rows_list for date, val in zip(item['datetime'],
-                                                       item['val'])]
-
-        # create multiindexed dataframe
-        index = ['bus_uid', 'bus_type', 'type',
-                 'obj_uid', 'datetime']
-
-        columns = index + ['val']
-
-        super().__init__(tuples, columns=columns)
-        self.set_index(index, inplace=True)
-        self.sort_index(inplace=True)
+                        series.append((kk, 'input', k.uid, vv))
+
+        index = ['bus_uid', 'bus_type', 'type', 'obj_uid', 'datetime']
+        time_idx = pd.Index(es.time_idx)
+        n = len(time_idx)
+        if not series:
+            super().__init__(
+                {'val': []}, index=pd.MultiIndex.from_arrays(
+                    [[]] * len(index), names=index))
+            return
+
+        n = min(n, len(series[0][3]))
+        labels = [[bus.uid for bus, kind, uid, vv in series],
+                  [bus.type for bus, kind, uid, vv in series],
+                  [kind for bus, kind, uid, vv in series],
+                  [uid for bus, kind, uid, vv in series]]
+        codes, levels = zip(*[_factorize(level) for level in labels])
+
+        # sort the series by their labels, the timesteps stay in order
+        order = np.lexsort(codes[::-1])
+        codes = [np.repeat(c[order], n) for c in codes]
+        codes.append(np.tile(np.arange(n), len(series)))
+        levels = list(levels) + [time_idx[:n]]
+        try:
+            multiindex = pd.MultiIndex(levels=levels, codes=codes,
+                                       names=index)
+        except TypeError:
+            # pandas < 0.24
+            multiindex = pd.MultiIndex(levels=levels, labels=codes,
+                                       names=index)
+
+        # memory-mapped results give a frame backed by a memory-mapped file
+        # (no copy), subsets are read from it on access
+        values = stack([np.asarray(series[k][3], dtype=float)[None, :n]
+                        for k in order],
+                       getattr(es.results, 'directory', None))
+        super().__init__(values.reshape(-1, 1), index=multiindex,
+                         columns=['val'], copy=False)
+        if not time_idx[:n].is_monotonic_increasing:
+            self.sort_index(inplace=True)
 
     def slice_by(self, **kwargs):
         r""" Method for slicing the ResultsDataFrame. A subset is returned.
@@ -170,6 +152,15 @@ class ResultsDataFrame(pd.DataFrame):
         return subset.unstack(level=unstacklevel)
 
 
+def _factorize(labels):
+    """Returns the codes and the sorted unique values of `labels`."""
+    try:
+        return pd.factorize(np.array(labels, dtype=object), sort=True)
+    except TypeError:
+        # labels of different types (e.g. strings and tuples) are not sortable
+        return pd.factorize(np.array(labels, dtype=object))
+
+
 class DataFramePlot(ResultsDataFrame):
     r"""Creates plots based on the subset of a multi-indexed pandas dataframe
     of the :class:`ResultsDataFrame class
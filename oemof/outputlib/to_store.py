@@ -0,0 +1,279 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+"""
+Columnar store for the results of many runs (e.g. scenarios).
+
+Every run is appended as one partition keyed by its scenario id. A partition
+holds all series of the :class:`Results <oemof.solph.results.Results>` of
+the run (flows, storage levels, duals, ...) as columns, one row per
+timestep. Single series can be read across all scenarios without loading
+the other series.
+
+Two backends are available:
+
+    parquet     one file `scenario=<id>/results.parquet` per run in the
+                directory `path` (requires pyarrow)
+    hdf5        one group per run in the file `path`, the series are the rows
+                of one array chunked by series, their names are stored in
+                a second array (requires PyTables)
+
+"""
+
+from collections import Counter
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+    logging.info('pyarrow not installed, the parquet store will not work.')
+try:
+    import tables
+except ImportError:
+    tables = None
+    logging.info('PyTables not installed, the hdf5 store will not work.')
+
+
+class ResultsStore:
+    r"""Appends the results of runs to a partitioned columnar store and reads
+    series across all runs.
+
+    Parameters
+    ----------
+    path : string
+        Directory (parquet) or file (hdf5) of the store.
+    backend : string
+        'parquet' or 'hdf5'. By default 'hdf5' for paths ending with '.h5'
+        or '.hdf5', else 'parquet'.
+    float32 : boolean
+        Store the values as 32 bit floats (default: False).
+    compression : string
+        Codec of the backend, e.g. 'snappy', 'gzip' or 'zstd' (parquet) and
+        'blosc', 'zlib' or 'lzf' (hdf5). Default: 'snappy' (parquet) and
+        'blosc' (hdf5). None to store uncompressed.
+    complevel : int
+        Compression level (hdf5 only, default: 5).
+
+    Examples
+    --------
+    >>> store = ResultsStore('results_store')  # doctest: +SKIP
+    >>> store.append('high_wind', energysystem.results,
+    ...              energysystem.time_idx)  # doctest: +SKIP
+    >>> store.read(storage, storage)  # doctest: +SKIP
+    """
+    DEFAULT_COMPRESSION = {'parquet': 'snappy', 'hdf5': 'blosc'}
+
+    def __init__(self, path, backend=None, float32=False,
+                 compression='default', complevel=5):
+        if backend is None:
+            backend = 'hdf5' if path.endswith(('.h5', '.hdf5')) else 'parquet'
+        if backend not in self.DEFAULT_COMPRESSION:
+            raise ValueError("Unknown backend: {0}".format(backend))
+        if backend == 'parquet' and pq is None:
+            raise ImportError("The parquet store requires pyarrow.")
+        if backend == 'hdf5' and tables is None:
+            raise ImportError("The hdf5 store requires PyTables.")
+        if compression == 'default':
+            compression = self.DEFAULT_COMPRESSION[backend]
+        self.path = path
+        self.backend = backend
+        self.dtype = np.float32 if float32 else np.float64
+        self.compression = compression
+        self.complevel = complevel
+
+    def append(self, scenario, results, time_idx=None):
+        r"""Appends the results of one run as partition `scenario`. An
+        existing partition of the scenario is replaced.
+
+        Parameters
+        ----------
+        scenario : string or int
+            Id of the run.
+        results : :class:`Results <oemof.solph.results.Results>`
+            Results of the run (e.g. `energysystem.results`).
+        time_idx : pandas.Index
+            Timesteps of the results (default: 0, 1, ...).
+        """
+        values = np.asarray(results.array, dtype=self.dtype)
+        if time_idx is None:
+            time_idx = pd.RangeIndex(values.shape[1])
+        time_idx = pd.Index(time_idx)[:values.shape[1]]
+        columns = [column(s, t) for s, t in results.index]
+        if len(set(columns)) != len(columns):
+            duplicates = sorted(c for c, k in Counter(columns).items()
+                                if k > 1)
+            raise ValueError("The uids of the results give the same " +
+                             "column names: {0}".format(duplicates))
+        if self.backend == 'parquet':
+            self._append_parquet(str(scenario), columns, values, time_idx,
+                                 results.objective)
+        else:
+            self._append_hdf5(str(scenario), columns, values, time_idx,
+                              results.objective)
+        logging.debug("Results of scenario {0} stored in {1}".format(
+            scenario, self.path))
+
+    def scenarios(self):
+        """Returns the ids of the stored scenarios (as strings)."""
+        if self.backend == 'parquet':
+            if not os.path.isdir(self.path):
+                return []
+            return sorted(d[len('scenario='):] for d in os.listdir(self.path)
+                          if d.startswith('scenario='))
+        if not os.path.isfile(self.path):
+            return []
+        with tables.open_file(self.path, mode='r') as h5:
+            return sorted(g._v_attrs.scenario for g in h5.iter_nodes('/')
+                          if 'scenario' in g._v_attrs)
+
+    def read(self, source, target, scenarios=None):
+        r"""Reads one series (e.g. the flow of an edge or the level of a
+        storage) of all or the given scenarios. Only this series is read
+        from the store.
+
+        Parameters
+        ----------
+        source, target : entity, uid or string
+            Key of the series in the results (e.g. (bus, 'excess') or
+            (storage, storage)).
+        scenarios : list
+            Ids of the scenarios (default: all).
+
+        Returns
+        -------
+        pandas.DataFrame
+            One column per scenario (scenarios without the series are
+            skipped).
+        """
+        name = column(source, target)
+        if scenarios is None:
+            scenarios = self.scenarios()
+        series = {}
+        if self.backend == 'parquet':
+            for scenario in map(str, scenarios):
+                filename = self._filename(scenario)
+                if name not in pq.read_schema(filename).names:
+                    continue
+                frame = pq.read_table(filename, columns=['datetime', name])
+                frame = frame.to_pandas()
+                series[scenario] = frame.set_index('datetime')[name]
+        else:
+            with tables.open_file(self.path, mode='r') as h5:
+                for scenario in map(str, scenarios):
+                    group = h5.get_node('/', _group(scenario))
+                    columns = _columns(group)
+                    if name not in columns:
+                        continue
+                    series[scenario] = pd.Series(
+                        group.series[columns.index(name)],
+                        index=_time_index(group))
+        return pd.DataFrame(series, columns=list(series))
+
+    def read_scenario(self, scenario):
+        r"""Reads all series of one scenario.
+
+        Returns
+        -------
+        pandas.DataFrame
+            One column per series, one row per timestep.
+        """
+        scenario = str(scenario)
+        if self.backend == 'parquet':
+            frame = pq.read_table(self._filename(scenario)).to_pandas()
+            return frame.set_index('datetime')
+        with tables.open_file(self.path, mode='r') as h5:
+            group = h5.get_node('/', _group(scenario))
+            return pd.DataFrame(group.series.read().T,
+                                index=_time_index(group),
+                                columns=_columns(group))
+
+    def objectives(self):
+        """Returns the objective values of all scenarios as pandas.Series."""
+        objectives = {}
+        if self.backend == 'parquet':
+            for scenario in self.scenarios():
+                metadata = pq.read_schema(self._filename(scenario)).metadata
+                objectives[scenario] = float(metadata[b'oemof.objective'])
+        else:
+            with tables.open_file(self.path, mode='r') as h5:
+                for scenario in self.scenarios():
+                    group = h5.get_node('/', _group(scenario))
+                    objectives[scenario] = group._v_attrs.objective
+        return pd.Series(objectives)
+
+    def _filename(self, scenario):
+        return os.path.join(self.path, 'scenario=' + scenario,
+                            'results.parquet')
+
+    def _append_parquet(self, scenario, columns, values, time_idx, objective):
+        frame = pd.DataFrame(values.T, columns=columns)
+        frame.insert(0, 'datetime', time_idx)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b'oemof.objective'] = str(
+            np.nan if objective is None else objective).encode()
+        table = table.replace_schema_metadata(metadata)
+        filename = self._filename(scenario)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        pq.write_table(table, filename, compression=self.compression)
+
+    def _append_hdf5(self, scenario, columns, values, time_idx, objective):
+        filters = None
+        if self.compression is not None:
+            filters = tables.Filters(complevel=self.complevel,
+                                     complib=self.compression)
+        with tables.open_file(self.path, mode='a') as h5:
+            name = _group(scenario)
+            if name in h5.root:
+                h5.remove_node('/', name, recursive=True)
+            group = h5.create_group('/', name)
+            # one chunk per series, so a series is read without the others
+            h5.create_carray(group, 'series', obj=values, filters=filters,
+                             chunkshape=(1, max(values.shape[1], 1)))
+            is_datetime = isinstance(time_idx, pd.DatetimeIndex)
+            h5.create_array(group, 'datetime', obj=np.asarray(
+                time_idx.asi8 if is_datetime else time_idx))
+            # an array node, attributes are limited to 64 kB
+            h5.create_array(group, 'columns', obj=np.array(
+                [c.encode('utf-8') for c in columns], dtype=bytes))
+            group._v_attrs.scenario = scenario
+            group._v_attrs.is_datetime = is_datetime
+            group._v_attrs.objective = (np.nan if objective is None
+                                        else objective)
+
+
+def column(source, target):
+    r"""Returns the column name of the series (source, target): the uids of
+    entities (or the keys, e.g. 'excess') joined by '|'.
+
+    Examples
+    --------
+    >>> column('bus_el', 'excess')
+    'bus_el|excess'
+    """
+    return '|'.join(str(getattr(k, 'uid', k)) for k in (source, target))
+
+
+def _group(scenario):
+    """Name of the hdf5 group of a scenario."""
+    return 'scenario_' + scenario
+
+
+def _columns(group):
+    """Column names of the series of an hdf5 group."""
+    if 'columns' not in group:
+        # stored as attribute by earlier versions
+        return list(group._v_attrs.columns)
+    return [c.decode('utf-8') for c in group.columns.read()]
+
+
+def _time_index(group):
+    values = group.datetime.read()
+    if group._v_attrs.is_datetime:
+        return pd.DatetimeIndex(values)
+    return pd.Index(values)
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+Aggregation of the timesteps of a simulation.
+
+Typical periods (e.g. days or weeks): The periods of the time horizon are
+clustered by the time series of the energy system (`val` of sinks and
+sources, `price` of buses). Every cluster is represented by one of its
+periods, the typical period, which is weighted with the number of periods
+of the cluster. The optimization model is built for the timesteps of the
+typical periods only. Storages are linked over the original sequence of
+periods (see :func:`add_storage_balance
+<oemof.solph.linear_constraints.add_storage_balance>`).
+
+Merged timesteps: Consecutive timesteps with nearly identical values of all
+time series are merged to one timestep with a longer duration (see
+`timestep_durations` of :class:`Simulation
+<oemof.core.energy_system.Simulation>`).
+
+"""
+
+import numpy as np
+
+from ..core.network.entities import Bus
+from ..core.network.entities.components import Sink, Source
+from ..core.network.entities.components.transformers import Storage
+
+
+class TypicalPeriods:
+    r"""Typical periods of a time horizon.
+
+    Parameters
+    ----------
+    period_length : int
+        Number of timesteps of a period.
+    order : list
+        Typical period (0, ..., k-1) of every period of the horizon.
+    representatives : list
+        Period of the horizon taken as typical period, for every typical
+        period.
+
+    Attributes
+    ----------
+    weights : list
+        Number of periods represented by every typical period.
+    """
+    def __init__(self, period_length, order, representatives):
+        self.period_length = period_length
+        self.order = [int(k) for k in order]
+        self.representatives = [int(p) for p in representatives]
+        self.weights = np.bincount(
+            self.order, minlength=len(self.representatives)).tolist()
+
+    def timesteps(self):
+        """Returns the positions of the timesteps of the typical periods in
+        the horizon.
+        """
+        n = self.period_length
+        return [p * n + i for p in self.representatives for i in range(n)]
+
+    def timestep_weights(self):
+        """Returns the weight of every timestep of the typical periods."""
+        return np.repeat(self.weights, self.period_length).tolist()
+
+    def expand(self, values):
+        """Expands values of the timesteps of the typical periods to the
+        timesteps of the horizon.
+        """
+        n = self.period_length
+        return [v for k in self.order for v in values[k * n:(k + 1) * n]]
+
+
+class TimestepSegments:
+    r"""Consecutive timesteps of a time horizon merged to segments.
+
+    Parameters
+    ----------
+    durations : list
+        Number of timesteps of the horizon merged to every segment.
+
+    Attributes
+    ----------
+    starts : list
+        Position of the first timestep of every segment in the horizon.
+    """
+    def __init__(self, durations):
+        self.durations = [int(d) for d in durations]
+        self.starts = np.concatenate(
+            [[0], np.cumsum(self.durations)[:-1]]).astype(int).tolist()
+
+    def slices(self):
+        """Returns the positions of the segments in the horizon as slices."""
+        return [slice(s, s + d) for s, d in zip(self.starts, self.durations)]
+
+    def expand(self, values):
+        """Repeats the values of the segments for their timesteps."""
+        return np.repeat(values, self.durations).tolist()
+
+    def interpolate(self, levels, initial):
+        """Interpolates levels at the end of the segments (e.g. storage
+        levels) linearly to the timesteps of the horizon. `initial` is the
+        level at the beginning of the horizon.
+        """
+        ends = np.cumsum(self.durations)
+        return np.interp(np.arange(1, ends[-1] + 1), np.concatenate(
+            [[0], ends]), np.concatenate([[initial], levels])).tolist()
+
+
+def time_series(energysystem):
+    r"""Returns the time series the periods are clustered by: `val` of all
+    sinks and sources and `price` of all buses, if they have one value per
+    timestep of the simulation.
+
+    Parameters
+    ----------
+    energysystem : EnergySystem() instance
+
+    Returns
+    -------
+    list of numpy.ndarray
+    """
+    n = len(energysystem.simulation.timesteps)
+    series = []
+    for entity in energysystem.entities:
+        if isinstance(entity, (Sink, Source)):
+            values = getattr(entity, 'val', None)
+        elif isinstance(entity, Bus):
+            values = getattr(entity, 'price', None)
+        else:
+            continue
+        if values is not None and np.ndim(values) == 1 and len(values) == n:
+            series.append(np.asarray(values, dtype=float))
+    return series
+
+
+def typical_periods(series, n_typical, period_length=24, method='kmeans',
+                    seed=None, max_iter=100):
+    r"""Clusters the periods of the time horizon to typical periods.
+
+    Every time series is normalized to the range [0, 1] first. A period is
+    described by the values of all time series in the period.
+
+    Parameters
+    ----------
+    series : list of array like
+        Time series with one value per timestep of the horizon. The number
+        of timesteps has to be a multiple of `period_length`.
+    n_typical : int
+        Number of typical periods.
+    period_length : int
+        Number of timesteps of a period (default: 24, i.e. days of hourly
+        timesteps).
+    method : string
+        'kmeans': The period closest to the mean of a cluster represents
+        the cluster. 'kmedoids': The medoid of a cluster represents the
+        cluster.
+    seed : int
+        Seed of the random initialization.
+    max_iter : int
+        Maximum number of iterations of the clustering.
+
+    Returns
+    -------
+    :class:`TypicalPeriods`
+    """
+    data = _normalized(series)
+    n_series, n = data.shape
+    if n % period_length:
+        raise ValueError(("The number of timesteps ({0}) is no multiple " +
+                          "of the period length ({1}).").format(
+                              n, period_length))
+    n_periods = n // period_length
+    features = data.reshape(n_series, n_periods, period_length).transpose(
+        1, 0, 2).reshape(n_periods, -1)
+
+    if n_typical >= n_periods:
+        labels, representatives = np.arange(n_periods), np.arange(n_periods)
+    elif method == 'kmeans':
+        labels, representatives = _kmeans(features, n_typical,
+                                          np.random.RandomState(seed),
+                                          max_iter)
+    elif method == 'kmedoids':
+        labels, representatives = _kmedoids(features, n_typical,
+                                            np.random.RandomState(seed),
+                                            max_iter)
+    else:
+        raise ValueError("Unknown clustering method: {0}".format(method))
+
+    # number the typical periods in the order of the horizon, empty
+    # clusters are dropped
+    used = np.unique(labels)
+    used = used[np.argsort(representatives[used])]
+    number = np.zeros(len(representatives), dtype=np.int64)
+    number[used] = np.arange(len(used))
+    return TypicalPeriods(period_length, number[labels],
+                          representatives[used])
+
+
+def merge_timesteps(series, tolerance=0.01, max_duration=None):
+    r"""Merges consecutive timesteps with nearly identical values of all time
+    series to segments.
+
+    Every time series is normalized to the range [0, 1] first. A timestep is
+    added to the current segment as long as the difference of the maximum
+    and the minimum value of every time series in the segment does not
+    exceed `tolerance`.
+
+    Parameters
+    ----------
+    series : list of array like
+        Time series with one value per timestep of the horizon.
+    tolerance : float
+        Maximum spread of the normalized values inside of a segment
+        (default: 0.01).
+    max_duration : int
+        Maximum number of timesteps of a segment (default: no limit).
+
+    Returns
+    -------
+    :class:`TimestepSegments`
+    """
+    data = _normalized(series).T
+    durations = []
+    start = 0
+    lower = upper = data[0]
+    for t in range(1, len(data)):
+        lower = np.minimum(lower, data[t])
+        upper = np.maximum(upper, data[t])
+        if ((upper - lower).max() > tolerance or
+                (max_duration is not None and t - start >= max_duration)):
+            durations.append(t - start)
+            start = t
+            lower = upper = data[t]
+    durations.append(len(data) - start)
+    return TimestepSegments(durations)
+
+
+def expand_results(om, results):
+    r"""Expands the results of a model built for typical periods to the
+    timesteps of the horizon.
+
+    The storage levels are the levels at the beginning of the periods
+    (reduced by the losses) plus the levels relative to the beginning of the
+    typical periods.
+
+    Parameters
+    ----------
+    om : OptimizationModel() instance
+        Solved model with the attribute `periods`.
+    results : :class:`Results <oemof.solph.results.Results>`
+        Return value of :meth:`om.results()
+        <oemof.solph.optimization_model.OptimizationModel.results>`
+
+    Returns
+    -------
+    :class:`Results <oemof.solph.results.Results>`
+    """
+    periods = om.periods
+    n = periods.period_length
+    expanded = results.take(periods.expand(np.arange(len(om.timesteps))))
+    block = om.component(str(Storage))
+    for entity, values in expanded.items():
+        if isinstance(entity, Storage) and entity in values:
+            start = np.array([block.cap_inter[entity.uid, p].value
+                              for p in range(len(periods.order))])
+            loss = (1 - entity.cap_loss) ** np.arange(1, n + 1)
+            # views of the rows of the expanded array
+            level = values[entity].reshape(len(periods.order), n)
+            level += start[:, None] * loss[None, :]
+    return expanded
+
+
+def expand_merged_results(om, results, segments):
+    r"""Expands the results of a model built for merged timesteps to the
+    timesteps of the horizon.
+
+    Flows are constant over the timesteps of a segment, storage levels are
+    interpolated linearly between the ends of the segments.
+
+    Parameters
+    ----------
+    om : OptimizationModel() instance
+        Solved model built for the segments.
+    results : :class:`Results <oemof.solph.results.Results>`
+        Return value of :meth:`om.results()
+        <oemof.solph.optimization_model.OptimizationModel.results>`
+    segments : :class:`TimestepSegments`
+
+    Returns
+    -------
+    :class:`Results <oemof.solph.results.Results>`
+    """
+    expanded = results.take(segments.expand(np.arange(len(om.timesteps))))
+    for entity, values in results.items():
+        if isinstance(entity, Storage) and entity in values:
+            expanded[entity][entity][:] = segments.interpolate(
+                values[entity], entity.cap_initial)
+    return expanded
+
+
+def _normalized(series):
+    """Time series as rows of an array, normalized to the range [0, 1]."""
+    data = np.array([np.asarray(s, dtype=float) for s in series])
+    if data.ndim != 2 or data.shape[0] == 0:
+        raise ValueError("No time series to aggregate the timesteps by.")
+    lower = data.min(axis=1)[:, None]
+    span = data.max(axis=1)[:, None] - lower
+    span[span == 0] = 1
+    return (data - lower) / span
+
+
+def _distances(features, centers):
+    """Squared euclidean distances of all features to all centers."""
+    return np.maximum(
+        (features ** 2).sum(axis=1)[:, None] -
+        2 * features.dot(centers.T) + (centers ** 2).sum(axis=1)[None, :], 0)
+
+
+def _initial_centers(features, k, rng):
+    """k-means++ initialization, returns the positions of the centers."""
+    centers = [rng.randint(len(features))]
+    distance = _distances(features, features[centers])[:, 0]
+    for _ in range(1, k):
+        if distance.sum() > 0:
+            c = rng.choice(len(features), p=distance / distance.sum())
+        else:
+            c = rng.randint(len(features))
+        centers.append(c)
+        distance = np.minimum(distance,
+                              _distances(features, features[[c]])[:, 0])
+    return np.array(centers)
+
+
+def _kmeans(features, k, rng, max_iter):
+    """k-means clustering. Returns the cluster of every feature and the
+    feature closest to the mean of every cluster (-1 if empty).
+    """
+    centers = features[_initial_centers(features, k, rng)]
+    labels = None
+    for _ in range(max_iter):
+        new_labels = _distances(features, centers).argmin(axis=1)
+        if labels is not None and (new_labels == labels).all():
+            break
+        labels = new_labels
+        for c in range(k):
+            if (labels == c).any():
+                centers[c] = features[labels == c].mean(axis=0)
+    distance = _distances(features, centers)
+    representatives = np.full(k, -1, dtype=np.int64)
+    for c in np.unique(labels):
+        members = np.flatnonzero(labels == c)
+        representatives[c] = members[distance[members, c].argmin()]
+    return labels, representatives
+
+
+def _kmedoids(features, k, rng, max_iter):
+    """k-medoids clustering. Returns the cluster of every feature and the
+    medoid of every cluster.
+    """
+    distance = _distances(features, features)
+    medoids = _initial_centers(features, k, rng)
+    for _ in range(max_iter):
+        labels = distance[:, medoids].argmin(axis=1)
+        new_medoids = medoids.copy()
+        for c in range(k):
+            members = np.flatnonzero(labels == c)
+            if len(members):
+                new_medoids[c] = members[distance[np.ix_(
+                    members, members)].sum(axis=1).argmin()]
+        if (new_medoids == medoids).all():
+            break
+        medoids = new_medoids
+    labels = distance[:, medoids].argmin(axis=1)
+    return labels, medoids
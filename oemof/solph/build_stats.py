@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation of the build of an OptimizationModel.
+
+The wall time of the build phases, of the blocks of the component classes
+and of every constraint family and variable set is recorded in
+`om.build_stats`. The time of a constraint family or variable set is the
+time since the previous record, i.e. it includes the preparation of the
+data (e.g. the coefficient arrays of the fast build) and the construction
+of the pyomo component. Components whose rows are attached after they were
+added to the block (see :func:`sparse_constraint
+<oemof.solph.pyomo_fastbuild.sparse_constraint>`) are recorded when the
+rows are attached (see :func:`measure_component`).
+
+With `Simulation(build_stats=True)` the memory allocated (traced by
+:py:mod:`tracemalloc`) and the number of rows, columns and nonzeros are
+recorded as well. If `build_stats` is a filename, the statistics are
+additionally dumped to this file as JSON.
+
+"""
+
+from collections import UserDict as UD
+from contextlib import contextmanager
+import json
+import logging
+import time
+import tracemalloc
+
+import pandas as pd
+import pyomo.environ as po
+
+from .problem_writer import _linear_terms
+
+
+class BuildStats(UD):
+    r"""Build statistics of an optimization model.
+
+    The records are dictionaries with the keys of :attr:`COLUMNS`, keyed by
+    the name of the phase (e.g. 'build_component_constraints'), block (e.g.
+    "<class '...Storage'>") or component (e.g. "<class '...Storage'>.balance")
+    in the order of the build.
+
+    Parameters
+    ----------
+    detailed : boolean
+        If True, the memory and the numbers of rows, columns and nonzeros are
+        recorded as well (slows down the build).
+
+    Attributes
+    ----------
+    COLUMNS : list
+        kind ('phase', 'block', 'constraint', 'variable', 'objective'), block
+        (name of the block of a component, None for model components), time
+        (wall time in seconds), memory (net allocated memory in bytes),
+        peak_memory (peak of the allocated memory above the memory at the
+        beginning, for components above the memory at the previous record,
+        in bytes; requires python 3.9), rows, columns, nonzeros
+    """
+    COLUMNS = ['kind', 'block', 'time', 'memory', 'peak_memory', 'rows',
+               'columns', 'nonzeros']
+
+    def __init__(self, detailed=False):
+        super().__init__()
+        self.detailed = detailed
+        self._components = {}
+        self._peaks = []
+        self._last = None
+        self._tracing = False
+        # names of the hooked blocks and components recorded on exit of
+        # component()
+        self._blocks = {}
+        self._deferred = set()
+
+    def start(self):
+        """Starts the recording (and tracemalloc if detailed)."""
+        if self.detailed and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        self._last = self._now()
+
+    def stop(self):
+        """Counts rows, columns and nonzeros (if detailed) and stops
+        tracemalloc if it was started by :meth:`start`.
+        """
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        if self.detailed:
+            self._count()
+        self._components = {}
+
+    @contextmanager
+    def measure(self, name, kind, block=None):
+        """Records the time (and memory) of the with-statement as `name`. If
+        a pyomo block (or the model) is given, the constraints, variables and
+        objectives added to it are recorded as well.
+        """
+        record = self._record(name, kind)
+        start = self._last = self._now()
+        self._enter_peak()
+        if block is not None:
+            self._hook(block, name if kind == 'block' else None)
+        try:
+            yield record
+        finally:
+            if block is not None:
+                object.__delattr__(block, 'add_component')
+                del self._blocks[id(block)]
+            end = self._now()
+            peak = self._exit_peak()
+            record['time'] = end[0] - start[0]
+            if start[1] is not None:
+                record['memory'] = end[1] - start[1]
+            if peak is not None:
+                record['peak_memory'] = peak - start[1]
+            self._last = end
+
+    @contextmanager
+    def component(self, block, name):
+        """Records the component `name` added to `block` inside of the
+        with-statement when the statement is left instead of when it is
+        added, e.g. a constraint whose rows are attached afterwards. Does
+        nothing if the block is not measured.
+        """
+        if id(block) not in self._blocks:
+            yield
+            return
+        self._deferred.add((id(block), name))
+        try:
+            yield
+        finally:
+            self._deferred.discard((id(block), name))
+            component = block.component(name)
+            if component is not None:
+                self._record_component(self._blocks[id(block)], name,
+                                       component)
+
+    def to_dataframe(self):
+        """Returns the records as pandas.DataFrame (one row per record)."""
+        return pd.DataFrame.from_dict(self.data, orient='index').reindex(
+            columns=self.COLUMNS)
+
+    def to_json(self, filename):
+        """Dumps the records to a JSON file."""
+        with open(filename, 'w') as f:
+            json.dump(self.data, f, indent=2)
+        logging.info("Build statistics saved to {0}".format(filename))
+
+    def _record(self, name, kind, block=None):
+        record = dict.fromkeys(self.COLUMNS)
+        record.update(kind=kind, block=block)
+        self[name] = record
+        return record
+
+    def _now(self):
+        if self.detailed and tracemalloc.is_tracing():
+            return time.perf_counter(), tracemalloc.get_traced_memory()[0]
+        return time.perf_counter(), None
+
+    def _tracing_peaks(self):
+        # tracemalloc.reset_peak is available from python 3.9 on
+        return (self.detailed and tracemalloc.is_tracing() and
+                hasattr(tracemalloc, 'reset_peak'))
+
+    def _enter_peak(self):
+        """Resets the peak of the traced memory for a nested measurement,
+        the peak so far is kept for the enclosing measurement.
+        """
+        if not self._tracing_peaks():
+            self._peaks.append(None)
+            return
+        if self._peaks and self._peaks[-1] is not None:
+            self._peaks[-1] = max(self._peaks[-1],
+                                  tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self._peaks.append(tracemalloc.get_traced_memory()[1])
+
+    def _take_peak(self):
+        """Returns the peak of the traced memory since the previous record
+        and resets it, the peak is kept for the enclosing measurement.
+        """
+        if (not self._tracing_peaks() or not self._peaks or
+                self._peaks[-1] is None):
+            return None
+        peak = tracemalloc.get_traced_memory()[1]
+        self._peaks[-1] = max(self._peaks[-1], peak)
+        tracemalloc.reset_peak()
+        return peak
+
+    def _exit_peak(self):
+        """Returns the peak of the traced memory of the measurement."""
+        peak = self._peaks.pop()
+        if peak is None:
+            return None
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if self._peaks and self._peaks[-1] is not None:
+            self._peaks[-1] = max(self._peaks[-1], peak)
+        return peak
+
+    def _hook(self, block, block_name):
+        """Wraps `add_component` of the block to record the components."""
+        add_component = block.add_component
+
+        def recording_add_component(name, val):
+            add_component(name, val)
+            if (id(block), name) not in self._deferred:
+                self._record_component(block_name, name, val)
+
+        object.__setattr__(block, 'add_component', recording_add_component)
+        self._blocks[id(block)] = block_name
+
+    def _record_component(self, block_name, name, component):
+        """Records a constraint, variable or objective of a block since the
+        previous record.
+        """
+        kinds = [(po.Constraint, 'constraint'), (po.Var, 'variable'),
+                 (po.Objective, 'objective')]
+        kind = next((k for cls, k in kinds if isinstance(component, cls)),
+                    None)
+        if kind is None:
+            return
+        key = name if block_name is None else block_name + '.' + name
+        record = self._record(key, kind, block_name)
+        now = self._now()
+        peak = self._take_peak()
+        record['time'] = now[0] - self._last[0]
+        if now[1] is not None and self._last[1] is not None:
+            record['memory'] = now[1] - self._last[1]
+            if peak is not None:
+                record['peak_memory'] = peak - self._last[1]
+        self._last = now
+        if self.detailed:
+            self._components[key] = component
+
+    def _count(self):
+        """Counts rows, columns and nonzeros of the recorded components and
+        sums them up for the blocks.
+        """
+        for key, component in self._components.items():
+            record = self[key]
+            if record['kind'] == 'variable':
+                record.update(rows=0, columns=len(component), nonzeros=0)
+                continue
+            variables = set()
+            nonzeros = 0
+            for data in component.values():
+                expr = data.body if record['kind'] == 'constraint' \
+                    else data.expr
+                terms = _linear_terms(expr)[0]
+                nonzeros += len(terms)
+                variables.update(id(v) for v, c in terms)
+            rows = len(component) if record['kind'] == 'constraint' else 0
+            record.update(rows=rows, columns=len(variables),
+                          nonzeros=nonzeros)
+        for name, record in self.items():
+            if record['kind'] != 'block':
+                continue
+            children = [r for r in self.values() if r['block'] == name]
+            record['rows'] = sum(r['rows'] for r in children)
+            record['nonzeros'] = sum(r['nonzeros'] for r in children)
+            record['columns'] = sum(r['columns'] for r in children
+                                    if r['kind'] == 'variable')
+
+
+@contextmanager
+def measure_component(block, name):
+    r"""Records the component `name` added to `block` (a block or the model
+    of an OptimizationModel) when the with-statement is left (see
+    :meth:`BuildStats.component`).
+    """
+    stats = getattr(block.model(), 'build_stats', None)
+    if stats is None:
+        yield
+    else:
+        with stats.component(block, name):
+            yield
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Index of the graph of the entities of an optimization model.
+
+The index is built once per model and shared by all constraint, bound and
+objective builders instead of walking the `inputs` and `outputs` of the
+entities again for every block. Every entity gets an integer id, every
+edge (flow from a component to a bus or from a bus to a component) the
+position of its flow in `om.w`. Incoming and outgoing edges of every
+entity are stored as compressed sparse rows (CSR): the edges of the entity
+with id k are `in_edges[in_ptr[k]:in_ptr[k + 1]]` in the order of its
+`inputs` (and `out_edges` respectively in the order of its `outputs`).
+The edges of the components of every class are arrays as well, the fast
+build indexes `om.w` of a whole block through them.
+
+"""
+
+import numpy as np
+
+from ..core.network import Entities
+from ..core.network.entities import Component
+
+
+class GraphIndex:
+    r"""Integer index of the entities and edges of an energy system.
+
+    Parameters
+    ----------
+    entities : :class:`Entities <oemof.core.network.Entities>` or list
+        The entities of the model.
+
+    Attributes
+    ----------
+    uids : list
+        Uid of every entity (position: id of the entity).
+    ids : dict
+        Id of every uid.
+    components : list
+        The components in the order of `entities` (taken from the index
+        `entities.groups`).
+    edges : list
+        The edges (s, t) as pairs of uids: the inputs and outputs of every
+        component, component by component (see :meth:`OptimizationModel.edges
+        <oemof.solph.optimization_model.OptimizationModel.edges>`).
+    edge_ids : dict
+        Position of every edge.
+    in_ptr, in_edges, out_ptr, out_edges : numpy.ndarray
+        Incoming and outgoing edges of every entity (CSR), see
+        :meth:`inflows` and :meth:`outflows`.
+    by_type : dict
+        Components of every class, the classes in the order of their first
+        appearance.
+    type_edges : dict
+        Ids of the edges of the components of every class (component by
+        component, see :meth:`edges_of`).
+    type_inputs, type_outputs : dict
+        Ids of the incoming and outgoing edges of the components of every
+        class as array of shape (number of components, number of inputs or
+        outputs), padded with -1 for components with fewer edges. Row k
+        belongs to the component `by_type[cls][k]`.
+    """
+    def __init__(self, entities):
+        if not isinstance(entities, Entities):
+            entities = Entities(entities)
+        self.entities = entities
+        self.uids = [e.uid for e in self.entities]
+        self.ids = {uid: k for k, uid in enumerate(self.uids)}
+        self.components = list(entities.groups.get(Component, []))
+
+        self.edges = []
+        # positions of the edges of every component: start, stop
+        self._ranges = {}
+        self.by_type = {}
+        for c in self.components:
+            start = len(self.edges)
+            self.edges.extend((i.uid, c.uid) for i in c.inputs)
+            self.edges.extend((c.uid, o.uid) for o in c.outputs)
+            self._ranges[c.uid] = (start, len(self.edges))
+            self.by_type.setdefault(type(c), []).append(c)
+        self.edge_ids = {e: k for k, e in enumerate(self.edges)}
+        self.type_edges = {
+            cls: np.concatenate([np.arange(*self._ranges[c.uid])
+                                 for c in objs]).astype(int)
+            for cls, objs in self.by_type.items()}
+        self.type_inputs = {
+            cls: self._table([len(c.inputs) for c in objs],
+                             [self._ranges[c.uid][0] for c in objs])
+            for cls, objs in self.by_type.items()}
+        self.type_outputs = {
+            cls: self._table([len(c.outputs) for c in objs],
+                             [self._ranges[c.uid][0] + len(c.inputs)
+                              for c in objs])
+            for cls, objs in self.by_type.items()}
+
+        self.in_ptr, self.in_edges = self._adjacency(
+            lambda e: [(i.uid, e.uid) for i in e.inputs])
+        self.out_ptr, self.out_edges = self._adjacency(
+            lambda e: [(e.uid, o.uid) for o in e.outputs])
+
+    def _adjacency(self, neighbours):
+        """CSR arrays of the edges returned by `neighbours(entity)` for every
+        entity (edges of no component are skipped).
+        """
+        ptr, edges = [0], []
+        for entity in self.entities:
+            edges.extend(self.edge_ids[e] for e in neighbours(entity)
+                         if e in self.edge_ids)
+            ptr.append(len(edges))
+        return np.array(ptr, dtype=int), np.array(edges, dtype=int)
+
+    @staticmethod
+    def _table(counts, starts):
+        """Array of the ids `starts[k]:starts[k] + counts[k]` in row k,
+        padded with -1.
+        """
+        counts = np.array(counts, dtype=int)
+        columns = np.arange(counts.max() if len(counts) else 0)
+        return np.where(columns[None, :] < counts[:, None],
+                        np.array(starts, dtype=int)[:, None] +
+                        columns[None, :], -1)
+
+    def edges_of(self, components):
+        """Returns the edges of `components` (list of pairs of uids)."""
+        edges = []
+        for c in components:
+            start, stop = self._ranges[c.uid]
+            edges.extend(self.edges[start:stop])
+        return edges
+
+    def inflows(self, uid):
+        """Returns the incoming edges of the entity `uid`."""
+        k = self.ids[uid]
+        return [self.edges[j]
+                for j in self.in_edges[self.in_ptr[k]:self.in_ptr[k + 1]]]
+
+    def outflows(self, uid):
+        """Returns the outgoing edges of the entity `uid`."""
+        k = self.ids[uid]
+        return [self.edges[j]
+                for j in self.out_edges[self.out_ptr[k]:self.out_ptr[k + 1]]]
+
+    def inputs(self, uid):
+        """Returns the uids of the inputs of the entity `uid`."""
+        return [s for s, t in self.inflows(uid)]
+
+    def outputs(self, uid):
+        """Returns the uids of the outputs of the entity `uid`."""
+        return [t for s, t in self.outflows(uid)]
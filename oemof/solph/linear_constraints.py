@@ -33,13 +33,21 @@ For all mathematical constraints the following definitions hold:
     Outputs:
     :math:`\mathcal{O}_e = \\text{All output-uids of entity } e \\in \mathcal{E}`
 
+With `fast_build` every constraint family is assembled at once from sparse
+coefficient arrays, the helpers for the rows, variables and sequences are
+found in :py:mod:`oemof.solph.pyomo_fastbuild` (e.g. :func:`timestep_rows
+<oemof.solph.pyomo_fastbuild.timestep_rows>` and :func:`sparse_constraint
+<oemof.solph.pyomo_fastbuild.sparse_constraint>`).
+
 
 Simon Hilpert (simon.hilpert@fh-flensburg.de)
 """
 
+import numpy as np
 import pyomo.environ as po
 from . import pyomo_fastbuild as pofast
 
+
 def add_bus_balance(model, block=None):
     """ Adds constraint for the input-ouput balance of bus objects.
 
@@ -67,8 +75,8 @@ def add_bus_balance(model, block=None):
     for b in block.objs:
         if b.balanced == True:
             uids.append(b.uid)
-            I[b.uid] = [i.uid for i in b.inputs]
-            O[b.uid] = [o.uid for o in b.outputs]
+            I[b.uid] = model.graph.inputs(b.uid)
+            O[b.uid] = model.graph.outputs(b.uid)
 
     block.balanced_uids = po.Set(initialize=uids)
     block.balanced_uids.construct()
@@ -86,24 +94,35 @@ def add_bus_balance(model, block=None):
                 rhs += model.excess_slack[e, t]
             if e in block.shortage_uids:
                 lhs += model.shortage_slack[e, t]
-            return(lhs == rhs)
+            # pyomo turns 0 == rhs of a bus without inputs into rhs == 0
+            return(lhs - rhs == 0)
         block.balance = po.Constraint(block.balanced_indexset,
                                       rule=bus_balance_rule)
 
     if model.energysystem.simulation.fast_build:
-        balance_dict = {}
-        for t in model.timesteps:
-            for e in uids:
-                tuples = [(1, model.w[i, e, t]) for i in I[e]] + \
-                         [(-1, model.w[e, o, t]) for o in O[e]]
-                if e in block.excess_uids:
-                    tuples.append((-1, model.excess_slack[e, t]))
-                if e in block.shortage_uids:
-                    tuples.append((1, model.shortage_slack[e, t]))
-
-                balance_dict[e, t] = [tuples, "==", 0.]
-        pofast.l_constraint(block, 'balance', balance_dict,
-                            block.balanced_indexset)
+        rows = pofast.timestep_rows(uids, model.timesteps)
+        index = pofast.timestep_index(uids, model.timesteps)
+        pos = {e: k for k, e in enumerate(uids)}
+        balanced = np.array([b.uid in pos for b in block.objs], dtype=bool)
+        terms = []
+        for side, coeff in [('input', 1), ('output', -1)]:
+            edges = pofast.block_edges(model, block, side)[balanced]
+            # all edges of the buses, bus by bus
+            terms.append((rows[np.nonzero(edges >= 0)[0]], coeff,
+                          pofast.edge_id_variables(model,
+                                                   edges[edges >= 0])))
+        excess = [e for e in uids if e in block.excess_uids]
+        if excess:
+            terms.append((rows[[pos[e] for e in excess]], -1,
+                          pofast.block_variables(model.excess_slack, excess,
+                                                 model.timesteps)))
+        shortage = [e for e in uids if e in block.shortage_uids]
+        if shortage:
+            terms.append((rows[[pos[e] for e in shortage]], 1,
+                          pofast.block_variables(model.shortage_slack,
+                                                 shortage, model.timesteps)))
+        pofast.sparse_constraint(block, 'balance', index,
+                                 terms, "==", 0., block.balanced_indexset)
 
 
 
@@ -155,12 +174,15 @@ def add_simple_io_relation(model, block, idx=0):
                                           doc="INFLOW * efficiency = OUTFLOW_n")
 
     if model.energysystem.simulation.fast_build:
-        io_relation_dict = {(e, t): [[(eta[e][idx], model.w[model.I[e], e, t]),
-                                      (-1, model.w[e, model.O[e][idx], t])],
-                                     "==", 0.]
-                            for e,t in block.indexset}
-        pofast.l_constraint(block, 'io_relation', io_relation_dict,
-                            block.indexset)
+        uids = [obj.uid for obj in block.objs]
+        rows = pofast.timestep_rows(uids, model.timesteps)
+        index = pofast.timestep_index(uids, model.timesteps)
+        eta_n = np.array([eta[e][idx] for e in uids])[:, None]
+        terms = [(rows, eta_n, pofast.inflow_variables(model, block)),
+                 (rows, -1, pofast.outflow_variables(model, block, idx))]
+        pofast.sparse_constraint(block, 'io_relation', index,
+                                 terms, "==", 0., block.indexset)
+
 
 def add_eta_total_chp_relation(model, block):
     """ Adds constraints for input-(output1,output2) relation as
@@ -192,6 +214,19 @@ def add_eta_total_chp_relation(model, block):
                          which the constraints should be build")
 
     eta_total = {obj.uid: obj.eta_total for obj in block.objs}
+
+    if model.energysystem.simulation.fast_build:
+        uids = [obj.uid for obj in block.objs]
+        rows = pofast.timestep_rows(uids, model.timesteps)
+        index = pofast.timestep_index(uids, model.timesteps)
+        terms = [(rows, np.array([eta_total[e] for e in uids])[:, None],
+                  pofast.inflow_variables(model, block)),
+                 (rows, -1, pofast.outflow_variables(model, block, 0)),
+                 (rows, -1, pofast.outflow_variables(model, block, 1))]
+        pofast.sparse_constraint(block, 'ioo_relation', index,
+                                 terms, "==", 0., block.indexset)
+        return
+
     # constraint for simple transformers: input * efficiency = output
     def ioo_rule(block, e, t):
         lhs = model.w[model.I[e], e, t] * eta_total[e]
@@ -247,13 +282,16 @@ def add_simple_chp_relation(model, block):
                                            doc="P/eta_el - Q/eta_th = 0")
 
     if model.energysystem.simulation.fast_build:
-        pth_relation_dict = {(e, t): [
-                                [(1/eta[e][0], model.w[e, model.O[e][0], t]),
-                                 (-1/eta[e][1], model.w[e, model.O[e][1], t])],
-                                "==", 0.]
-                             for e,t in block.indexset}
-        pofast.l_constraint(block, 'pth_relation', pth_relation_dict,
-                            block.indexset)
+        uids = [obj.uid for obj in block.objs]
+        rows = pofast.timestep_rows(uids, model.timesteps)
+        index = pofast.timestep_index(uids, model.timesteps)
+        terms = [(rows, 1 / np.array([eta[e][0] for e in uids])[:, None],
+                  pofast.outflow_variables(model, block, 0)),
+                 (rows, -1 / np.array([eta[e][1] for e in uids])[:, None],
+                  pofast.outflow_variables(model, block, 1))]
+        pofast.sparse_constraint(block, 'pth_relation', index,
+                                 terms, "==", 0., block.indexset)
+
 
 def add_simple_extraction_chp_relation(model, block):
     """ Adds constraints for power to heat relation and equivalent output
@@ -308,6 +346,27 @@ def add_simple_extraction_chp_relation(model, block):
         sigma[e.uid] = e.sigma
         eta_el_cond[e.uid] = e.eta_el_cond
 
+    if model.energysystem.simulation.fast_build:
+        uids = [obj.uid for obj in block.objs]
+        rows = pofast.timestep_rows(uids, model.timesteps)
+        index = pofast.timestep_index(uids, model.timesteps)
+        eta_n = np.array([eta_el_cond[e] for e in uids])[:, None]
+        beta_n = np.array([beta[e] for e in uids])[:, None]
+        terms = [(rows, 1, pofast.inflow_variables(model, block)),
+                 (rows, -1 / eta_n,
+                  pofast.outflow_variables(model, block, 0)),
+                 (rows, -beta_n * (1 / eta_n),
+                  pofast.outflow_variables(model, block, 1))]
+        pofast.sparse_constraint(block, 'equivalent_output', index, terms,
+                                 "==", 0., block.indexset)
+        # pyomo turns lhs >= rhs into rhs - lhs <= 0
+        terms = [(rows, np.array([sigma[e] for e in uids])[:, None],
+                  pofast.outflow_variables(model, block, 1)),
+                 (rows, -1, pofast.outflow_variables(model, block, 0))]
+        pofast.sparse_constraint(block, 'pth_relation', index, terms,
+                                 "<=", 0., block.indexset)
+        return
+
     def equivalent_output_rule(block, e, t):
         lhs = model.w[model.I[e], e, t]
         rhs = (model.w[e, model.O[e][0], t] +
@@ -330,7 +389,12 @@ def add_global_output_limit(model, block=None):
     The mathematical formulation is as follows:
 
     .. math:: \sum_{t \\in \mathcal{T}} \sum_{o \\in \mathcal{O}_e} w_{e, o}(t) \
-    \\leq \overline{O}^{global}_e, \\qquad \\forall e \\in E
+    \\cdot \\tau(t) \\cdot \\Delta t \\leq \overline{O}^{global}_e, \
+    \\qquad \\forall e \\in E
+
+    With the weight :math:`\\tau(t)` and the duration :math:`\\Delta t` of
+    timestep t (see `timestep_weights` and `timestep_durations` of
+    :class:`Simulation <oemof.core.energy_system.Simulation>`).
 
     With :math:`e  \\in \mathcal{E}` and :math:`\mathcal{E}` beeing the
     set of unique ids for all entities grouped inside the
@@ -355,12 +419,32 @@ def add_global_output_limit(model, block=None):
     limit = {obj.uid: obj.sum_out_limit for obj in block.objs}
 
     # outputs: {'rcoal': ['coal'], 'rgas': ['gas'],...}
-    O = {obj.uid: [o.uid for o in obj.outputs[:]] for obj in block.objs}
+    O = {obj.uid: model.graph.outputs(obj.uid) for obj in block.objs}
+
+    if model.energysystem.simulation.fast_build:
+        outputs = pofast.block_edges(model, block, 'output')
+        # if object has no outputs or no limit the constraint is skipped
+        limited = (outputs >= 0).any(axis=1) & np.array(
+            [limit[obj.uid] != float('inf') for obj in block.objs],
+            dtype=bool)
+        uids = [obj.uid for obj, l in zip(block.objs, limited) if l]
+        outputs = outputs[limited]
+        # all outputs of the components, component by component
+        rows = np.nonzero(outputs >= 0)[0]
+        rows = np.repeat(rows, len(model.timesteps)).reshape(
+            -1, len(model.timesteps))
+        weights = np.array([model.energy_weights[t]
+                            for t in model.timesteps], dtype=float)
+        terms = [(rows, weights,
+                  pofast.edge_id_variables(model, outputs[outputs >= 0]))]
+        pofast.sparse_constraint(block, 'global_limit', uids, terms, "<=",
+                                 [limit[e] for e in uids], block.uids)
+        return
 
     # set upper bounds: sum(yearly commodity output) <= yearly_limit
     def output_limit_rule(block, e):
-        lhs = sum(model.w[e, o, t] for t in model.timesteps for o in O[e]) -\
-              limit[e]
+        lhs = sum(model.w[e, o, t] * model.energy_weights[t]
+                  for t in model.timesteps for o in O[e]) - limit[e]
         # if bus is defined but has not outputs Constraint is skipped
         # TODO: should be logged as well?
         if isinstance(lhs, (int, float)) or limit[e] == float('inf'):
@@ -416,7 +500,13 @@ def add_fixed_source(model, block):
     val = {obj.uid: obj.val for obj in block.objs}
 
 
-    if not block.optimization_options.get('investment', False):
+    if (not block.optimization_options.get('investment', False) and
+            model.energysystem.simulation.fast_build):
+        uids = [obj.uid for obj in block.objs]
+        values = (pofast.sequences(val, uids, model.timesteps) *
+                  _out_max(out_max, uids))
+        pofast.fix_values(pofast.outflow_variables(model, block, 0), values)
+    elif not block.optimization_options.get('investment', False):
         # maximal ouput of renewable source (in general installed capacity)
         out_max = {obj.uid: obj.out_max for obj in block.objs}
         # edges for renewables ([('wind_on', 'b_el'), ...)
@@ -435,6 +525,21 @@ def add_fixed_source(model, block):
         for e in block.uids:
             block.add_out[e].setub(add_out_limit[e])
 
+        if model.energysystem.simulation.fast_build:
+            uids = [obj.uid for obj in block.objs]
+            rows = pofast.timestep_rows(uids, model.timesteps)
+            index = pofast.timestep_index(uids, model.timesteps)
+            values = pofast.sequences(val, uids, model.timesteps)
+            add_out = pofast.variable_array(block.add_out, uids)[:, None]
+            terms = [(rows, 1, pofast.outflow_variables(model, block, 0)),
+                     (rows, -values, add_out)]
+            pofast.sparse_constraint(block, 'invest', index,
+                                     terms, "==",
+                                     (values * _out_max(out_max,
+                                                        uids)).ravel(),
+                                     block.indexset)
+            return
+
         def invest_rule(block, e, t):
             lhs = model.w[e, model.O[e][0], t]
             rhs = (out_max[e][0] + block.add_out[e]) * val[e][t]
@@ -472,8 +577,11 @@ def add_dispatch_source(model, block):
     if not block.objs or block.objs is None:
         raise ValueError('No objects defined. Please specify objects for' +
                           'which dispatch source constaints should be set.')
-    # create dispatch var
-    block.curtailment_var = po.Var(block.indexset, within=po.NonNegativeReals)
+    # create dispatch var (kept if the constraint is built again, see
+    # OptimizationModel.update())
+    if block.component('curtailment_var') is None:
+        block.curtailment_var = po.Var(block.indexset,
+                                       within=po.NonNegativeReals)
 
     # normed value of renewable source (0 <= value <=1)
     val = {}
@@ -482,6 +590,21 @@ def add_dispatch_source(model, block):
          out_max[e.uid] = e.out_max
          val[e.uid] = e.val
 
+    if model.energysystem.simulation.fast_build:
+        uids = [obj.uid for obj in block.objs]
+        rows = pofast.timestep_rows(uids, model.timesteps)
+        index = pofast.timestep_index(uids, model.timesteps)
+        values = (pofast.sequences(val, uids, model.timesteps) *
+                  _out_max(out_max, uids))
+        outflows = pofast.outflow_variables(model, block, 0)
+        pofast.set_bounds(outflows, upper=values)
+        terms = [(rows, 1, pofast.block_variables(block.curtailment_var,
+                                                  uids, model.timesteps)),
+                 (rows, 1, outflows)]
+        pofast.sparse_constraint(block, 'curtailment', index,
+                                 terms, "==", values.ravel(), block.indexset)
+        return
+
     ee = model.edges(block.objs)
     # fixed values for every timestep
     for (e1, e2) in ee:
@@ -501,10 +624,14 @@ def add_storage_balance(model, block):
 
      The mathematical formulation of the constraint is as follows:
 
-    .. math:: l_e(t) = l_e(t-1) \\cdot (1 - C^{loss}(e)) \
-    - \\frac{w_{e,o_e}(t)}{\\eta^{out}_e} \
-    + w_{i_e,e}(t) \\cdot \\eta^{in}_e  \\qquad \\forall e, \\forall t \\in [2, t_{max}]
+    .. math:: l_e(t) = l_e(t-1) \\cdot (1 - C^{loss}(e))^{\\Delta t} \
+    - \\frac{w_{e,o_e}(t)}{\\eta^{out}_e} \\cdot \\Delta t \
+    + w_{i_e,e}(t) \\cdot \\eta^{in}_e \\cdot \\Delta t \
+    \\qquad \\forall e, \\forall t \\in [2, t_{max}]
 
+    With the duration :math:`\\Delta t` of timestep t (see
+    `timestep_durations` of :class:`Simulation
+    <oemof.core.energy_system.Simulation>`).
 
     With :math:`e  \\in \mathcal{E}` and :math:`\mathcal{E}` beeing the
     set of unique ids for all entities grouped in the attribute `block.objs`.
@@ -535,29 +662,123 @@ def add_storage_balance(model, block):
         eta_in[e.uid] = e.eta_in
         eta_out[e.uid] = e.eta_out
 
-    # set cap of last timesteps to fixed value of cap_initial
+    dt = model.timestep_durations
+    if model.periods is not None:
+        _add_storage_period_balance(model, block, cap_initial, cap_loss,
+                                    eta_in, eta_out)
+        return
+
+    # set cap of last timesteps to fixed value of cap_final (cap_initial by
+    # default), a cap_final of False leaves it free
     t_last = len(model.timesteps)-1
-    for e in block.uids:
-      block.cap[e, t_last] = cap_initial[e]
-      block.cap[e, t_last].fix()
+    for e in block.objs:
+        if e.cap_final is False:
+            block.cap[e.uid, t_last].unfix()
+        elif e.cap_final is None:
+            block.cap[e.uid, t_last].fix(e.cap_initial)
+        else:
+            block.cap[e.uid, t_last].fix(e.cap_final)
+
+    if model.energysystem.simulation.fast_build:
+        uids = [obj.uid for obj in block.objs]
+        rows = pofast.timestep_rows(uids, model.timesteps)
+        index = pofast.timestep_index(uids, model.timesteps)
+        cap = pofast.block_variables(block.cap, uids, model.timesteps)
+        loss = np.array([cap_loss[e] for e in uids])[:, None]
+        dt_n = np.array([dt[t] for t in model.timesteps], dtype=float)
+        terms = [(rows, 1, cap),
+                 (rows[:, 1:], -(1 - loss) ** dt_n[1:], cap[:, :-1]),
+                 (rows, -np.array([eta_in[e] for e in uids])[:, None] * dt_n,
+                  pofast.inflow_variables(model, block)),
+                 (rows, dt_n / np.array([eta_out[e] for e in uids])[:, None],
+                  pofast.outflow_variables(model, block, 0))]
+        rhs = np.zeros(rows.shape)
+        rhs[:, 0] = [cap_initial[e] for e in uids]
+        pofast.sparse_constraint(block, 'balance', index,
+                                 terms, "==", rhs.ravel(), block.indexset)
+        return
 
     def storage_balance_rule(block, e, t):
-        # TODO:
-        #   - include time increment
         expr = 0
         if(t == 0):
             expr += block.cap[e, t] - cap_initial[e]
-            expr += - model.w[model.I[e], e, t] * eta_in[e]
-            expr += + model.w[e, model.O[e][0], t] / eta_out[e]
+            expr += - model.w[model.I[e], e, t] * eta_in[e] * dt[t]
+            expr += + model.w[e, model.O[e][0], t] / eta_out[e] * dt[t]
         else:
             expr += block.cap[e, t]
-            expr += - block.cap[e, t-1] * (1 - cap_loss[e])
-            expr += - model.w[model.I[e], e, t] * eta_in[e]
-            expr += + model.w[e, model.O[e][0], t] / eta_out[e]
+            expr += - block.cap[e, t-1] * (1 - cap_loss[e]) ** dt[t]
+            expr += - model.w[model.I[e], e, t] * eta_in[e] * dt[t]
+            expr += + model.w[e, model.O[e][0], t] / eta_out[e] * dt[t]
         return(expr, 0)
     block.balance = po.Constraint(block.indexset, rule=storage_balance_rule)
 
 
+def _add_storage_period_balance(model, block, cap_initial, cap_loss, eta_in,
+                                eta_out):
+    """ Storage balance for timesteps made of typical periods (see
+    :py:mod:`oemof.solph.aggregation`).
+
+    Inside of every typical period k the storage level `block.cap` is
+    relative to the level at the beginning of the period (and may be
+    negative). The levels at the beginning of the original periods p are
+    modeled by `block.cap_inter` and linked through the change of the level
+    over the typical period representing p:
+
+    .. math:: l^{inter}_e(p+1) = l^{inter}_e(p) \\cdot (1 - C^{loss}(e))^L \
+    + l_e(t^{end}_{k(p)}), \\qquad \\forall e, \\forall p
+
+    with the length :math:`L` of the periods in hours.
+
+    The level at the beginning of the first period is fixed to `cap_initial`,
+    the level at the end of the last period to `cap_final`.
+    """
+    periods = model.periods
+    n = periods.period_length
+    timesteps = list(model.timesteps)
+    position = {t: k for k, t in enumerate(timesteps)}
+    dt = model.timestep_durations
+    # relative level inside of the typical periods has no bounds
+    for e in block.uids:
+        for t in timesteps:
+            block.cap[e, t].setlb(None)
+            block.cap[e, t].setub(None)
+
+    def storage_balance_rule(block, e, t):
+        expr = 0
+        expr += block.cap[e, t]
+        if position[t] % n != 0:
+            expr += - block.cap[e, t-1] * (1 - cap_loss[e]) ** dt[t]
+        expr += - model.w[model.I[e], e, t] * eta_in[e] * dt[t]
+        expr += + model.w[e, model.O[e][0], t] / eta_out[e] * dt[t]
+        return(expr, 0)
+    block.balance = po.Constraint(block.indexset, rule=storage_balance_rule)
+
+    n_periods = len(periods.order)
+    if block.component('cap_inter') is None:
+        block.cap_inter = po.Var(block.uids, range(n_periods + 1),
+                                 within=po.NonNegativeReals)
+    for e in block.objs:
+        block.cap_inter[e.uid, 0].fix(cap_initial[e.uid])
+        if e.cap_final is False:
+            block.cap_inter[e.uid, n_periods].unfix()
+        elif e.cap_final is None:
+            block.cap_inter[e.uid, n_periods].fix(e.cap_initial)
+        else:
+            block.cap_inter[e.uid, n_periods].fix(e.cap_final)
+
+    def inter_period_balance_rule(block, e, p):
+        k = periods.order[p]
+        t_end = timesteps[(k + 1) * n - 1]
+        hours = sum(dt[t] for t in timesteps[k * n:(k + 1) * n])
+        expr = 0
+        expr += block.cap_inter[e, p + 1]
+        expr += - block.cap_inter[e, p] * (1 - cap_loss[e]) ** hours
+        expr += - block.cap[e, t_end]
+        return(expr, 0)
+    block.inter_balance = po.Constraint(block.uids, range(n_periods),
+                                        rule=inter_period_balance_rule)
+
+
 def add_storage_charge_discharge_limits(model, block):
     """ Constraints that limit the discharge and charge power by the c-rate
 
@@ -584,6 +805,26 @@ def add_storage_charge_discharge_limits(model, block):
     c_rate_in = {obj.uid: obj.c_rate_in for obj in block.objs}
     cap_max = {obj.uid: obj.cap_max for obj in block.objs}
 
+    if model.energysystem.simulation.fast_build:
+        uids = [obj.uid for obj in block.objs]
+        rows = pofast.timestep_rows(uids, model.timesteps)
+        index = pofast.timestep_index(uids, model.timesteps)
+        add_cap = pofast.variable_array(block.add_cap, uids)[:, None]
+        cap_max_n = np.array([cap_max[e] for e in uids])[:, None]
+        for name, c_rate, flows in [
+                ('discharge_limit_invest', c_rate_out,
+                 pofast.outflow_variables(model, block, 0)),
+                ('charge_limit_invest', c_rate_in,
+                 pofast.inflow_variables(model, block))]:
+            c_rate_n = np.array([c_rate[e] for e in uids])[:, None]
+            terms = [(rows, 1, flows),
+                     (rows, -c_rate_n, add_cap)]
+            rhs = np.broadcast_to(cap_max_n * c_rate_n, rows.shape)
+            pofast.sparse_constraint(block, name, index, terms, "<=",
+                                     rhs.ravel(), block.uids,
+                                     model.timesteps)
+        return
+
     def storage_discharge_limit_rule(block, e, t):
         expr = 0
         expr += model.w[e, model.O[e][0], t]
@@ -597,7 +838,7 @@ def add_storage_charge_discharge_limits(model, block):
 
     def storage_charge_limit_rule(block, e, t):
         expr = 0
-        expr += model.w[e, model.I[e], t]
+        expr += model.w[model.I[e], e, t]
         expr += -(cap_max[e] + block.add_cap[e]) \
             * c_rate_in[e]
         return(expr <= 0)
@@ -626,6 +867,10 @@ def add_output_gradient_calc(model, block, grad_direc='both', idx=0):
 
     .. math:: g^{neg}_{e_o}(t) \\leq \overline{G}^{neg}_{e_o}, \\qquad \\forall e, \\forall t
 
+    The bounds of the gradients are multiplied with the duration of
+    timestep t (see `timestep_durations` of :class:`Simulation
+    <oemof.core.energy_system.Simulation>`).
+
     With :math:`e  \\in \mathcal{E}` and :math:`\mathcal{E}` beeing the
     set of unique ids for all entities grouped in the attribute `block.objs`.
 
@@ -666,11 +911,27 @@ def add_output_gradient_calc(model, block, grad_direc='both', idx=0):
         else:
             return(po.Constraint.Skip)
 
+    dt = model.timestep_durations
+
     def grad_pos_bound_rule(block, e, t):
-        return((0, grad_pos[e]))
+        return((0, grad_pos[e] * dt[t]))
 
     def grad_neg_bound_rule(block, e, t):
-        return((0, grad_neg[e]))
+        return((0, grad_neg[e] * dt[t]))
+
+    def grad_calc_sparse(name, var, sign):
+        # sign * (w(t) - w(t-1)) - grad_var(t) <= 0 for all t > 0
+        uids = [obj.uid for obj in block.objs]
+        rows = np.arange(len(uids) * (len(model.timesteps) - 1)).reshape(
+            len(uids), len(model.timesteps) - 1)
+        flows = pofast.outflow_variables(model, block, idx)
+        terms = [(rows, sign, flows[:, 1:]),
+                 (rows, -sign, flows[:, :-1]),
+                 (rows, -1, pofast.block_variables(var, uids,
+                                                   model.timesteps)[:, 1:])]
+        index = [(e, t) for e in uids for t in model.timesteps[1:]]
+        pofast.sparse_constraint(block, name, index, terms, "<=", 0.,
+                                 block.indexset)
 
     # negative gradient
     if grad_direc == 'positive' or grad_direc == "both":
@@ -679,8 +940,11 @@ def add_output_gradient_calc(model, block, grad_direc='both', idx=0):
         block.grad_pos_var = po.Var(block.indexset, within=po.NonNegativeReals,
                                     bounds=grad_pos_bound_rule)
         # set constraint
-        block.grad_pos_calc = po.Constraint(block.indexset,
-                                            rule=grad_pos_calc_rule)
+        if model.energysystem.simulation.fast_build:
+            grad_calc_sparse('grad_pos_calc', block.grad_pos_var, 1)
+        else:
+            block.grad_pos_calc = po.Constraint(block.indexset,
+                                                rule=grad_pos_calc_rule)
 
     # positive gradient
     if grad_direc == 'negative' or grad_direc == "both":
@@ -689,7 +953,13 @@ def add_output_gradient_calc(model, block, grad_direc='both', idx=0):
         block.grad_neg_var = po.Var(block.indexset, within=po.NonNegativeReals,
                                     bounds=grad_neg_bound_rule)
         # set constraint
-        block.grad_neg_calc = po.Constraint(block.indexset,
-                                            rule=grad_neg_calc_rule)
+        if model.energysystem.simulation.fast_build:
+            grad_calc_sparse('grad_neg_calc', block.grad_neg_var, -1)
+        else:
+            block.grad_neg_calc = po.Constraint(block.indexset,
+                                                rule=grad_neg_calc_rule)
 
 
+def _out_max(out_max, uids):
+    """ First element of out_max[e] of all `uids` as column vector."""
+    return np.array([out_max[e][0] for e in uids], dtype=float)[:, None]
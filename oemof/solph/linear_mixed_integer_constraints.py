@@ -4,8 +4,11 @@ The module contains linear mixed integer constraints.
 
 @author: Simon Hilpert (simon.hilpert@fh-flensburg.de)
 """
+import numpy as np
 import pyomo.environ as po
 
+from . import pyomo_fastbuild as pofast
+
 
 def set_bounds(model, block, side="output"):
     """ Set upper and lower bounds via constraints.
@@ -47,6 +50,34 @@ def set_bounds(model, block, side="output"):
     if block.objs is None:
         raise ValueError("No objects defined. Please specify objects for \
                          which bounds should be set.")
+
+    if model.energysystem.simulation.fast_build:
+        uids = [obj.uid for obj in block.objs]
+        rows = pofast.timestep_rows(uids, model.timesteps)
+        index = pofast.timestep_index(uids, model.timesteps)
+        y = pofast.block_variables(block.y, uids, model.timesteps)
+        if side == "output":
+            flows = pofast.outflow_variables(model, block, 0)
+            names = ("maximum_output", "minimum_output")
+            w_max = [obj.out_max[0] for obj in block.objs]
+            w_min = [obj.out_min[0] for obj in block.objs]
+        if side == "input":
+            flows = pofast.inflow_variables(model, block)
+            names = ("maximum_input", "minimum_input")
+            w_max = [obj.in_max[0] for obj in block.objs]
+            w_min = [obj.in_min[0] for obj in block.objs]
+        # w - y * w_max <= 0
+        terms = [(rows, 1, flows),
+                 (rows, -np.array(w_max, dtype=float)[:, None], y)]
+        pofast.sparse_constraint(block, names[0], index, terms, "<=", 0.,
+                                 block.indexset)
+        # y * w_min - w <= 0
+        terms = [(rows, np.array(w_min, dtype=float)[:, None], y),
+                 (rows, -1, flows)]
+        pofast.sparse_constraint(block, names[1], index, terms, "<=", 0.,
+                                 block.indexset)
+        return
+
     if side == "output":
         out_max = {obj.uid: obj.out_max for obj in block.objs}
 
@@ -110,6 +141,20 @@ def add_variable_linear_eta_relation(model, block):
 
     c = {obj.uid: obj.coeff for obj in block.objs}
 
+    if model.energysystem.simulation.fast_build:
+        uids = [obj.uid for obj in block.objs]
+        rows = pofast.timestep_rows(uids, model.timesteps)
+        terms = [(rows, 1, pofast.inflow_variables(model, block)),
+                 (rows, -np.array([c[e][0] for e in uids])[:, None],
+                  pofast.block_variables(block.y, uids, model.timesteps)),
+                 (rows, -np.array([c[e][1] for e in uids])[:, None],
+                  pofast.outflow_variables(model, block, 0))]
+        pofast.sparse_constraint(
+            block, 'variable_linear_eta_relation',
+            pofast.timestep_index(uids, model.timesteps), terms, "==", 0.,
+            block.indexset)
+        return
+
     def variable_linear_eta_rule(block, e, t):
         lhs = model.w[model.I[e], e, t]
         rhs = block.y[e,t]*c[e][0] + c[e][1] * model.w[e, model.O[e][0], t]
@@ -131,6 +176,9 @@ def add_output_gradient_constraints(model, block, grad_direc="both"):
     .. math:: w_{e,o_{e,1}}(t-1) - w_{e,o_{e,1}}(t) \\leq \\overline{G}^{neg}_{e_{o,1}} + \
     \\underline{W}_{e, o_{e,1}} \\cdot (1 - y_{e}(t-1))
 
+    The gradients are multiplied with the duration of timestep t (see
+    `timestep_durations` of :class:`Simulation
+    <oemof.core.energy_system.Simulation>`).
 
     Parameters
     ----------
@@ -154,13 +202,14 @@ def add_output_gradient_constraints(model, block, grad_direc="both"):
 
     out_min = {obj.uid: obj.out_min for obj in block.objs}
     grad_pos = {obj.uid: obj.grad_pos for obj in block.objs}
+    dt = model.timestep_durations
 
     # TODO: Define correct boundary conditions for t-1 of time
     def grad_pos_rule(block, e, t):
         if t > 1:
             return(model.w[e, model.O[e][0], t] - \
                model.w[e, model.O[e][0], t-1] <=  \
-               grad_pos[e] + out_min[e][0] * (1 -block.y[e, t]))
+               grad_pos[e] * dt[t] + out_min[e][0] * (1 -block.y[e, t]))
         else:
             return(po.Constraint.Skip)
 
@@ -169,13 +218,38 @@ def add_output_gradient_constraints(model, block, grad_direc="both"):
     def grad_neg_rule(block, e, t):
         if t > 1:
             lhs = model.w[e, model.O[e][0], t-1] - model.w[e, model.O[e][0], t]
-            rhs =  grad_neg[e] + \
+            rhs =  grad_neg[e] * dt[t] + \
                    out_min[e][0] * (1 -block.y[e, t-1])
             return(lhs <=  rhs)
 
         else:
             return(po.Constraint.Skip)
 
+    def grad_sparse(name, sign, grad, y):
+        # sign * (w(t) - w(t-1)) + out_min * y <= grad + out_min for t > 1
+        uids = [obj.uid for obj in block.objs]
+        rows, index = _rows_from(uids, model.timesteps, 2)
+        flows = pofast.outflow_variables(model, block, 0)
+        w_min = np.array([out_min[e][0] for e in uids], dtype=float)[:, None]
+        terms = [(rows, sign, flows[:, 2:]),
+                 (rows, -sign, flows[:, 1:-1]),
+                 (rows, w_min, y)]
+        dt_n = np.array([dt[t] for t in model.timesteps], dtype=float)
+        rhs = (np.array([grad[e] for e in uids], dtype=float)[:, None] *
+               dt_n[2:] + w_min)
+        pofast.sparse_constraint(block, name, index, terms, "<=",
+                                 np.broadcast_to(rhs, rows.shape).ravel(),
+                                 block.indexset)
+
+    if model.energysystem.simulation.fast_build:
+        uids = [obj.uid for obj in block.objs]
+        y = pofast.block_variables(block.y, uids, model.timesteps)
+        if grad_direc == "positive" or grad_direc == "both":
+            grad_sparse('milp_gradient_pos', 1, grad_pos, y[:, 2:])
+        if grad_direc == "negative" or grad_direc == "both":
+            grad_sparse('milp_gradient_neg', -1, grad_neg, y[:, 1:-1])
+        return
+
     # positive gradient
     if grad_direc == "positive" or grad_direc == "both":
         block.milp_gradient_pos = po.Constraint(block.indexset,
@@ -211,6 +285,13 @@ def add_startup_constraints(model, block):
     # create binary start-up variables for objects
     block.z_start = po.Var(block.uids, model.timesteps, within=po.Binary)
 
+    if model.energysystem.simulation.fast_build:
+        # y(t) - y(t-1) - z_start(t) <= 0 for t >= 1
+        _status_change(model, block, 'start_up', block.z_start, 1, 1)
+        return
+
+    status_initial = _status_initial(block)
+
     def start_up_rule(model, e, t):
         if t >= 1:
             try:
@@ -220,6 +301,9 @@ def add_startup_constraints(model, block):
             except:
                 raise AttributeError('Constructing startup constraints for' +
                                      ' component with uid: %s went wrong', e)
+        elif e in status_initial:
+            lhs = block.y[e, t] - status_initial[e] - block.z_start[e, t]
+            return(lhs <= 0)
         else:
             # TODO: Define correct boundary conditions
             return(po.Constraint.Skip)
@@ -252,11 +336,21 @@ def add_shutdown_constraints(model, block):
     # create binary start-up variables for objects
     block.z_stop = po.Var(block.uids, model.timesteps, within=po.Binary)
 
+    if model.energysystem.simulation.fast_build:
+        # y(t-1) - y(t) - z_stop(t) <= 0 for t > 1
+        _status_change(model, block, 'shut_down', block.z_stop, -1, 2)
+        return
+
+    status_initial = _status_initial(block)
+
     def shutdown_rule(block, e, t):
         if t > 1:
             lhs = block.y[e, t-1] - block.y[e, t] - block.z_stop[e, t]
             rhs = 0
             return(lhs <= rhs)
+        elif t == 0 and e in status_initial:
+            lhs = status_initial[e] - block.y[e, t] - block.z_stop[e, t]
+            return(lhs <= 0)
         else:
             # TODO: Define correct boundary conditions
             return(po.Constraint.Skip)
@@ -295,6 +389,11 @@ def add_minimum_downtime(model, block):
     t_min_off = {obj.uid: obj.t_min_off for obj in block.objs}
     t_max = len(model.timesteps)-1
 
+    if model.energysystem.simulation.fast_build:
+        # (y(t-1) - y(t)) * T - T + sum(y(t+p)) <= 0
+        _minimum_time(model, block, 'minimum_downtime', t_min_off, -1)
+        return
+
     def minimum_downtime_rule(block, e, t):
         if t <= 1:
             return po.Constraint.Skip
@@ -345,6 +444,11 @@ def add_minimum_uptime(model, block):
     t_min_on = {obj.uid: obj.t_min_on for obj in block.objs}
     t_max = len(model.timesteps)-1
 
+    if model.energysystem.simulation.fast_build:
+        # (y(t) - y(t-1)) * T - sum(y(t+p)) <= 0
+        _minimum_time(model, block, 'minimum_uptime', t_min_on, 1)
+        return
+
     def minimum_uptime_rule(block, e, t):
         if t <= 1:
             return po.Constraint.Skip
@@ -359,3 +463,75 @@ def add_minimum_uptime(model, block):
             return(lhs <= rhs)
     block.minimum_uptime = po.Constraint(block.indexset,
                                           rule=minimum_uptime_rule)
+
+
+def _rows_from(uids, timesteps, start):
+    """ Row positions and constraint indices (uid, t) for all timesteps
+    beginning with the `start`-th timestep (fast_build).
+    """
+    timesteps = list(timesteps)[start:]
+    return (pofast.timestep_rows(uids, timesteps),
+            pofast.timestep_index(uids, timesteps))
+
+
+def _status_initial(block):
+    """ Initial status (see `status_initial` of :class:`Transformer
+    <oemof.core.network.entities.components.Transformer>`) of all objects
+    of `block` for which it is set.
+    """
+    return {obj.uid: obj.status_initial for obj in block.objs
+            if getattr(obj, 'status_initial', None) is not None}
+
+
+def _status_change(model, block, name, z, sign, start):
+    """ Sparse constraints sign * (y(t) - y(t-1)) - z(t) <= 0 for all
+    timesteps beginning with the `start`-th timestep (fast_build). For
+    objects with initial status the first timestep is added with the
+    initial status in place of y(t-1).
+    """
+    uids = [obj.uid for obj in block.objs]
+    rows, index = _rows_from(uids, model.timesteps, start)
+    y = pofast.block_variables(block.y, uids, model.timesteps)
+    z = pofast.block_variables(z, uids, model.timesteps)
+    terms = [(rows, sign, y[:, start:]),
+             (rows, -sign, y[:, start - 1:-1]),
+             (rows, -1, z[:, start:])]
+    rhs = np.zeros(rows.size)
+    status_initial = _status_initial(block)
+    if status_initial:
+        k = [uids.index(e) for e in status_initial]
+        first = np.arange(rows.size, rows.size + len(k))
+        terms += [(first, sign, y[k, 0]), (first, -1, z[k, 0])]
+        index = index + [(e, model.timesteps[0]) for e in status_initial]
+        rhs = np.concatenate([rhs, sign * np.array(
+            list(status_initial.values()), dtype=float)])
+    pofast.sparse_constraint(block, name, index, terms, "<=", rhs,
+                             block.indexset)
+
+
+def _minimum_time(model, block, name, t_min, sign):
+    """ Sparse minimum up- (sign=1) or downtime (sign=-1) constraints
+    (fast_build). The sum over the status variables of the following
+    min(t_min, t_max - t) timesteps is built for all rows at once.
+    """
+    uids = [obj.uid for obj in block.objs]
+    rows, index = _rows_from(uids, model.timesteps, 2)
+    y = pofast.block_variables(block.y, uids, model.timesteps)
+    t_max = len(model.timesteps) - 1
+    t = np.arange(2, t_max + 1)
+    window_rows, window_y, rhs = [], [], []
+    for k, e in enumerate(uids):
+        length = np.minimum(t_min[e], t_max - t).astype(np.int64)
+        offset = (np.arange(length.sum()) -
+                  np.repeat(np.cumsum(length) - length, length))
+        window_rows.append(np.repeat(rows[k], length))
+        window_y.append(y[k][np.repeat(t, length) + offset])
+        rhs.append(np.full(len(t), t_min[e] if sign < 0 else 0,
+                           dtype=float))
+    t_min = np.array([t_min[e] for e in uids], dtype=float)[:, None]
+    terms = [(rows, sign * t_min, y[:, 2:]),
+             (rows, -sign * t_min, y[:, 1:-1]),
+             (np.concatenate(window_rows), -sign,
+              np.concatenate(window_y))]
+    pofast.sparse_constraint(block, name, index, terms, "<=",
+                             np.concatenate(rhs), block.indexset)
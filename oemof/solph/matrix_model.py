@@ -0,0 +1,880 @@
+# -*- coding: utf-8 -*-
+"""
+Optimization model assembled as sparse matrices and solved in-process with
+HiGHS (via scipy), as alternative to the pyomo model of
+:py:mod:`oemof.solph.optimization_model`.
+
+The columns (flows of the edges for every timestep, storage levels, slacks
+of the buses, status and investment variables) and the rows of the
+constraints are numbered while the model is built, every constraint family
+is added at once as coefficient, row and column arrays in coordinate (COO)
+format. No python object is created per variable or per constraint and no
+problem file is written.
+
+The formulation follows the assemblers of the pyomo model for the
+components with their default `optimization_options` (with or without
+investment) and the objective function :func:`minimize_cost
+<oemof.solph.predefined_objectives.minimize_cost>`. Typical periods,
+revenues and user defined constraint functions are not supported.
+
+"""
+
+from functools import singledispatch
+import logging
+
+import numpy as np
+
+from ..core.network.entities import Bus
+from ..core.network.entities import components as cp
+from ..core.network.entities.components.transformers import (
+    CHP, Simple, SimpleExtractionCHP, Storage, VariableEfficiencyCHP)
+from ..core.network.entities.components.sources import (
+    Commodity, DispatchSource, FixedSource)
+from ..core.network.entities.components.sinks import Simple as Sink
+from ..core.network.entities.components import transports
+from .graph_index import GraphIndex
+from .results import LazyResults, Results, solution_vector, stack
+
+try:
+    import scipy
+    import scipy.sparse as sp
+    from scipy.optimize import Bounds, LinearConstraint, linprog
+except ImportError:
+    sp = None
+    logging.info('scipy not installed, the matrix model will not work.')
+else:
+    # HiGHS is a method of linprog from scipy 1.6 on
+    if np.lib.NumpyVersion(scipy.__version__) < '1.6.0':
+        sp = None
+        logging.info('scipy < 1.6 installed, the matrix model will not ' +
+                     'work.')
+try:
+    from scipy.optimize import milp
+except ImportError:
+    milp = None
+    logging.info('scipy < 1.9 installed, the matrix model will not solve ' +
+                 'mixed integer problems.')
+
+
+# termination conditions of the status codes of scipy's linprog and milp
+TERMINATION_CONDITIONS = {0: 'optimal', 1: 'maxIterations', 2: 'infeasible',
+                          3: 'unbounded', 4: 'other'}
+
+# component classes in the cost terms of minimize_cost by default
+COST_OBJECTS = [Simple, VariableEfficiencyCHP, SimpleExtractionCHP, Storage,
+                CHP, FixedSource, Commodity]
+
+
+@singledispatch
+def assembler(e, mm, objs):
+    """ Assemblers add the columns and rows of a set of objects of one class
+    to a :class:`MatrixModel` (see :func:`assembler
+    <oemof.solph.optimization_model.assembler>` of the pyomo model).
+
+    This is the most general form of assembler function, called only if no
+    other, more specific assemblers have been found.
+
+    Parameters
+    ----------
+    e : An object. Only used to figure out which assembler function to
+        call by dispatching on its `type`.
+    mm : The :class:`MatrixModel`.
+    objs : The objects of the class.
+
+    Returns
+    -------
+    mm : The matrix model passed in as an argument.
+    """
+    raise TypeError(
+        "The matrix model can not generate constraints for object:" +
+        "\n\n {o}\n\n of type:\n\n {t}".format(o=e, t=type(e)))
+
+
+class MatrixModel:
+    r"""Linear (mixed integer) problem of an energy system as sparse matrices,
+    solved with HiGHS.
+
+    The model offers :meth:`solve`, :meth:`results` and :meth:`release` like
+    the :class:`OptimizationModel
+    <oemof.solph.optimization_model.OptimizationModel>`, the results have
+    the same structure. It is used by :meth:`EnergySystem.optimize
+    <oemof.core.energy_system.EnergySystem.optimize>` if `backend` of the
+    simulation is 'scipy'.
+
+    Parameters
+    ----------
+    energysystem : EnergySystem() instance
+
+    Attributes
+    ----------
+    w : numpy.ndarray
+        Column of the flow of every edge (rows, in the order of
+        `all_edges`) and timestep (columns).
+    columns : dict
+        Columns of the variables of the objects keyed by (uid, name), e.g.
+        ('storage', 'cap'), ('storage', 'add_cap') or ('chp', 'y').
+    lower, upper, cost : numpy.ndarray
+        Bounds and objective coefficient of every column.
+    integer : numpy.ndarray
+        True for the columns of integer (binary) variables.
+    constant : float
+        Constant of the objective function (e.g. fixed costs).
+    column_timesteps : numpy.ndarray
+        Position of the timestep of every column, -1 for columns bound to
+        no timestep (e.g. investments).
+    timestep_constants : numpy.ndarray
+        Part of :attr:`constant` of every timestep.
+    """
+    def __init__(self, energysystem):
+        if sp is None:
+            raise ImportError("The matrix model requires scipy >= 1.6.")
+        self.energysystem = energysystem
+        self.entities = energysystem.entities
+        simulation = energysystem.simulation
+        self.timesteps = simulation.timesteps
+        self.objective_options = simulation.objective_options
+        self.relaxed = getattr(simulation, "relaxed", False)
+        if getattr(simulation, "periods", None) is not None:
+            raise ValueError("Typical periods are not supported by the " +
+                             "matrix model.")
+        n = len(self.timesteps)
+        weights = getattr(simulation, "timestep_weights", None)
+        durations = getattr(simulation, "timestep_durations", None)
+        self.timestep_durations = np.ones(n) if durations is None else \
+            np.asarray(durations, dtype=float)
+        # weight of the flows in sums of energies over all timesteps
+        self.energy_weights = self.timestep_durations * (
+            1 if weights is None else np.asarray(weights, dtype=float))
+
+        # ids, edges and incidence of the entities (built once)
+        self.graph = GraphIndex(self.entities)
+        self.components = self.graph.components
+        self.all_edges = self.graph.edges
+        self.edge_ids = self.graph.edge_ids
+        self.I = {c.uid: self.graph.inputs(c.uid)[0] for c in self.components
+                  if not isinstance(c, cp.Source)}
+        self.O = {c.uid: self.graph.outputs(c.uid) for c in self.components
+                  if not isinstance(c, cp.Sink)}
+
+        self.lower = np.zeros(0)
+        self.upper = np.zeros(0)
+        self.cost = np.zeros(0)
+        self.integer = np.zeros(0, dtype=bool)
+        self.column_timesteps = np.zeros(0, dtype=np.int64)
+        self.constant = 0.
+        self.timestep_constants = np.zeros(n)
+        self.columns = {}
+        self.rows = {"==": _Rows(), "<=": _Rows()}
+        self.w = self.add_columns((len(self.all_edges), n))
+
+        # components by type
+        self.cbt = self.graph.by_type
+        logging.info("Building matrix model.")
+        for cls, objs in self.cbt.items():
+            _check_options(cls)
+            assembler.dispatch(cls)(e=None, mm=self, objs=objs)
+        self.buses = list(self.entities.groups.get(Bus, []))
+        assembler.dispatch(Bus)(e=None, mm=self, objs=self.buses)
+
+        if not self.objective_options:
+            raise ValueError("No objective options defined!")
+        self.objective_assembler(self.objective_options)
+        self.solution = None
+
+    def edges(self, components):
+        """Returns all edges ([("coal", "pp_coal"), ("pp_coal", "b_el"),
+        ...]) of `components` (see :meth:`OptimizationModel.edges
+        <oemof.solph.optimization_model.OptimizationModel.edges>`).
+        """
+        return self.graph.edges_of(components)
+
+    def add_columns(self, shape, lower=0., upper=np.inf, integer=False,
+                    name=None, uids=None):
+        r"""Adds columns (variables) and returns their positions as array of
+        `shape`.
+
+        Parameters
+        ----------
+        shape : tuple
+        lower, upper : float or array like
+            Bounds, broadcast to `shape`.
+        integer : boolean
+        name : string
+            If given, the columns of every uid of `uids` (rows of the
+            array) are stored under (uid, name) in :attr:`columns`.
+        uids : list
+        """
+        columns = np.arange(len(self.lower),
+                            len(self.lower) + int(np.prod(shape)),
+                            dtype=np.int64).reshape(shape)
+        self.lower = np.concatenate(
+            [self.lower, np.broadcast_to(lower, shape).ravel()])
+        self.upper = np.concatenate(
+            [self.upper, np.broadcast_to(upper, shape).ravel()])
+        self.cost = np.concatenate([self.cost, np.zeros(columns.size)])
+        self.integer = np.concatenate(
+            [self.integer, np.full(columns.size, integer)])
+        # the columns of the timesteps are (objects x timesteps) arrays
+        timesteps = (np.broadcast_to(np.arange(shape[-1]), shape)
+                     if len(shape) == 2 else np.full(shape, -1))
+        self.column_timesteps = np.concatenate(
+            [self.column_timesteps, timesteps.ravel()])
+        if name is not None:
+            for uid, c in zip(uids, columns):
+                self.columns[uid, name] = c
+        return columns
+
+    def add_rows(self, n, terms, sense, rhs):
+        r"""Adds a family of `n` constraints and returns the positions of
+        their rows in the equality or inequality matrix.
+
+        Parameters
+        ----------
+        n : int
+            Number of rows.
+        terms : list
+            Tuples `(rows, coeffs, columns)` like the terms of
+            :func:`sparse_constraint
+            <oemof.solph.pyomo_fastbuild.sparse_constraint>`, with `rows`
+            in 0, ..., n-1 and columns returned by :meth:`add_columns`.
+        sense : string
+            "==" or "<=".
+        rhs : float or array like
+        """
+        return self.rows[sense].add(n, terms, rhs)
+
+    def flows(self, edges):
+        """Columns of the flows of `edges` as array (edges x timesteps)."""
+        return self.w[[self.edge_ids[e] for e in edges]].reshape(
+            len(edges), len(self.timesteps))
+
+    def inflows(self, uids):
+        """Columns of the flows from the input of every uid."""
+        return self.flows([(self.I[e], e) for e in uids])
+
+    def outflows(self, uids, idx=0):
+        """Columns of the flows to output `idx` of every uid."""
+        return self.flows([(e, self.O[e][idx]) for e in uids])
+
+    def sequence(self, values):
+        """Values of a time series at the timesteps as float array."""
+        return np.asarray(values, dtype=float)[
+            np.asarray(list(self.timesteps), dtype=int)]
+
+    def sequences(self, values, uids):
+        """Time series values[e] of all `uids` at the timesteps as array
+        (uids x timesteps)."""
+        return np.array([self.sequence(values[e]) for e in uids],
+                        dtype=float).reshape(len(uids), len(self.timesteps))
+
+    def rows_of(self, uids):
+        """Rows (uid x timestep) of a constraint family per uid and
+        timestep."""
+        return np.arange(len(uids) * len(self.timesteps)).reshape(
+            len(uids), len(self.timesteps))
+
+    def add_cost(self, columns, coeffs):
+        """Adds `coeffs` (broadcast to the shape of `columns`) to the
+        objective coefficients of `columns`."""
+        columns = np.asarray(columns)
+        np.add.at(self.cost, columns.ravel(),
+                  np.broadcast_to(coeffs, columns.shape).ravel())
+
+    def objective_assembler(self, objective_options):
+        r"""Builds the cost vector of :func:`minimize_cost
+        <oemof.solph.predefined_objectives.minimize_cost>`: variable and
+        fixed operation costs, annualised capex of investments, costs of
+        curtailing dispatch sources and of the excess and shortage of
+        buses.
+        """
+        function = objective_options.get("function")
+        if getattr(function, "__name__", None) != "minimize_cost":
+            raise ValueError("The matrix model supports the objective " +
+                             "function minimize_cost only.")
+        if objective_options.get("revenue_objects"):
+            raise ValueError("Revenues are not supported by the matrix " +
+                             "model.")
+        cost_objects = objective_options.get("cost_objects")
+        if cost_objects is None:
+            cost_objects = [str(cls) for cls in COST_OBJECTS]
+
+        for cls, objs in self.cbt.items():
+            if str(cls) not in cost_objects:
+                continue
+            uids = [obj.uid for obj in objs]
+            opex_var = np.array([obj.opex_var for obj in objs],
+                                dtype=float)[:, None]
+            opex_fix = np.array([obj.opex_fix for obj in objs], dtype=float)
+            if cls is Storage:
+                self.add_cost(self.inflows(uids),
+                              opex_var * self.energy_weights)
+                installed, name = [obj.cap_max for obj in objs], "add_cap"
+            else:
+                installed = [obj.out_max[0] for obj in objs]
+                name = "add_out"
+            self.add_cost(self.outflows(uids), opex_var * self.energy_weights)
+            self.constant += float(np.dot(opex_fix, installed))
+            if cls.optimization_options.get("investment", False):
+                add = np.array([self.columns[e, name] for e in uids])
+                self.add_cost(add, opex_fix + np.array(
+                    [obj.crf * obj.capex for obj in objs], dtype=float))
+
+        # costs of curtailment: val * out_max - w
+        dispatch = self.cbt.get(DispatchSource, [])
+        if dispatch:
+            uids = [obj.uid for obj in dispatch]
+            c_curtail = np.array([obj.curtail_costs for obj in dispatch],
+                                 dtype=float)[:, None]
+            outflows = self.outflows(uids)
+            self.add_cost(outflows, -c_curtail * self.energy_weights)
+            constants = (c_curtail * self.energy_weights *
+                         self.upper[outflows]).sum(axis=0)
+            self.timestep_constants += constants
+            self.constant += float(constants.sum())
+
+        for key, costs in [("excess", "excess_costs"),
+                           ("shortage", "shortage_costs")]:
+            buses = [b for b in self.buses if getattr(b, key) is True]
+            if buses:
+                self.add_cost(
+                    np.array([self.columns[b.uid, key] for b in buses]),
+                    np.array([getattr(b, costs) for b in buses],
+                             dtype=float)[:, None] * self.energy_weights)
+
+    def solve(self, solver="highs", duals=None, verbose=None, **kwargs):
+        r"""Solves the model with HiGHS: :func:`scipy.optimize.linprog` for
+        linear problems, :func:`scipy.optimize.milp` if the model has
+        integer variables (no duals).
+
+        Parameters
+        ----------
+        solver : string
+            'highs', 'highs-ds' or 'highs-ipm' (linear problems). Other
+            solvers (e.g. 'glpk', the default of the simulation) are
+            replaced by 'highs'.
+        duals : boolean
+            If True, the duals of the bus balances and the reduced costs of
+            the flows are part of the :meth:`results`.
+        verbose : boolean
+            If True, the output of HiGHS is shown.
+        solver_cmdline_options : dict
+            Options of linprog or milp, e.g. {'time_limit': 60}.
+        **kwargs :
+            Further options of :meth:`OptimizationModel.solve
+            <oemof.solph.optimization_model.OptimizationModel.solve>`
+            (e.g. `debug`, `problem_writer`) are ignored.
+
+        Returns
+        -------
+        scipy.optimize.OptimizeResult
+        """
+        simulation = self.energysystem.simulation
+        if duals is None:
+            duals = getattr(simulation, "duals", False)
+        if verbose is None:
+            verbose = getattr(simulation, "verbose", False)
+        if not str(solver).startswith("highs"):
+            logging.debug("Solver {0} replaced by highs.".format(solver))
+            solver = "highs"
+        options = dict(kwargs.get("solver_cmdline_options") or {})
+        options.setdefault("disp", bool(verbose))
+        A_eq, b_eq = self.rows["=="].matrix(len(self.lower))
+        A_ub, b_ub = self.rows["<="].matrix(len(self.lower))
+        integer = self.integer.any() and not self.relaxed
+
+        logging.info("Handing problem to HiGHS and solving.")
+        if integer and milp is None:
+            raise ImportError("Mixed integer problems require scipy >= 1.9.")
+        if integer:
+            if duals:
+                logging.warning("No duals for mixed integer problems.")
+            constraints = [LinearConstraint(A_eq, b_eq, b_eq),
+                           LinearConstraint(A_ub, -np.inf, b_ub)]
+            result = milp(self.cost, integrality=self.integer.astype(int),
+                          bounds=Bounds(self.lower, self.upper),
+                          constraints=[c for c in constraints
+                                       if c.A.shape[0]],
+                          options=options)
+        else:
+            result = linprog(self.cost,
+                             A_ub=A_ub if A_ub.shape[0] else None,
+                             b_ub=b_ub if A_ub.shape[0] else None,
+                             A_eq=A_eq if A_eq.shape[0] else None,
+                             b_eq=b_eq if A_eq.shape[0] else None,
+                             bounds=np.column_stack([self.lower,
+                                                     self.upper]),
+                             method=solver, options=options)
+        condition = TERMINATION_CONDITIONS.get(result.status, "other")
+        self.solution = {
+            "values": result.x,
+            "objective": None if result.x is None
+            else result.fun + self.constant,
+            "status": "ok" if condition == "optimal" else "warning",
+            "termination_condition": condition,
+            "duals": None, "reduced_costs": None}
+        if duals and not integer and result.x is not None:
+            if "eqlin" not in result:
+                # the marginals are returned from scipy 1.7 on
+                logging.warning("No duals from linprog of scipy < 1.7.")
+            else:
+                self.solution["duals"] = np.asarray(result.eqlin.marginals)
+                self.solution["reduced_costs"] = (
+                    np.asarray(result.lower.marginals) +
+                    np.asarray(result.upper.marginals))
+        logging.info(("Solver status: {0}, termination condition: {1}, " +
+                      "objective: {2}").format(
+                          self.solution["status"], condition,
+                          self.solution["objective"]))
+        return result
+
+    def timestep_costs(self):
+        r"""Returns the objective value of the solved model split into the
+        costs of every timestep and the costs bound to no timestep (e.g.
+        fixed costs or annualised capex), see
+        :meth:`OptimizationModel.timestep_costs
+        <oemof.solph.optimization_model.OptimizationModel.timestep_costs>`.
+        """
+        n = len(self.timesteps)
+        if self.solution is None or self.solution["values"] is None:
+            return np.full(n, np.nan), np.nan
+        values = self.cost * self.solution["values"]
+        timed = self.column_timesteps >= 0
+        costs = np.bincount(self.column_timesteps[timed],
+                            weights=values[timed], minlength=n)
+        costs += self.timestep_constants
+        other = (float(values[~timed].sum()) + self.constant -
+                 float(self.timestep_constants.sum()))
+        return costs, other
+
+    def value(self, uid, name, t):
+        """Value of the variable `name` (e.g. 'cap' or 'y') of `uid` at
+        position `t` of the timesteps (None if the object has no such
+        variable or the model is not solved)."""
+        columns = self.columns.get((uid, name))
+        if columns is None or self.solution is None or \
+                self.solution["values"] is None:
+            return None
+        return self.solution["values"][columns[t]]
+
+    def results(self, directory=None, lazy=False):
+        """ Returns the results with the structure of :meth:`om.results()
+        <oemof.solph.optimization_model.OptimizationModel.results>`: the
+        flows of all edges, the upper bounds of dispatch sources, the levels
+        of the storages, the duals of the balanced buses (if solved with
+        duals), the excess and shortage of the buses and the investment
+        variables as attributes. Values of an unsolved model are nan.
+
+        Parameters
+        ----------
+        directory : string
+            See :meth:`om.results()
+            <oemof.solph.optimization_model.OptimizationModel.results>`.
+        lazy : boolean
+            If True, :class:`LazyResults <oemof.solph.results.LazyResults>`
+            holding the solution vector are returned.
+        """
+        solution = self.solution or {}
+        x = solution.get("values")
+        if x is None:
+            x = np.full(len(self.lower), np.nan)
+        entities = self.entities.by_uid
+        index = [(entities[i], entities[o]) for i, o in self.all_edges]
+        # positions of the rows in the solution vector (or another vector)
+        segments = [(x, self.w)]
+
+        dispatch = self.cbt.get(DispatchSource, [])
+        index.extend((e, e) for e in dispatch)
+        segments.append((self.upper,
+                         self.outflows([e.uid for e in dispatch])))
+        storages = self.cbt.get(Storage, [])
+        if storages:
+            index.extend((e, e) for e in storages)
+            segments.append((x, np.array([self.columns[e.uid, "cap"]
+                                          for e in storages])))
+        if solution.get("duals") is not None:
+            balanced = [b for b in self.buses if b.balanced]
+            index.extend((b, b) for b in balanced)
+            segments.append((solution["duals"], self.balance_rows))
+        for key in ["excess", "shortage"]:
+            buses = [b for b in self.buses if getattr(b, key) is True]
+            if buses:
+                index.extend((b, key) for b in buses)
+                segments.append((x, np.array([self.columns[b.uid, key]
+                                              for b in buses])))
+
+        attributes = {}
+        for entity in self.entities:
+            for attribute in ["add_cap", "add_out"]:
+                column = self.columns.get((entity.uid, attribute))
+                if column is not None:
+                    attributes.setdefault(entity, {})[attribute] = \
+                        float(x[column])
+
+        reduced_costs = None
+        if solution.get("reduced_costs") is not None:
+            reduced_costs = stack([solution["reduced_costs"][self.w]],
+                                  directory)
+        solver_status = None
+        if solution:
+            solver_status = {
+                "status": solution["status"],
+                "termination_condition": solution["termination_condition"]}
+        if lazy:
+            vector, positions = solution_vector(segments)
+            return LazyResults(index, vector, len(self.all_edges),
+                               solution.get("objective"), attributes,
+                               reduced_costs, directory, solver_status,
+                               positions)
+        return Results(index, stack([v[p] for v, p in segments], directory),
+                       len(self.all_edges), solution.get("objective"),
+                       attributes, reduced_costs, directory, solver_status)
+
+    def release(self):
+        r""" Deletes the matrices, bounds and the solution, so their memory
+        is returned. The model can not be used anymore afterwards.
+        """
+        for attribute in ["w", "columns", "rows", "lower", "upper", "cost",
+                          "integer", "column_timesteps", "solution",
+                          "balance_rows", "graph"]:
+            self.__dict__.pop(attribute, None)
+        logging.debug("Matrix model released.")
+
+
+class _Rows:
+    """Coefficients (COO) and right hand sides of the rows of one sense."""
+    def __init__(self):
+        self.n = 0
+        self.rows, self.columns, self.coeffs, self.rhs = [], [], [], []
+
+    def add(self, n, terms, rhs):
+        for r, c, x in terms:
+            r = np.asarray(r, dtype=np.int64)
+            self.rows.append(r.ravel() + self.n)
+            self.coeffs.append(np.broadcast_to(
+                np.asarray(c, dtype=float), r.shape).ravel())
+            self.columns.append(np.broadcast_to(x, r.shape).ravel())
+        self.rhs.append(np.broadcast_to(np.asarray(rhs, dtype=float),
+                                        (n,)).ravel())
+        positions = np.arange(self.n, self.n + n)
+        self.n += n
+        return positions
+
+    def matrix(self, n_columns):
+        """Returns the matrix (csr) and the right hand side vector."""
+        if not self.rows:
+            return sp.csr_matrix((0, n_columns)), np.zeros(0)
+        # duplicate entries are summed up
+        matrix = sp.coo_matrix(
+            (np.concatenate(self.coeffs),
+             (np.concatenate(self.rows), np.concatenate(self.columns))),
+            shape=(self.n, n_columns)).tocsr()
+        return matrix, np.concatenate(self.rhs)
+
+
+def _check_options(cls):
+    """Only the default constraints of a class (with or without
+    investment) can be assembled as matrices."""
+    unknown = set(cls.optimization_options) - {"investment", "objective"}
+    if unknown:
+        raise ValueError(("The optimization_options {0} of {1} are not " +
+                          "supported by the matrix model.").format(
+                              sorted(unknown), cls.__name__))
+
+
+def _output_bounds(mm, objs, uids):
+    """Upper bounds of all outputs (ub_out or out_max), or the output
+    bound of the first output with investment (see :func:`set_bounds
+    <oemof.solph.variables.set_bounds>`).
+    """
+    n = len(mm.timesteps)
+    investment = type(objs[0]).optimization_options.get("investment", False)
+    if not investment:
+        for obj in objs:
+            for k, o in enumerate(obj.outputs):
+                if obj.ub_out:
+                    ub = mm.sequence(obj.ub_out[k])
+                else:
+                    ub = np.full(n, obj.out_max[k], dtype=float)
+                mm.upper[mm.flows([(obj.uid, o.uid)])[0]] = ub
+        return
+    add_out = _investment(mm, uids, "add_out",
+                          [obj.add_out_limit for obj in objs])[:, None]
+    ub = np.array([mm.sequence(obj.ub_out[0]) if obj.ub_out
+                   else np.full(n, obj.out_max[0], dtype=float)
+                   for obj in objs]).reshape(len(objs), n)
+    # w <= ub * (1 + add_out / out_max) or w <= out_max + add_out
+    coeff = np.array([ub[k] / obj.out_max[0] if obj.ub_out else np.ones(n)
+                      for k, obj in enumerate(objs)]).reshape(ub.shape)
+    rows = mm.rows_of(uids)
+    mm.add_rows(rows.size, [(rows, 1, mm.outflows(uids)),
+                            (rows, -coeff, add_out)], "<=", ub.ravel())
+
+
+def _input_bounds(mm, objs):
+    """Upper bounds of the inputs (in_max)."""
+    if type(objs[0]).optimization_options.get("investment", False):
+        raise ValueError("Setting upper bounds on inputs of components" +
+                         " not possible for investment models")
+    for obj in objs:
+        for i, in_max in zip(obj.inputs, obj.in_max):
+            mm.upper[mm.flows([(i.uid, obj.uid)])[0]] = in_max
+
+
+def _io_relation(mm, uids, eta, idx=0):
+    """w_in * eta = w_out_idx"""
+    rows = mm.rows_of(uids)
+    mm.add_rows(rows.size, [(rows, eta, mm.inflows(uids)),
+                            (rows, -1, mm.outflows(uids, idx))], "==", 0.)
+
+
+def _investment(mm, uids, name, limits):
+    """Columns of the investment variable `name` (e.g. 'add_out') of every
+    uid, bounded by `limits` (None: no limit)."""
+    return mm.add_columns((len(uids),), upper=np.array(
+        [np.inf if limit is None else limit for limit in limits],
+        dtype=float), name=name, uids=uids)
+
+
+def _column(values):
+    return np.array(values, dtype=float)[:, None]
+
+
+@assembler.register(Bus)
+def _(e, mm, objs):
+    """Slacks, balances and global output limits of the buses (see
+    :func:`add_bus_balance <oemof.solph.linear_constraints.add_bus_balance>`
+    and :func:`add_global_output_limit
+    <oemof.solph.linear_constraints.add_global_output_limit>`).
+    """
+    n = len(mm.timesteps)
+    for key in ["excess", "shortage"]:
+        uids = [b.uid for b in objs if getattr(b, key) is True]
+        if uids:
+            mm.add_columns((len(uids), n), name=key, uids=uids)
+
+    # inflows - outflows - excess + shortage = 0
+    uids = [b.uid for b in objs if b.balanced]
+    rows = mm.rows_of(uids)
+    pos = {b: k for k, b in enumerate(uids)}
+    inflows = [e for b in uids for e in mm.graph.inflows(b)]
+    outflows = [e for b in uids for e in mm.graph.outflows(b)]
+    terms = [(rows[[pos[b] for i, b in inflows]], 1, mm.flows(inflows)),
+             (rows[[pos[b] for b, o in outflows]], -1, mm.flows(outflows))]
+    for key, sign in [("excess", -1), ("shortage", 1)]:
+        slack = [b for b in uids if (b, key) in mm.columns]
+        if slack:
+            terms.append((rows[[pos[b] for b in slack]], sign,
+                          np.array([mm.columns[b, key] for b in slack])))
+    mm.balance_rows = mm.add_rows(rows.size, terms, "==", 0.).reshape(
+        rows.shape)
+
+    _global_output_limit(mm, objs)
+    return mm
+
+
+def _global_output_limit(mm, objs):
+    """sum(w_out * energy_weights) <= sum_out_limit"""
+    objs = [obj for obj in objs
+            if obj.outputs and obj.sum_out_limit != float("inf")]
+    if not objs:
+        return
+    outflows = [e for obj in objs for e in mm.graph.outflows(obj.uid)]
+    pos = {obj.uid: k for k, obj in enumerate(objs)}
+    rows = np.repeat([pos[e] for e, o in outflows],
+                     len(mm.timesteps)).reshape(len(outflows), -1)
+    mm.add_rows(len(objs), [(rows, mm.energy_weights, mm.flows(outflows))],
+                "<=", [obj.sum_out_limit for obj in objs])
+
+
+@assembler.register(Simple)
+@assembler.register(transports.Simple)
+def _(e, mm, objs):
+    """Input-output relation and output bounds of simple transformers and
+    transports."""
+    uids = [obj.uid for obj in objs]
+    if (type(objs[0]) is transports.Simple and
+            transports.Simple.optimization_options.get("investment", False)):
+        raise ValueError("Investment is not possible for transports.")
+    _io_relation(mm, uids, _column([obj.eta[0] for obj in objs]))
+    _output_bounds(mm, objs, uids)
+    return mm
+
+
+@assembler.register(CHP)
+def _(e, mm, objs):
+    """Input-output and power to heat relation and output bounds of chps."""
+    uids = [obj.uid for obj in objs]
+    _io_relation(mm, uids, _column([obj.eta[0] for obj in objs]))
+    # w_out_0 / eta_0 - w_out_1 / eta_1 = 0
+    rows = mm.rows_of(uids)
+    mm.add_rows(rows.size, [
+        (rows, 1 / _column([obj.eta[0] for obj in objs]),
+         mm.outflows(uids, 0)),
+        (rows, -1 / _column([obj.eta[1] for obj in objs]),
+         mm.outflows(uids, 1))], "==", 0.)
+    _output_bounds(mm, objs, uids)
+    return mm
+
+
+@assembler.register(SimpleExtractionCHP)
+def _(e, mm, objs):
+    """Equivalent output, power to heat relation and bounds of extraction
+    chps."""
+    uids = [obj.uid for obj in objs]
+    rows = mm.rows_of(uids)
+    eta = _column([obj.eta_el_cond for obj in objs])
+    # w_in = (w_out_0 + beta * w_out_1) / eta_el_cond
+    mm.add_rows(rows.size, [
+        (rows, 1, mm.inflows(uids)),
+        (rows, -1 / eta, mm.outflows(uids, 0)),
+        (rows, -_column([obj.beta for obj in objs]) / eta,
+         mm.outflows(uids, 1))], "==", 0.)
+    # sigma * w_out_1 - w_out_0 <= 0
+    mm.add_rows(rows.size, [
+        (rows, _column([obj.sigma for obj in objs]), mm.outflows(uids, 1)),
+        (rows, -1, mm.outflows(uids, 0))], "<=", 0.)
+    _output_bounds(mm, objs, uids)
+    _input_bounds(mm, objs)
+    return mm
+
+
+@assembler.register(VariableEfficiencyCHP)
+def _(e, mm, objs):
+    """Total efficiency, variable electrical efficiency and output bounds
+    with binary status variables (see
+    :func:`add_variable_linear_eta_relation
+    <oemof.solph.linear_mixed_integer_constraints.add_variable_linear_eta_relation>`).
+    """
+    if VariableEfficiencyCHP.optimization_options.get("investment", False):
+        raise ValueError("Component can not be modeled with milp-constr " +
+                         "in investment mode!")
+    uids = [obj.uid for obj in objs]
+    rows = mm.rows_of(uids)
+    y = mm.add_columns(rows.shape, upper=1, integer=True, name="y",
+                       uids=uids)
+    # eta_total * w_in - w_out_0 - w_out_1 = 0
+    mm.add_rows(rows.size, [
+        (rows, _column([obj.eta_total for obj in objs]), mm.inflows(uids)),
+        (rows, -1, mm.outflows(uids, 0)),
+        (rows, -1, mm.outflows(uids, 1))], "==", 0.)
+    # w_in = y * c_1 + c_2 * w_out_0
+    mm.add_rows(rows.size, [
+        (rows, 1, mm.inflows(uids)),
+        (rows, -_column([obj.coeff[0] for obj in objs]), y),
+        (rows, -_column([obj.coeff[1] for obj in objs]),
+         mm.outflows(uids, 0))], "==", 0.)
+    # out_min * y <= w_out_0 <= out_max * y
+    mm.add_rows(rows.size, [
+        (rows, 1, mm.outflows(uids, 0)),
+        (rows, -_column([obj.out_max[0] for obj in objs]), y)], "<=", 0.)
+    mm.add_rows(rows.size, [
+        (rows, _column([obj.out_min[0] for obj in objs]), y),
+        (rows, -1, mm.outflows(uids, 0))], "<=", 0.)
+    return mm
+
+
+@assembler.register(FixedSource)
+def _(e, mm, objs):
+    """Fixed outputs val * out_max, with investment val * (out_max +
+    add_out)."""
+    uids = [obj.uid for obj in objs]
+    values = mm.sequences({obj.uid: obj.val for obj in objs}, uids)
+    out_max = _column([obj.out_max[0] for obj in objs])
+    outflows = mm.outflows(uids)
+    if not FixedSource.optimization_options.get("investment", False):
+        mm.lower[outflows] = mm.upper[outflows] = values * out_max
+        return mm
+    add_out = _investment(mm, uids, "add_out",
+                          [obj.add_out_limit for obj in objs])[:, None]
+    rows = mm.rows_of(uids)
+    mm.add_rows(rows.size, [(rows, 1, outflows), (rows, -values, add_out)],
+                "==", (values * out_max).ravel())
+    return mm
+
+
+@assembler.register(DispatchSource)
+def _(e, mm, objs):
+    """Outputs bounded by val * out_max. The curtailment val * out_max - w
+    is no column, its costs are added to the objective directly."""
+    if DispatchSource.optimization_options.get("investment", False):
+        raise ValueError("Dispatch source + investment is not possible!")
+    uids = [obj.uid for obj in objs]
+    mm.upper[mm.outflows(uids)] = (
+        mm.sequences({obj.uid: obj.val for obj in objs}, uids) *
+        _column([obj.out_max[0] for obj in objs]))
+    return mm
+
+
+@assembler.register(Sink)
+def _(e, mm, objs):
+    """Fixed inputs of the sinks."""
+    edges = mm.edges(objs)
+    inflows = mm.flows(edges)
+    mm.lower[inflows] = mm.upper[inflows] = mm.sequences(
+        {obj.uid: obj.val for obj in objs}, [s for i, s in edges])
+    return mm
+
+
+@assembler.register(Commodity)
+def _(e, mm, objs):
+    """Global output limits of commodities."""
+    _global_output_limit(mm, objs)
+    return mm
+
+
+@assembler.register(Storage)
+def _(e, mm, objs):
+    """Levels, balances and bounds of storages (see
+    :func:`add_storage_balance
+    <oemof.solph.linear_constraints.add_storage_balance>`). The level at
+    the last timestep is fixed to `cap_final` (`cap_initial` by default).
+    """
+    uids = [obj.uid for obj in objs]
+    rows = mm.rows_of(uids)
+    investment = Storage.optimization_options.get("investment", False)
+    cap_max = _column([obj.cap_max for obj in objs])
+    if investment:
+        cap = mm.add_columns(rows.shape, name="cap", uids=uids)
+    else:
+        cap = mm.add_columns(rows.shape, lower=_column(
+            [obj.cap_min or 0 for obj in objs]), upper=cap_max,
+            name="cap", uids=uids)
+    cap_initial = np.array([obj.cap_initial for obj in objs], dtype=float)
+    final = [k for k, obj in enumerate(objs) if obj.cap_final is not False]
+    mm.lower[cap[final, -1]] = mm.upper[cap[final, -1]] = [
+        objs[k].cap_initial if objs[k].cap_final is None
+        else objs[k].cap_final for k in final]
+
+    # l(t) - l(t-1) * (1 - loss) ** dt - w_in * eta_in * dt
+    # + w_out / eta_out * dt = 0 (l(-1) = cap_initial)
+    dt = mm.timestep_durations
+    loss = _column([obj.cap_loss for obj in objs])
+    rhs = np.zeros(rows.shape)
+    rhs[:, 0] = cap_initial
+    mm.add_rows(rows.size, [
+        (rows, 1, cap),
+        (rows[:, 1:], -(1 - loss) ** dt[1:], cap[:, :-1]),
+        (rows, -_column([obj.eta_in for obj in objs]) * dt,
+         mm.inflows(uids)),
+        (rows, dt / _column([obj.eta_out for obj in objs]),
+         mm.outflows(uids))], "==", rhs.ravel())
+
+    if not investment:
+        _output_bounds(mm, objs, uids)
+        _input_bounds(mm, objs)
+        return mm
+    # columns add_out as with all investment blocks of the pyomo model
+    _investment(mm, uids, "add_out", [obj.add_out_limit for obj in objs])
+    add_cap = _investment(mm, uids, "add_cap",
+                          [obj.add_cap_limit for obj in objs])[:, None]
+    # l(t) <= cap_max + add_cap
+    mm.add_rows(rows.size, [(rows, 1, cap), (rows, -1, add_cap)], "<=",
+                np.broadcast_to(cap_max, rows.shape).ravel())
+    # w <= (cap_max + add_cap) * c_rate
+    for c_rate, flows in [
+            (_column([obj.c_rate_out for obj in objs]), mm.outflows(uids)),
+            (_column([obj.c_rate_in for obj in objs]), mm.inflows(uids))]:
+        mm.add_rows(rows.size, [(rows, 1, flows), (rows, -c_rate, add_cap)],
+                    "<=", np.broadcast_to(cap_max * c_rate,
+                                          rows.shape).ravel())
+    return mm
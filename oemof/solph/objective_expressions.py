@@ -2,6 +2,12 @@
 """
 The module contains different objective expression terms.
 
+Terms summed over all timesteps are weighted with the weights of the
+timesteps (`model.timestep_weights`, 1 if not set in the simulation). Terms
+of flows (powers) are additionally multiplied with the durations of the
+timesteps (`model.energy_weights`), costs per event (start up, shut down,
+ramping) are not.
+
 @author: Simon Hilpert (simon.hilpert@fh-flensburg.de)
 """
 import numpy as np
@@ -38,12 +44,14 @@ def add_opex_var(model, block, ref='output'):
     opex_var = {obj.uid: obj.opex_var for obj in block.objs}
     # outputs for cost objs
     if ref == 'output':
-        expr = sum(model.w[e, model.O[e][0], t] * opex_var[e]
+        expr = sum(model.w[e, model.O[e][0], t] * opex_var[e] *
+                   model.energy_weights[t]
                    for e in block.uids
                    for t in model.timesteps)
 
     elif ref == 'input':
-        expr = sum(model.w[model.I[e], e, t] * opex_var[e]
+        expr = sum(model.w[model.I[e], e, t] * opex_var[e] *
+                   model.energy_weights[t]
                    for e in block.uids
                    for t in model.timesteps)
     return(expr)
@@ -73,9 +81,10 @@ def add_input_costs(model, block):
         if e.__dict__.get('input_costs', None) is not None:
             input_costs[e.uid] = e.input_costs
         else:
-            input_costs[e.uid] = e.inputs[0].price
+            input_costs[e.uid] = model.entities.by_uid[model.I[e.uid]].price
     # outputs for cost objs
-    expr = sum(model.w[model.I[e], e, t] * input_costs[e]
+    expr = sum(model.w[model.I[e], e, t] * input_costs[e] *
+               model.energy_weights[t]
                for e in block.uids for t in model.timesteps)
 
     return(expr)
@@ -166,14 +175,17 @@ def add_revenues(model, block, ref='output', idx=0):
                     output_price[e.uid] = [e.output_price[idx]] * len(model.timesteps)
                 else:
                     output_price[e.uid] = e.output_price[idx]
-            elif isinstance(e.outputs[idx].price, (float, int, np.integer)):
-                output_price[e.uid] = \
-                    [e.outputs[idx].price] * len(model.timesteps)
             else:
-                output_price[e.uid] = e.outputs[idx].price
+                output = model.entities.by_uid[model.O[e.uid][idx]]
+                if isinstance(output.price, (float, int, np.integer)):
+                    output_price[e.uid] = \
+                        [output.price] * len(model.timesteps)
+                else:
+                    output_price[e.uid] = output.price
 
         # create expression term
-        expr += -sum(model.w[e, model.O[e][idx], t] * output_price[e][t]
+        expr += -sum(model.w[e, model.O[e][idx], t] * output_price[e][t] *
+                     model.energy_weights[t]
                      for e in block.uids for t in model.timesteps)
     else:
         raise NotImplementedError("Referece side 'input' not implemented.")
@@ -208,7 +220,8 @@ def add_curtailment_costs(model, block=None):
             block.uids = [obj.uid for obj in block.objs]
         # get dispatch expenditure for renewable energies with dispatch
         c_curtail = {obj.uid: obj.curtail_costs for obj in block.objs}
-        expr = sum(block.curtailment_var[e, t] * c_curtail[e]
+        expr = sum(block.curtailment_var[e, t] * c_curtail[e] *
+                   model.energy_weights[t]
                    for e in block.uids for t in model.timesteps)
     return(expr)
 
@@ -279,7 +292,8 @@ def add_startup_costs(model, block):
             block.uids = [obj.uid for obj in block.objs]
 
         c_start = {obj.uid: obj.start_costs for obj in block.objs}
-        expr = sum(block.z_start[e, t] * c_start[e]
+        expr = sum(block.z_start[e, t] * c_start[e] *
+                   model.timestep_weights[t]
                    for e in block.uids for t in model.timesteps)
     return(expr)
 
@@ -303,7 +317,7 @@ def add_shutdown_costs(model, block):
         block.uids = [obj.uid for obj in block.objs]
 
     c_stop = {obj.uid: obj.stop_costs for obj in block.objs}
-    expr = sum(block.z_stop[e, t] * c_stop[e]
+    expr = sum(block.z_stop[e, t] * c_stop[e] * model.timestep_weights[t]
                for e in block.uids for t in model.timesteps)
     return(expr)
 
@@ -333,10 +347,12 @@ def add_ramping_costs(model, block, grad_direc='positive'):
     c_ramp = {obj.uid: obj.ramp_costs.get(grad_direc, obj.ramp_costs)
               for obj in block.objs}
     if grad_direc == 'positive':
-        expr = sum(block.grad_pos_var[e, t] * c_ramp[e]
+        expr = sum(block.grad_pos_var[e, t] * c_ramp[e] *
+                   model.timestep_weights[t]
                    for e in block.uids for t in model.timesteps)
     if grad_direc == 'negative' :
-        expr = sum(block.grad_neg_var[e, t] * c_ramp[e]
+        expr = sum(block.grad_neg_var[e, t] * c_ramp[e] *
+                   model.timestep_weights[t]
                    for e in block.uids for t in model.timesteps)
     else:
         pass
@@ -361,7 +377,8 @@ def add_excess_slack_costs(model, block=None):
 
     c_excess = {b.uid:b.excess_costs for b in block.objs
                 if b.excess==True}
-    expr = sum(model.excess_slack[e, t] * c_excess[e]
+    expr = sum(model.excess_slack[e, t] * c_excess[e] *
+               model.energy_weights[t]
                for e in block.excess_uids for t in model.timesteps)
     return(expr)
 
@@ -386,7 +403,8 @@ def add_shortage_slack_costs(model, block=None):
     """
     c_shortage = {b.uid: b.shortage_costs for b in block.objs
                   if b.shortage==True}
-    expr = sum(model.shortage_slack[e, t] * c_shortage[e]
+    expr = sum(model.shortage_slack[e, t] * c_shortage[e] *
+               model.energy_weights[t]
                for e in block.shortage_uids for t in model.timesteps)
     return(expr)
 
@@ -3,17 +3,29 @@
 @contact Simon Hilpert (simon.hilpert@fh-flensburg.de)
 """
 
-from collections import UserDict as UD
 from functools import singledispatch
+import gc
+import os
+import shutil
+import tempfile
 
+import numpy as np
 import pyomo.environ as po
+from pyomo.repn import generate_canonical_repn, LinearCanonicalRepn
 import logging
 
 from ..tools import helpers
 from . import variables as var
 from . import linear_mixed_integer_constraints as milc
 from . import linear_constraints as lc
-from ..core.network.entities import Bus, Component
+from . import pyomo_fastbuild as pofast
+from . import presolve as pre
+from . import problem_writer as pw
+from . import solution_reader as sr
+from .build_stats import BuildStats
+from .graph_index import GraphIndex
+from .results import LazyResults, Results, solution_vector, stack
+from ..core.network.entities import Bus
 from ..core.network.entities import components as cp
 from ..core.network.entities.components.transformers import (
     CHP, Simple, SimpleExtractionCHP, Storage, VariableEfficiencyCHP)
@@ -78,35 +90,79 @@ class OptimizationModel(po.ConcreteModel):
         self.objective_options = energysystem.simulation.objective_options
         self.relaxed = getattr(energysystem.simulation, "relaxed", False)
 
+        # build statistics (see oemof.solph.build_stats)
+        build_stats = getattr(energysystem.simulation, "build_stats", False)
+        self.build_stats = BuildStats(detailed=bool(build_stats))
+        self.build_stats.start()
+
         self.T = po.Set(initialize=self.timesteps, ordered=True)
-        # calculate all edges ([("coal", "pp_coal"),...])
-        self.components = [e for e in self.entities
-                           if isinstance(e, Component)]
-        self.all_edges = self.edges(self.components)
-        var.add_continuous(model=self, edges=self.all_edges)
+        # weight of every timestep in the objective and in sums over all
+        # timesteps, e.g. the number of periods a typical period represents
+        weights = getattr(energysystem.simulation, "timestep_weights", None)
+        if weights is None:
+            weights = [1] * len(self.timesteps)
+        self.timestep_weights = dict(zip(self.timesteps, weights))
+        # duration of every timestep in hours (flows are powers)
+        durations = getattr(energysystem.simulation, "timestep_durations",
+                            None)
+        if durations is None:
+            durations = [1] * len(self.timesteps)
+        self.timestep_durations = dict(zip(self.timesteps, durations))
+        # weight of the flows in sums of energies over all timesteps
+        self.energy_weights = {t: self.timestep_weights[t] *
+                               self.timestep_durations[t]
+                               for t in self.timesteps}
+        # typical periods of the timesteps (see oemof.solph.aggregation)
+        self.periods = getattr(energysystem.simulation, "periods", None)
+        # ids, edges ([("coal", "pp_coal"),...]) and incidence of the
+        # entities, shared by all builders (see oemof.solph.graph_index)
+        self.graph = GraphIndex(self.entities)
+        self.components = self.graph.components
+        self.all_edges = self.graph.edges
+        with self.build_stats.measure("add_continuous", "phase", self):
+            var.add_continuous(model=self, edges=self.all_edges)
+            # position of every edge in the columns of w (fast_build)
+            self.edge_ids = self.graph.edge_ids
+            if energysystem.simulation.fast_build:
+                self.w_columns = pofast.variable_array(
+                    self.w, [e + (t,) for e in self.all_edges
+                             for t in self.timesteps])
 
         # group components by type (cbt: components by type)
-        cbt = {}
-        for c in self.components:
-            cbt[type(c)] = cbt.get(type(c), []) + [c]
+        cbt = self.graph.by_type
 
-        self.I = {c.uid: c.inputs[0].uid for c in self.components
+        self.I = {c.uid: self.graph.inputs(c.uid)[0] for c in self.components
                   if not isinstance(c, cp.Source)}
-        self.O = {c.uid: [o.uid for o in c.outputs[:]] for c in self.components
+        self.O = {c.uid: self.graph.outputs(c.uid) for c in self.components
                   if not isinstance(c, cp.Sink)}
 
         # Add constraints for all components to the model
-        self.build_component_constraints(cbt)
+        with self.build_stats.measure("build_component_constraints", "phase",
+                                      self):
+            self.build_component_constraints(cbt)
 
         # Add constraints for all buses to the model
-        self.build_bus_constraints()
+        with self.build_stats.measure("build_bus_constraints", "phase",
+                                      self):
+            self.build_bus_constraints()
 
         # create objective function
         if not self.objective_options:
             raise ValueError("No objective options defined!")
 
         logging.info("Building objective function.")
-        self.objective_assembler(objective_options=self.objective_options)
+        with self.build_stats.measure("objective_assembler", "phase", self):
+            self.objective_assembler(objective_options=self.objective_options)
+
+        # fold the fixed flows into the rows (see oemof.solph.presolve)
+        self.presolved = None
+        if getattr(energysystem.simulation, "presolve", False):
+            with self.build_stats.measure("presolve", "phase", self):
+                self.presolve()
+
+        self.build_stats.stop()
+        if isinstance(build_stats, str):
+            self.build_stats.to_json(build_stats)
 
     def build_component_constraints(self, cbt):
         logging.info("Building component constraints.")
@@ -124,16 +180,18 @@ class OptimizationModel(po.ConcreteModel):
                 self.add_component(str(cls), block)
                 logging.debug("Creating optimization block for omeof " +
                               "classes: " + block.name)
-                assembler.registry[cls](e=None, om=self, block=block)
+                with self.build_stats.measure(str(cls), "block", block):
+                    assembler.registry[cls](e=None, om=self, block=block)
 
     def build_bus_constraints(self):
         # add bus block
         block = po.Block()
         # get all bus objects
-        block.objs = [e for e in self.entities if isinstance(e, Bus)]
+        block.objs = list(self.entities.groups.get(Bus, []))
         block.uids = [e.uid for e in block.objs]
         logging.info("Building bus constraints")
-        assembler.registry[Bus](e=None, om=self, block=block)
+        with self.build_stats.measure(str(Bus), "block", block):
+            assembler.registry[Bus](e=None, om=self, block=block)
         self.add_component(str(Bus), block)
 
     def default_assembler(self, block):
@@ -194,7 +252,61 @@ class OptimizationModel(po.ConcreteModel):
                                           cost_objects=cost_objects,
                                           revenue_objects=revenue_objects)
 
-    def results(self):
+    def update(self, objective=True):
+        r""" Patches the constructed model after parameters of the entities
+        have been changed, so the model can be solved again without being
+        rebuilt.
+
+        For every component class the parameter dependent parts are updated
+        by the :func:`updater` function registered for the class: fixed
+        values (e.g. `val` of sinks and fixed sources) are fixed again,
+        variable bounds are set again and right hand sides are altered in
+        place (fast_build) or the affected constraints are built again.
+        Changes of the topology (entities, inputs, outputs) or of
+        `optimization_options` are not covered and require a new model.
+
+        Parameters
+        ----------
+        objective : boolean
+            If True (default), the objective is built again with the current
+            cost parameters (e.g. `opex_var`, bus `price`).
+
+        Returns
+        -------
+        self : OptimizationModel() instance
+        """
+        if self.presolved is not None:
+            raise ValueError("A presolved model can not be updated, " +
+                             "please build a new model.")
+        logging.info("Updating optimization model.")
+        for cls in sorted({type(c) for c in self.components}, key=str):
+            updater.dispatch(cls)(e=None, om=self,
+                                  block=self.component(str(cls)))
+        updater.dispatch(Bus)(e=None, om=self, block=self.component(str(Bus)))
+        if objective:
+            self.del_component("objective")
+            self.objective_assembler(objective_options=self.objective_options)
+        return self
+
+    def presolve(self):
+        r""" Folds the fixed flows (sinks and fixed sources) into the right
+        hand sides of the rows and drops rows without variables or implied
+        by the variable bounds, see :func:`presolve
+        <oemof.solph.presolve.presolve>`. The fixed
+        variables keep their values, so the results are complete.
+
+        A presolved model can not be updated (see :meth:`update`).
+
+        Returns
+        -------
+        dict
+            Numbers of fixed columns, folded and dropped rows, stored in
+            :attr:`presolved` as well.
+        """
+        self.presolved = pre.presolve(self)
+        return self.presolved
+
+    def results(self, directory=None, lazy=False):
         """ Returns a nested dictionary of the results of this optimization
         model.
 
@@ -229,82 +341,208 @@ class OptimizationModel(po.ConcreteModel):
 
         Note that the optimization model has to be solved prior to invoking
         this method.
+
+        If the model was solved with duals, the reduced costs of the flows
+        are stored under :attr:`om.results().reduced_costs[s][t]`.
+
+        The results are returned as :class:`Results
+        <oemof.solph.results.Results>`, which store all time series as rows
+        of one array; `results[s][t]` is a view of the row. The solution is
+        read in one pass over every variable into arrays indexed by edge (or
+        uid) and timestep (see :func:`indexed_values
+        <oemof.solph.pyomo_fastbuild.indexed_values>`). Values missing in the
+        solution are nan.
+
+        If a `directory` is given, the arrays are memory-mapped files in this
+        directory (see :func:`stack <oemof.solph.results.stack>`), e.g. for
+        very long horizons.
+
+        If `lazy` is True, :class:`LazyResults
+        <oemof.solph.results.LazyResults>` are returned, which hold the
+        values as one vector (see :func:`indexed_vector
+        <oemof.solph.pyomo_fastbuild.indexed_vector>`) and slice the series
+        of an entity from it on first access only.
+
+        The results hold no reference to the model, so the model can be
+        released afterwards (see :meth:`release`). The status of the solver
+        is stored under :attr:`om.results().solver_status`.
         """
-        # TODO: Maybe make the results dictionary a proper object?
-        result = UD()
-        result.objective = self.objective()
+        timesteps = list(self.timesteps)
+        # duals and reduced costs read by the oemof solution reader
+        solution = getattr(self, "solution", None)
+        dual = rc = None
+        if solution is not None and solution.duals is not None:
+            dual, rc = solution.dual, solution.reduced_cost
+        elif hasattr(self, "dual"):
+            dual, rc = self.dual.get, self.rc.get
+        entities = self.entities.by_uid
+        buses = getattr(self, str(Bus))
+        index = [(entities[i], entities[o]) for i, o in self.all_edges]
+        # the lazy results hold the values as one vector
+        read = pofast.indexed_vector if lazy else pofast.indexed_values
+        arrays = [read(self.w, self.edge_ids, timesteps)]
+
+        def add_series(component, objs, key, value=None):
+            # time series of one object keyed by (obj, key or obj)
+            ids = {obj.uid: k for k, obj in enumerate(objs)}
+            if ids:
+                index.extend((obj, obj if key is None else key)
+                             for obj in objs)
+                arrays.append(read(component, ids, timesteps, value=value))
+
+        # TODO: Why does this use `entity.outputs[0]`?
+        dispatch = self.entities.groups.get(cp.sources.DispatchSource, [])
+        dispatch_ub = read(
+            self.w, {(e.uid, e.outputs[0].uid): k
+                     for k, e in enumerate(dispatch)},
+            timesteps, value=lambda v: v.ub)
+        index.extend((e, e) for e in dispatch)
+        arrays.append(dispatch_ub)
+        storages = self.entities.groups.get(cp.transformers.Storage, [])
+        if storages:
+            add_series(self.component(str(Storage)).cap, storages, None)
+        if dual is not None:
+            add_series(buses.balance, [b for b in buses.objs if b.balanced],
+                       None, value=dual)
+        add_series(getattr(self, "excess_slack", None),
+                   [b for b in buses.objs if b.excess], "excess")
+        add_series(getattr(self, "shortage_slack", None),
+                   [b for b in buses.objs if b.shortage], "shortage")
+
+        # values of the investment variables
+        attributes = {}
         for entity in self.entities:
-            if ( isinstance(entity, cp.Transformer) or
-                 isinstance(entity, cp.Transport)   or
-                 isinstance(entity, cp.Source)):
-                if entity.outputs:
-                    result[entity] = result.get(entity, UD())
-                for o in entity.outputs:
-                    result[entity][o] = [self.w[entity.uid, o.uid, t].value
-                                         for t in self.timesteps]
-
-                for i in entity.inputs:
-                    result[i] = result.get(i, {})
-                    result[i][entity] = [self.w[i.uid, entity.uid, t].value
-                                         for t in self.timesteps]
-
-            if isinstance(entity, cp.sources.DispatchSource):
-                result[entity] = result.get(entity, UD())
-                # TODO: Why does this use `entity.outputs[0]`?
-                result[entity][entity] = [self.w[entity.uid,
-                                                 entity.outputs[0].uid,
-                                                 t].bounds[1]
-                                          for t in self.timesteps]
-
-            if isinstance(entity, cp.Sink):
-                for i in entity.inputs:
-                    result[i] = result.get(i, {})
-                    result[i][entity] = [self.w[i.uid, entity.uid, t].value
-                                         for t in self.timesteps]
-
-            if isinstance(entity, cp.transformers.Storage):
-                result[entity] = result.get(entity, UD())
-                result[entity][entity] = [getattr(self, str(Storage)
-                                                  ).cap[entity.uid, t].value
-                                          for t in self.timesteps]
-
             block = getattr(self, str(type(entity)))
-
             for attribute in ["add_cap", "add_out"]:
                 values = getattr(block, attribute, None)
                 if values:
-                    result[entity] = result.get(entity, UD())
-                    setattr(result[entity], attribute, values[entity.uid]())
-
-        if hasattr(self, "dual"):
-            for bus in getattr(self, str(Bus)).objs:
-                if bus.balanced:
-                    result[bus] = result.get(bus, {})
-                    result[bus][bus] = [
-                        self.dual[getattr(self, str(Bus)).balance[
-                            (bus.uid, t)]]
-                        for t in self.timesteps]
-
-        for bus in getattr(self, str(Bus)).objs:
-            if bus.excess:
-                result[bus] = result.get(bus, {})
-                result[bus]["excess"] = [self.excess_slack[(bus.uid, t)].value
-                                         for t in self.timesteps]
-            if bus.shortage:
-                result[bus] = result.get(bus, {})
-                result[bus]["shortage"] = [
-                    self.shortage_slack[(bus.uid, t)].value
-                    for t in self.timesteps]
-
-        return result
-
-    def write_lp_file(self, path=None, filename="problem.lp"):
+                    attributes.setdefault(entity, {})[attribute] = \
+                        values[entity.uid].value
+
+        reduced_costs = None
+        if rc is not None:
+            reduced_costs = stack([pofast.indexed_values(
+                self.w, self.edge_ids, timesteps, value=rc)], directory)
+        solver_status = None
+        solver_results = getattr(self, "solver_results", None)
+        if solution is not None:
+            solver_status = {
+                "status": solution.status,
+                "termination_condition": solution.termination_condition}
+        elif solver_results is not None:
+            solver_status = {
+                "status": str(solver_results.solver.status),
+                "termination_condition":
+                    str(solver_results.solver.termination_condition)}
+        if lazy:
+            vector, positions = solution_vector(arrays)
+            return LazyResults(index, vector, len(self.all_edges),
+                               self.objective(), attributes, reduced_costs,
+                               directory, solver_status, positions)
+        return Results(index, stack(arrays, directory), len(self.all_edges),
+                       self.objective(), attributes, reduced_costs, directory,
+                       solver_status)
+
+    def timestep_costs(self):
+        r""" Returns the objective value of the solved model split into the
+        costs of every timestep and the costs bound to no timestep (e.g.
+        fixed costs or annualised capex).
+
+        The costs of a timestep are the terms of the objective with a
+        variable indexed by the timestep (e.g. `w[e1, e2, t]`), fixed
+        variables included.
+
+        Returns
+        -------
+        tuple (numpy.ndarray, float)
+            Costs of the timesteps (in the order of :attr:`timesteps`) and
+            the other costs.
+        """
+        positions = {t: k for k, t in enumerate(self.timesteps)}
+        # the terms of fixed variables would be part of the constant
+        fixed = [v for v in self.component_data_objects(po.Var) if v.fixed]
+        for v in fixed:
+            v.unfix()
+        try:
+            repn = generate_canonical_repn(pw._objective(self).expr)
+        finally:
+            for v in fixed:
+                v.fix()
+        if not isinstance(repn, LinearCanonicalRepn):
+            raise ValueError("The objective is not linear.")
+        costs = np.zeros(len(positions))
+        other = float(repn.constant or 0)
+        for v, coef in zip(repn.variables or [], repn.linear or []):
+            index = v.index()
+            k = positions.get(index[-1]) if isinstance(index, tuple) else None
+            value = coef * (v.value or 0)
+            if k is None:
+                other += value
+            else:
+                costs[k] += value
+        return costs, other
+
+    def release(self):
+        r""" Deletes all components of the model (variables, constraints,
+        blocks, suffixes and the objective) and the arrays of the fast
+        build, so their memory is returned before the results are
+        post-processed. The model can not be used anymore afterwards.
+
+        Extract the results with :meth:`results` first.
+        """
+        for component in list(self.component_objects(descend_into=False)):
+            self.del_component(component)
+        for attribute in ["w_columns", "edge_ids", "solver_results",
+                          "solution", "graph"]:
+            self.__dict__.pop(attribute, None)
+        # pyomo components reference each other, free the cycles now
+        gc.collect()
+        logging.debug("Optimization model released.")
+
+    def to_matrices(self):
+        r""" Returns the problem as sparse matrices (constraint matrix, right
+        hand side, senses, bounds, objective and integrality) with the labels
+        of rows and columns, see :func:`to_matrices
+        <oemof.solph.problem_writer.to_matrices>`.
+
+        Returns
+        -------
+        :class:`ProblemMatrices <oemof.solph.problem_writer.ProblemMatrices>`
+        """
+        return pw.to_matrices(self)
+
+    def write_lp_file(self, path=None, filename="problem.lp",
+                      problem_writer="pyomo", **kwargs):
+        r""" Writes the problem file of the model.
+
+        Parameters
+        ----------
+        path : string
+            Directory of the file (default: 'lp_files' in the oemof base
+            directory).
+        filename : string
+            Name of the file.
+        problem_writer : string
+            'pyomo' to use pyomo's writer (symbolic labels) or 'oemof' to use
+            :func:`write_problem <oemof.solph.problem_writer.write_problem>`
+            (numeric labels and a label map file).
+        **kwargs :
+            Passed to :func:`write_problem
+            <oemof.solph.problem_writer.write_problem>` (file_format,
+            compress, label_map).
+
+        Returns
+        -------
+        :class:`ProblemFile <oemof.solph.problem_writer.ProblemFile>` if
+        problem_writer is 'oemof', else None.
+        """
         if path is None:
             path = helpers.extend_basic_path("lp_files")
-        self.write(helpers.get_fullpath(path, filename),
-                   io_options={"symbolic_solver_labels": True})
-        logging.info("LP-file saved to {0}".format(
-            helpers.get_fullpath(path, filename)))
+        fullpath = helpers.get_fullpath(path, filename)
+        if problem_writer == "oemof":
+            return pw.write_problem(self, fullpath, **kwargs)
+        self.write(fullpath, io_options={"symbolic_solver_labels": True})
+        logging.info("LP-file saved to {0}".format(fullpath))
 
     def solve(self, **kwargs):
         r""" Method that takes care of the communication with the solver
@@ -335,11 +573,27 @@ class OptimizationModel(po.ConcreteModel):
             Examples:
             {"mipgap":"0.01"} results in "--mipgap 0.01"
             {"interior":" "} results in "--interior"
+        problem_writer : string
+            'pyomo' (default) or 'oemof'. If 'oemof', the problem file is
+            written by :func:`write_problem
+            <oemof.solph.problem_writer.write_problem>` and handed to the
+            solver as file. In debug mode the file is written to the
+            'lp_files' directory and the same file is used by the solver.
+        problem_format : string
+            'lp' (default) or 'mps'. Only used if problem_writer is 'oemof'.
+        solution_reader : string
+            'pyomo' (default) or 'oemof'. If 'oemof' (requires problem_writer
+            'oemof' and solver 'glpk' or 'cbc'), the solver executable is
+            called directly and its solution file is read into arrays (see
+            :py:mod:`oemof.solph.solution_reader`), which are stored as
+            `om.solution`. The values are set to the variables, duals and
+            reduced costs are read from the arrays by :meth:`results`.
 
 
         Returns
         -------
-        self : solved pyomo.ConcreteModel() instance
+        pyomo.opt.SolverResults or :class:`Solution
+        <oemof.solph.solution_reader.Solution>` (solution_reader 'oemof')
 
         """
         solver = kwargs.get("solver",  self.energysystem.simulation.solver)
@@ -357,6 +611,16 @@ class OptimizationModel(po.ConcreteModel):
         solver_io = kwargs.get("solver_io", "lp")
         solve_kwargs = kwargs.get("solve_kwargs", {})
         solver_cmdline_options = kwargs.get("solver_cmdline_options", {})
+        problem_writer = kwargs.get(
+            "problem_writer",
+            getattr(self.energysystem.simulation, "problem_writer", "pyomo"))
+        problem_format = kwargs.get("problem_format", "lp")
+        solution_reader = kwargs.get(
+            "solution_reader",
+            getattr(self.energysystem.simulation, "solution_reader", "pyomo"))
+        if solution_reader == "oemof" and problem_writer != "oemof":
+            raise ValueError("The oemof solution reader requires the oemof " +
+                             "problem writer.")
 
         from pyomo.opt import SolverFactory
         # Create a "dual" suffix component on the instance
@@ -367,10 +631,38 @@ class OptimizationModel(po.ConcreteModel):
             self.dual = po.Suffix(direction=po.Suffix.IMPORT)
             # reduced costs
             self.rc = po.Suffix(direction=po.Suffix.IMPORT)
-        # write lp-file
-        if debug is True:
+        # write problem file (the oemof writer writes a file in any case, in
+        # debug mode it is kept in the lp_files directory)
+        problem, tmpdir = None, None
+        if problem_writer == "oemof":
+            filename = "problem." + problem_format
+            if debug is True:
+                problem = self.write_lp_file(filename=filename,
+                                             problem_writer="oemof")
+            else:
+                tmpdir = tempfile.mkdtemp(prefix="oemof_")
+                problem = pw.write_problem(
+                    self, os.path.join(tmpdir, filename), label_map=False)
+        elif debug is True:
             self.write_lp_file()
 
+        if solution_reader == "oemof":
+            try:
+                solution = sr.solve(problem, solver, duals=duals,
+                                    options=solver_cmdline_options,
+                                    verbose=verbose)
+            finally:
+                if tmpdir is not None:
+                    shutil.rmtree(tmpdir, ignore_errors=True)
+            solution.load()
+            self.solution = solution
+            logging.info(("Solver status: {0}, termination condition: " +
+                          "{1}, objective: {2}").format(
+                              solution.status,
+                              solution.termination_condition,
+                              solution.objective))
+            return solution
+
         # solve instance
         opt = SolverFactory(solver, solver_io=solver_io)
         # set command line options
@@ -379,9 +671,17 @@ class OptimizationModel(po.ConcreteModel):
             options[k] = solver_cmdline_options[k]
         # store results
         logging.info("Handing problem to solver and solving.")
-        results = opt.solve(self, **solve_kwargs)
-
-        self.solutions.load_from(results)
+        if problem is None:
+            results = opt.solve(self, **solve_kwargs)
+            self.solutions.load_from(results)
+        else:
+            try:
+                results = opt.solve(problem.filename, **solve_kwargs)
+            finally:
+                if tmpdir is not None:
+                    shutil.rmtree(tmpdir, ignore_errors=True)
+            problem.load_solution(self, results, duals=duals)
+        self.solver_results = results
         if verbose:
             logging.info("**************************************************")
             logging.info("Optimization problem informations from solph")
@@ -410,17 +710,9 @@ class OptimizationModel(po.ConcreteModel):
         edges : list with tupels that represent the edges
         """
 
-        edges = []
-        # create a list of tuples
-        # e.g. [("coal", "pp_coal"), ("pp_coal", "b_el"),...]
-        for c in components:
-            for i in c.inputs:
-                ei = (i.uid, c.uid)
-                edges.append(ei)
-            for o in c.outputs:
-                ej = (c.uid, o.uid)
-                edges.append(ej)
-        return(edges)
+        # e.g. [("coal", "pp_coal"), ("pp_coal", "b_el"),...], taken from
+        # the graph index instead of the inputs and outputs of the components
+        return self.graph.edges_of(components)
 
 
 @assembler.register(Bus)
@@ -723,3 +1015,179 @@ def _(e, om, block):
     # bounds
     var.set_bounds(om, block, side="output")
     return(om)
+
+
+@singledispatch
+def updater(e, om, block):
+    """ Updaters are the functions patching the parameter dependent parts of
+    an existing block after the parameters of its objects have been changed
+    (see :meth:`OptimizationModel.update`).
+
+    This is the most general form of updater function, called if no more
+    specific updater has been registered. It raises a ValueError, since the
+    parameters of the block can not be updated.
+
+    Parameters
+    ----------
+    see :func:`assembler`.
+
+    Returns
+    -------
+    om    : The optimization model passed in as an argument.
+    """
+    raise ValueError("No updater registered for block {0}, please build "
+                     "a new model.".format(block.name))
+
+
+def _reassemble(om, block, names, function, **kwargs):
+    """ Deletes the components `names` of `block` (and their implicit index
+    sets) and builds them again by calling `function(om, block, **kwargs)`.
+    """
+    for name in names:
+        for n in [name, name + "_index"]:
+            if block.component(n) is not None:
+                block.del_component(n)
+    function(om, block, **kwargs)
+
+
+def _update_output_bounds(om, block):
+    if block.optimization_options.get("investment", False):
+        _reassemble(om, block, ["output_bound"], var.set_bounds,
+                    side="output")
+    else:
+        var.set_bounds(om, block, side="output")
+
+
+@updater.register(Bus)
+def _(e, om, block):
+    """ Builds the global limits of the buses again.
+    """
+    _reassemble(om, block, ["global_limit"], lc.add_global_output_limit)
+    return om
+
+
+@updater.register(Simple)
+@updater.register(CHP)
+@updater.register(transports.Simple)
+def _(e, om, block):
+    """ Sets the output bounds again.
+    """
+    _update_output_bounds(om, block)
+    return om
+
+
+@updater.register(SimpleExtractionCHP)
+def _(e, om, block):
+    """ Sets the output and input bounds again.
+    """
+    _update_output_bounds(om, block)
+    var.set_bounds(om, block, side="input")
+    return om
+
+
+@updater.register(VariableEfficiencyCHP)
+def _(e, om, block):
+    """ Builds the constraints with parameters in their coefficients again
+    (efficiency relations, status dependent bounds, gradients, minimum up
+    and down times), as far as the block has them.
+    """
+    for names, function, kwargs in [
+            (["ioo_relation"], lc.add_eta_total_chp_relation, {}),
+            (["variable_linear_eta_relation"],
+             milc.add_variable_linear_eta_relation, {}),
+            (["maximum_output", "minimum_output"], milc.set_bounds,
+             {"side": "output"}),
+            (["maximum_input", "minimum_input"], milc.set_bounds,
+             {"side": "input"}),
+            (["minimum_uptime"], milc.add_minimum_uptime, {}),
+            (["minimum_downtime"], milc.add_minimum_downtime, {})]:
+        if block.component(names[0]) is not None:
+            _reassemble(om, block, names, function, **kwargs)
+    positive = block.component("milp_gradient_pos") is not None
+    negative = block.component("milp_gradient_neg") is not None
+    if positive or negative:
+        _reassemble(om, block, ["milp_gradient_pos", "milp_gradient_neg"],
+                    milc.add_output_gradient_constraints,
+                    grad_direc="both" if positive and negative else
+                    "positive" if positive else "negative")
+    return om
+
+
+@updater.register(FixedSource)
+def _(e, om, block):
+    """ Fixes the output values again (investment: builds the constraint
+    again).
+    """
+    _reassemble(om, block, ["invest"], lc.add_fixed_source)
+    return om
+
+
+@updater.register(DispatchSource)
+def _(e, om, block):
+    """ Sets the output bounds and the right hand side of the curtailment
+    constraint again.
+    """
+    if not om.energysystem.simulation.fast_build:
+        _reassemble(om, block, ["curtailment"], lc.add_dispatch_source)
+        return om
+    uids = [obj.uid for obj in block.objs]
+    values = (pofast.sequences({obj.uid: obj.val for obj in block.objs},
+                               uids, om.timesteps) *
+              np.array([obj.out_max[0] for obj in block.objs])[:, None])
+    pofast.set_bounds(pofast.outflow_variables(om, block, 0), upper=values)
+    pofast.set_rhs(block.curtailment,
+                   pofast.timestep_index(uids, om.timesteps), values.ravel())
+    return om
+
+
+@updater.register(Sink)
+def _(e, om, block):
+    """ Fixes the input values again.
+    """
+    var.set_fixed_sink_value(om, block)
+    return om
+
+
+@updater.register(Commodity)
+def _(e, om, block):
+    """ Builds the global limits again.
+    """
+    _reassemble(om, block, ["global_limit"], lc.add_global_output_limit)
+    return om
+
+
+@updater.register(Storage)
+def _(e, om, block):
+    """ Sets the capacity bounds, the flow bounds, the initial capacity
+    (right hand side of the storage balance) and the final capacity again.
+    """
+    investment = block.optimization_options.get("investment", False)
+    if investment or om.periods is not None:
+        _reassemble(om, block, ["cap_bound", "cap_bound_min",
+                                "cap_intra_max_bound", "cap_intra_min_bound"],
+                    var.set_storage_cap_bounds)
+    else:
+        var.set_storage_cap_bounds(om, block)
+    if investment:
+        _reassemble(om, block,
+                    ["discharge_limit_invest", "charge_limit_invest"],
+                    lc.add_storage_charge_discharge_limits)
+    else:
+        var.set_bounds(om, block, side="output")
+        var.set_bounds(om, block, side="input")
+    if om.periods is not None or not om.energysystem.simulation.fast_build:
+        _reassemble(om, block, ["balance", "inter_balance"],
+                    lc.add_storage_balance)
+        return om
+    uids = [obj.uid for obj in block.objs]
+    t_last = len(om.timesteps) - 1
+    for obj in block.objs:
+        if obj.cap_final is False:
+            block.cap[obj.uid, t_last].unfix()
+        elif obj.cap_final is None:
+            block.cap[obj.uid, t_last].fix(obj.cap_initial)
+        else:
+            block.cap[obj.uid, t_last].fix(obj.cap_final)
+    pofast.set_rhs(block.balance, [(e, om.timesteps[0]) for e in uids],
+                   [obj.cap_initial for obj in block.objs])
+    return om
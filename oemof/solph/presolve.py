@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Presolve of a constructed OptimizationModel.
+
+The flows of sinks and fixed sources are variables of `om.w` fixed to their
+values (see :func:`set_fixed_sink_value
+<oemof.solph.variables.set_fixed_sink_value>` and :func:`add_fixed_source
+<oemof.solph.linear_constraints.add_fixed_source>`). The presolve folds all
+fixed variables into the right hand sides of the rows (e.g. of the bus
+balances), so they are referenced by no row anymore and are neither
+written to the problem file nor passed to the solver. The objective is not
+altered, its fixed terms are part of the constant of the problem file
+anyway and they keep the costs of every timestep (see
+:meth:`OptimizationModel.timestep_costs
+<oemof.solph.optimization_model.OptimizationModel.timestep_costs>`). The
+variables keep their fixed values, i.e. the results are read as before.
+
+Rows left without variables (e.g. global limits of fixed flows only) and
+inequalities implied by the bounds of their variables are deactivated.
+
+"""
+
+import logging
+
+import pyomo.environ as po
+from pyomo.core.base.numvalue import NumericConstant
+
+from . import pyomo_fastbuild as pofast
+from .problem_writer import _linear_terms, _name
+
+
+def presolve(model, tol=1e-9):
+    r"""Presolves a constructed optimization model in place.
+
+    Parameters
+    ----------
+    model : OptimizationModel() instance
+        The constructed model.
+    tol : float
+        Tolerance of the feasibility of rows without variables and of the
+        redundancy of inequalities.
+
+    Returns
+    -------
+    dict
+        'fixed_columns' (number of fixed variables of the flows),
+        'folded_rows' (rows with fixed variables or constants moved to the
+        right hand side) and 'dropped_rows' (deactivated rows).
+    """
+    stats = {'fixed_columns': sum(1 for v in model.w.values() if v.fixed),
+             'folded_rows': 0, 'dropped_rows': 0}
+
+    for block in model.block_data_objects(active=True):
+        for con in list(block.component_data_objects(
+                po.Constraint, active=True, descend_into=False)):
+            terms, constant = _linear_terms(con.body)
+            lower = (None if con.lower is None
+                     else po.value(con.lower) - constant)
+            upper = (None if con.upper is None
+                     else po.value(con.upper) - constant)
+            if not terms:
+                if ((lower is not None and lower > tol) or
+                        (upper is not None and upper < -tol)):
+                    raise ValueError("Infeasible constraint without " +
+                                     "variables: {0}".format(_name(con)))
+                con.deactivate()
+                stats['dropped_rows'] += 1
+                continue
+            if not con.equality and _redundant(terms, lower, upper, tol):
+                logging.debug("Dropping redundant row %s", _name(con))
+                con.deactivate()
+                stats['dropped_rows'] += 1
+                continue
+            if constant == 0 and not _has_fixed(con.body, len(terms)):
+                continue
+            con._body = pofast.linear_expression(
+                [c for v, c in terms], [v for v, c in terms])
+            if lower is not None:
+                con._lower = NumericConstant(lower)
+            if upper is not None:
+                con._upper = NumericConstant(upper)
+            stats['folded_rows'] += 1
+
+    logging.info(("Presolve: {fixed_columns} fixed columns folded into " +
+                  "{folded_rows} rows, {dropped_rows} rows dropped.").format(
+                      **stats))
+    return stats
+
+
+def _has_fixed(expr, n_terms):
+    """True if a linear sum has fixed or repeated variables, i.e. more
+    variables than `n_terms` free ones. Other expressions are always
+    rebuilt.
+    """
+    args = getattr(expr, '_args', None)
+    if args is None or not hasattr(expr, '_coef'):
+        return True
+    return len(args) != n_terms
+
+
+def _redundant(terms, lower, upper, tol):
+    """True if the bounds of the variables imply lower <= terms <= upper."""
+    low = high = 0.
+    for var, coef in terms:
+        lb, ub = var.lb, var.ub
+        if coef < 0:
+            lb, ub = ub, lb
+        low = -float('inf') if lb is None else low + coef * lb
+        high = float('inf') if ub is None else high + coef * ub
+    return ((lower is None or low >= lower - tol) and
+            (upper is None or high <= upper + tol))
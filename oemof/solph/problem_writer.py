@@ -0,0 +1,600 @@
+# -*- coding: utf-8 -*-
+"""
+Native writer for the problem files (CPLEX LP or free MPS format) of an
+OptimizationModel.
+
+The writer bypasses pyomo's problem writers. The constraints are streamed
+block by block to the (optionally gzip-compressed) file. Columns and rows
+get compact numeric labels (x1, x2,... and c1, c2,...). The mapping of
+the labels to the pyomo names is stored in a separate label map file.
+
+The same rows can be exported as sparse matrices (:func:`to_matrices`),
+e.g. to compare the structure of two models independent of the order of
+their rows and columns.
+
+"""
+
+from array import array
+import csv
+import gzip
+import logging
+
+import numpy as np
+import pyomo.environ as po
+from pyomo.core.base.expr_coopr3 import _SumExpression
+from pyomo.core.base.var import _VarData
+from pyomo.repn import generate_canonical_repn, LinearCanonicalRepn
+try:
+    import scipy.sparse as sparse
+except ImportError:
+    sparse = None
+    logging.info('scipy not installed, to_matrices() will not work.')
+
+
+ONE_VAR_CONSTANT = 'ONE_VAR_CONSTANT'
+
+
+class ProblemFile:
+    r"""A problem file written by :func:`write_problem`.
+
+    Parameters
+    ----------
+    filename : string
+        Path of the problem file.
+    file_format : string
+        'lp' or 'mps'
+    variables : list
+        The pyomo variable data objects in the order of the column labels,
+        i.e. variables[0] is labeled 'x1'.
+    constraints : list
+        The pyomo constraint data objects in the order of the row labels,
+        i.e. constraints[0] is labeled 'c1'. Ranged constraints are written
+        as two rows and appear twice.
+    labels_file : string
+        Path of the label map file (None if no label map was written).
+    constant_column : int
+        Position of the column of the objective constant
+        (`ONE_VAR_CONSTANT`) among all columns in the order of their first
+        appearance in the file (None if there is no such column).
+    """
+    def __init__(self, filename, file_format, variables, constraints,
+                 labels_file=None, constant_column=None):
+        self.filename = filename
+        self.file_format = file_format
+        self.variables = variables
+        self.constraints = constraints
+        self.labels_file = labels_file
+        self.constant_column = constant_column
+
+    def column_labels(self):
+        """Returns a dictionary mapping column labels to variables."""
+        return {'x{0}'.format(k + 1): v for k, v in enumerate(self.variables)}
+
+    def row_labels(self):
+        """Returns a dictionary mapping row labels to constraints."""
+        return {'c{0}'.format(k + 1): c
+                for k, c in enumerate(self.constraints)}
+
+    def load_solution(self, model, results, duals=False):
+        r"""Loads the solution of a pyomo results object obtained by solving
+        the problem file into the variables of `model`.
+
+        Parameters
+        ----------
+        model : OptimizationModel() instance
+            The model the problem file was written for.
+        results : pyomo.opt.SolverResults
+            Results of the solver call with the problem file as argument.
+        duals : boolean
+            If True, duals and reduced costs are stored in the suffixes
+            `model.dual` and `model.rc`.
+        """
+        if len(results.solution) == 0:
+            logging.warning("No solution found in the solver results.")
+            return
+        solution = results.solution(0)
+        columns = self.column_labels()
+        # solvers do not necessarily report variables with zero value
+        for var in self.variables:
+            if not var.fixed:
+                var.value = 0
+        for label, data in solution.variable.items():
+            var = columns.get(label)
+            if var is None or var.fixed:
+                continue
+            var.value = data.get('Value', 0)
+            if duals and 'Rc' in data:
+                model.rc[var] = data['Rc']
+        if duals:
+            rows = self.row_labels()
+            for label, data in solution.constraint.items():
+                con = rows.get(label)
+                if con is not None and 'Dual' in data:
+                    model.dual[con] = data['Dual']
+
+
+def write_problem(model, filename, file_format=None, compress=None,
+                  label_map=True):
+    r"""Writes the problem file of an optimization model.
+
+    Parameters
+    ----------
+    model : OptimizationModel() instance
+        The constructed model with one active objective.
+    filename : string
+        Path of the problem file.
+    file_format : string
+        'lp' (CPLEX LP format) or 'mps' (free MPS format). If None the
+        format is taken from the file extension (default: 'lp').
+    compress : boolean
+        If True, the file is gzip-compressed (and '.gz' is appended to the
+        filename if missing). If None, the file is compressed if the
+        filename ends with '.gz'.
+    label_map : boolean
+        If True, a label map file (`<filename>.labels`, csv with the quoted
+        columns label and name) is written next to the problem file.
+
+    Returns
+    -------
+    :class:`ProblemFile`
+    """
+    if compress is None:
+        compress = filename.endswith('.gz')
+    elif compress and not filename.endswith('.gz'):
+        filename += '.gz'
+    basename = filename[:-3] if filename.endswith('.gz') else filename
+    if file_format is None:
+        file_format = 'mps' if basename.lower().endswith('.mps') else 'lp'
+    if file_format not in ('lp', 'mps'):
+        raise ValueError("Unknown problem file format: {0}".format(
+            file_format))
+
+    columns = _Columns()
+    rows = []
+    if compress:
+        f = gzip.open(filename, 'wt')
+    else:
+        f = open(filename, 'w')
+    with f:
+        if file_format == 'lp':
+            _write_lp(model, f, columns, rows)
+        else:
+            _write_mps(model, f, columns, rows)
+
+    labels_file = None
+    if label_map:
+        labels_file = basename + '.labels'
+        with open(labels_file, 'w', newline='') as f:
+            # pyomo names contain commas, e.g. w[('a','b'),0]
+            writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+            writer.writerow(['label', 'name'])
+            writer.writerows(('x{0}'.format(k + 1), _name(var))
+                             for k, var in enumerate(columns.variables))
+            writer.writerows(('c{0}'.format(k + 1), _name(con))
+                             for k, con in enumerate(rows))
+
+    logging.info("Problem file ({0} columns, {1} rows) saved to {2}".format(
+        len(columns.variables), len(rows), filename))
+    return ProblemFile(filename, file_format, columns.variables, rows,
+                       labels_file, columns.constant_column)
+
+
+class ProblemMatrices:
+    r"""The linear problem of a model as arrays: the rows
+    :math:`lower \le A x \le upper` are stored as `A x (sense) rhs`.
+
+    Parameters
+    ----------
+    A : scipy.sparse.csr_matrix
+        Constraint matrix (rows x columns).
+    rhs : numpy.ndarray
+        Right hand side of every row.
+    senses : numpy.ndarray
+        Sense of every row: '=', '>=' or '<='. Ranged constraints are two
+        rows.
+    lower, upper : numpy.ndarray
+        Bounds of every column (-inf/inf if unbounded).
+    c : numpy.ndarray
+        Objective coefficient of every column.
+    constant : float
+        Constant of the objective function.
+    integer : numpy.ndarray
+        True for integer and binary columns.
+    row_labels, column_labels : numpy.ndarray
+        Label of every row/column: the name of the pyomo component followed
+        by the index, e.g. ('w', 'pp_gas', 'bel', 0).
+    sense : string
+        'min' or 'max'
+    variables, constraints : list
+        The pyomo variable (constraint) data object of every column (row).
+    """
+    def __init__(self, A, rhs, senses, lower, upper, c, constant, integer,
+                 row_labels, column_labels, sense='min', variables=None,
+                 constraints=None):
+        self.A = A
+        self.rhs = rhs
+        self.senses = senses
+        self.lower = lower
+        self.upper = upper
+        self.c = c
+        self.constant = constant
+        self.integer = integer
+        self.row_labels = row_labels
+        self.column_labels = column_labels
+        self.sense = sense
+        self.variables = variables
+        self.constraints = constraints
+
+    @property
+    def shape(self):
+        return self.A.shape
+
+    def canonical(self):
+        r"""Returns the matrices with rows and columns sorted by their labels
+        (rows with the same label by sense), i.e. independent of the order
+        in which the model was built. Rows whose first coefficient is
+        negative are multiplied by -1 (inequalities change their sense), so
+        e.g. `0 == x` and `-x == 0` give the same row. The pyomo objects are
+        dropped.
+        """
+        cols = sorted(range(len(self.column_labels)),
+                      key=lambda k: repr(self.column_labels[k]))
+        A = self.A[:, cols].tocsr()
+        # explicit zeros (e.g. -0.0) must neither count as first
+        # coefficient nor as coefficient at all
+        A.eliminate_zeros()
+        A.sort_indices()
+        nonempty = np.diff(A.indptr) > 0
+        sign = np.ones(A.shape[0])
+        sign[nonempty] = np.sign(A.data[A.indptr[:-1][nonempty]])
+        flip = {'=': '=', '>=': '<=', '<=': '>='}
+        senses = np.array([flip[s] if k < 0 else s
+                           for s, k in zip(self.senses, sign)], dtype=object)
+        rows = sorted(range(len(self.row_labels)),
+                      key=lambda k: (repr(self.row_labels[k]), senses[k]))
+        A = sparse.diags(sign).dot(A)[rows].tocsr()
+        A.sort_indices()
+        return ProblemMatrices(A, (sign * self.rhs)[rows], senses[rows],
+                               self.lower[cols], self.upper[cols],
+                               self.c[cols], self.constant,
+                               self.integer[cols], self.row_labels[rows],
+                               self.column_labels[cols], self.sense)
+
+    def equals(self, other, tol=1e-9):
+        r"""Returns True if both problems have the same rows, columns and
+        coefficients (up to `tol`), independent of their order.
+        """
+        a, b = self.canonical(), other.canonical()
+        if (a.shape != b.shape or a.sense != b.sense or
+                list(a.row_labels) != list(b.row_labels) or
+                list(a.column_labels) != list(b.column_labels) or
+                list(a.senses) != list(b.senses) or
+                (a.integer != b.integer).any()):
+            return False
+        difference = abs(a.A - b.A)
+        if difference.nnz and difference.max() > tol:
+            return False
+        return all(np.allclose(x, y, rtol=0, atol=tol)
+                   for x, y in [(a.rhs, b.rhs), (a.lower, b.lower),
+                                (a.upper, b.upper), (a.c, b.c),
+                                ([a.constant], [b.constant])])
+
+
+def to_matrices(model):
+    r"""Returns the linear problem of an optimization model as sparse
+    matrices (see :class:`ProblemMatrices`). Rows and columns are the same
+    as in the problem file of :func:`write_problem`: fixed variables are
+    moved to the right hand side and constraints without variables are
+    skipped.
+
+    Parameters
+    ----------
+    model : OptimizationModel() instance
+        The constructed model with one active objective.
+
+    Returns
+    -------
+    :class:`ProblemMatrices`
+    """
+    if sparse is None:
+        raise ImportError("to_matrices() requires scipy.")
+    columns = _Columns()
+    obj = _objective(model)
+    terms, constant = _linear_terms(obj.expr)
+    cost = {}
+    for var, coef in terms:
+        cost[columns.id(var)] = coef
+
+    constraints, senses, rhs = [], [], []
+    row, col, data = array('l'), array('l'), array('d')
+    for con, terms, sense, value in _constraints(model):
+        k = len(constraints)
+        constraints.append(con)
+        senses.append(sense)
+        rhs.append(value)
+        for var, coef in terms:
+            row.append(k)
+            col.append(columns.id(var))
+            data.append(coef)
+
+    n = len(columns.variables)
+    A = sparse.csr_matrix(
+        (np.frombuffer(data, dtype=float),
+         (np.frombuffer(row, dtype=row.typecode),
+          np.frombuffer(col, dtype=col.typecode))),
+        shape=(len(constraints), n))
+    c = np.zeros(n)
+    c[list(cost)] = list(cost.values())
+    lower, upper = np.empty(n), np.empty(n)
+    integer = np.zeros(n, dtype=bool)
+    for k, var in enumerate(columns.variables):
+        lb, ub = _bounds(var)
+        lower[k] = -np.inf if lb is None else lb
+        upper[k] = np.inf if ub is None else ub
+        integer[k] = var.is_integer() or var.is_binary()
+
+    var_labels = _labels(model, po.Var)
+    con_labels = _labels(model, po.Constraint)
+    return ProblemMatrices(
+        A, np.array(rhs, dtype=float), np.array(senses, dtype=object),
+        lower, upper, c, float(constant), integer,
+        _object_array([con_labels[id(con)] for con in constraints]),
+        _object_array([var_labels[id(var)] for var in columns.variables]),
+        'min' if obj.sense == po.minimize else 'max',
+        columns.variables, constraints)
+
+
+def _labels(model, ctype):
+    """Maps the id of every data object of the components of type `ctype`
+    to its label (name of the component followed by the index).
+    """
+    labels = {}
+    for component in model.component_objects(ctype, active=True,
+                                             descend_into=True):
+        name = _name(component)
+        for index, data in component.items():
+            if index is None:
+                index = ()
+            elif not isinstance(index, tuple):
+                index = (index,)
+            labels[id(data)] = (name,) + index
+    return labels
+
+
+def _object_array(labels):
+    """1-dimensional object array of tuples."""
+    result = np.empty(len(labels), dtype=object)
+    for k, label in enumerate(labels):
+        result[k] = label
+    return result
+
+
+class _Columns:
+    """Assigns the numeric column labels in the order of appearance."""
+    def __init__(self):
+        self.variables = []
+        self.ids = {}
+        self.constant = False
+        self.constant_column = None
+
+    def id(self, var):
+        k = self.ids.get(id(var))
+        if k is None:
+            k = self.ids[id(var)] = len(self.variables)
+            self.variables.append(var)
+        return k
+
+
+def _linear_terms(expr):
+    """Returns the (variable, coefficient) pairs and the constant of a linear
+    expression. Fixed variables are treated as constants and multiple
+    occurrences of a variable are merged.
+    """
+    coefficients = {}
+    variables = {}
+    if (type(expr) is _SumExpression and
+            all(isinstance(v, _VarData) for v in expr._args)):
+        # linear sums like the ones built by pyomo_fastbuild
+        constant = expr._const
+        pairs = zip(expr._args, expr._coef)
+    else:
+        repn = generate_canonical_repn(expr)
+        if not isinstance(repn, LinearCanonicalRepn):
+            raise ValueError("Only linear expressions can be written to " +
+                             "a problem file: {0}".format(expr))
+        constant = repn.constant or 0
+        pairs = zip(repn.variables or [], repn.linear or [])
+    for var, coef in pairs:
+        if var.fixed:
+            constant += coef * var.value
+            continue
+        k = id(var)
+        if k in coefficients:
+            coefficients[k] += coef
+        else:
+            coefficients[k] = coef
+            variables[k] = var
+    return [(variables[k], c) for k, c in coefficients.items()], constant
+
+
+def _objective(model):
+    objectives = list(model.component_data_objects(po.Objective,
+                                                   active=True))
+    if len(objectives) != 1:
+        raise ValueError("Exactly one active objective is required to " +
+                         "write a problem file.")
+    return objectives[0]
+
+
+def _constraints(model):
+    """Yields the rows (constraint, terms, sense, rhs) block by block."""
+    for block in model.block_data_objects(active=True):
+        for con in block.component_data_objects(po.Constraint, active=True,
+                                                descend_into=False):
+            terms, constant = _linear_terms(con.body)
+            lower = None if con.lower is None else po.value(con.lower)
+            upper = None if con.upper is None else po.value(con.upper)
+            if not terms:
+                if ((lower is not None and constant < lower - 1e-9) or
+                        (upper is not None and constant > upper + 1e-9)):
+                    raise ValueError("Infeasible constraint without " +
+                                     "variables: {0}".format(_name(con)))
+                logging.debug("Skipping trivial constraint %s", _name(con))
+                continue
+            if con.equality:
+                yield con, terms, '=', lower - constant
+            else:
+                if lower is not None:
+                    yield con, terms, '>=', lower - constant
+                if upper is not None:
+                    yield con, terms, '<=', upper - constant
+
+
+def _bounds(var):
+    """Returns lower and upper bound of a variable (None: infinite)."""
+    if var.fixed:
+        return var.value, var.value
+    return var.lb, var.ub
+
+
+def _write_lp(model, f, columns, rows):
+    obj = _objective(model)
+    terms, constant = _linear_terms(obj.expr)
+    f.write('\\* Problem file written by oemof *\\\n\n')
+    f.write('min\n' if obj.sense == po.minimize else 'max\n')
+    f.write('obj:\n')
+    for var, coef in terms:
+        f.write('{0:+.17g} x{1}\n'.format(coef, columns.id(var) + 1))
+    if constant:
+        columns.constant = True
+        f.write('{0:+.17g} {1}\n'.format(constant, ONE_VAR_CONSTANT))
+    if not terms and not constant:
+        f.write('+0 {0}\n'.format(ONE_VAR_CONSTANT))
+        columns.constant = True
+    if columns.constant:
+        # follows the columns of the objective
+        columns.constant_column = len(terms)
+
+    f.write('\ns.t.\n\n')
+    for con, terms, sense, rhs in _constraints(model):
+        rows.append(con)
+        lines = ['c{0}:\n'.format(len(rows))]
+        lines.extend('{0:+.17g} x{1}\n'.format(coef, columns.id(var) + 1)
+                     for var, coef in terms)
+        lines.append('{0} {1!r}\n\n'.format(sense, float(rhs)))
+        f.write(''.join(lines))
+
+    f.write('bounds\n')
+    if columns.constant:
+        f.write('{0} = 1\n'.format(ONE_VAR_CONSTANT))
+    binaries, integers = [], []
+    for k, var in enumerate(columns.variables):
+        label = 'x{0}'.format(k + 1)
+        if var.is_binary() and not var.fixed:
+            binaries.append(label)
+            continue
+        if var.is_integer():
+            integers.append(label)
+        lb, ub = _bounds(var)
+        if lb is not None and lb == ub:
+            f.write('{0} = {1!r}\n'.format(label, float(lb)))
+        elif lb is None and ub is None:
+            f.write('{0} free\n'.format(label))
+        elif ub is None:
+            if lb != 0:
+                f.write('{0} >= {1!r}\n'.format(label, float(lb)))
+        else:
+            f.write('{0} <= {1} <= {2!r}\n'.format(
+                '-inf' if lb is None else repr(float(lb)), label, float(ub)))
+    if integers:
+        f.write('general\n')
+        f.write(''.join('{0}\n'.format(x) for x in integers))
+    if binaries:
+        f.write('binary\n')
+        f.write(''.join('{0}\n'.format(x) for x in binaries))
+    f.write('end\n')
+
+
+def _write_mps(model, f, columns, rows):
+    obj = _objective(model)
+    sense = {'=': 'E', '>=': 'G', '<=': 'L'}
+    f.write('NAME oemof\n')
+    if obj.sense != po.minimize:
+        f.write('OBJSENSE\n    MAX\n')
+    f.write('ROWS\n N obj\n')
+
+    # the column section requires the coefficients sorted by column, so the
+    # coefficients are buffered as compact arrays (row -1 is the objective)
+    row_ids, col_ids, coefs, rhs = array('l'), array('l'), array('d'), []
+    terms, constant = _linear_terms(obj.expr)
+    for var, coef in terms:
+        row_ids.append(-1)
+        col_ids.append(columns.id(var))
+        coefs.append(coef)
+    for con, terms, s, b in _constraints(model):
+        rows.append(con)
+        f.write(' {0} c{1}\n'.format(sense[s], len(rows)))
+        for var, coef in terms:
+            row_ids.append(len(rows) - 1)
+            col_ids.append(columns.id(var))
+            coefs.append(coef)
+        rhs.append(b)
+
+    f.write('COLUMNS\n')
+    row_ids = np.frombuffer(row_ids, dtype=row_ids.typecode)
+    col_ids = np.frombuffer(col_ids, dtype=col_ids.typecode)
+    coefs = np.frombuffer(coefs, dtype=float)
+    order = np.argsort(col_ids, kind='mergesort')
+    start = np.searchsorted(col_ids[order],
+                            np.arange(len(columns.variables) + 1))
+    integer = False
+    for k, var in enumerate(columns.variables):
+        is_integer = var.is_integer() or var.is_binary()
+        if is_integer != integer:
+            f.write(' MARKER MARKER {0}\n'.format(
+                'INTORG' if is_integer else 'INTEND'))
+            integer = is_integer
+        label = 'x{0}'.format(k + 1)
+        for i in order[start[k]:start[k + 1]]:
+            row = 'obj' if row_ids[i] < 0 else 'c{0}'.format(row_ids[i] + 1)
+            f.write(' {0} {1} {2!r}\n'.format(label, row, float(coefs[i])))
+    if integer:
+        f.write(' MARKER MARKER INTEND\n')
+    if constant:
+        f.write(' {0} obj {1!r}\n'.format(ONE_VAR_CONSTANT, float(constant)))
+        columns.constant_column = len(columns.variables)
+
+    f.write('RHS\n')
+    for k, b in enumerate(rhs):
+        if b:
+            f.write(' RHS c{0} {1!r}\n'.format(k + 1, float(b)))
+
+    f.write('BOUNDS\n')
+    if constant:
+        f.write(' FX BND {0} 1\n'.format(ONE_VAR_CONSTANT))
+    for k, var in enumerate(columns.variables):
+        label = 'x{0}'.format(k + 1)
+        lb, ub = _bounds(var)
+        if var.is_binary() and not var.fixed:
+            f.write(' BV BND {0}\n'.format(label))
+        elif lb is not None and lb == ub:
+            f.write(' FX BND {0} {1!r}\n'.format(label, float(lb)))
+        else:
+            if lb is None and ub is None:
+                f.write(' FR BND {0}\n'.format(label))
+                continue
+            if lb is None:
+                f.write(' MI BND {0}\n'.format(label))
+            elif lb != 0:
+                f.write(' LO BND {0} {1!r}\n'.format(label, float(lb)))
+            if ub is not None:
+                f.write(' UP BND {0} {1!r}\n'.format(label, float(ub)))
+    f.write('ENDATA\n')
+
+
+def _name(component):
+    """Fully qualified name of a pyomo component (data) object."""
+    try:
+        return component.cname(True)
+    except AttributeError:
+        return component.name
@@ -11,8 +11,11 @@
 from pyomo.environ import Constraint
 from pyomo.environ import Var
 
+import numpy as np
 import pyomo
 
+from .build_stats import measure_component
+
 
 def l_constraint(model, name, constraints, *args):
     r"""A replacement for pyomo's Constraint that quickly builds linear
@@ -51,32 +54,432 @@ def l_constraint(model, name, constraints, *args):
 
     """
 
-    setattr(model, name, Constraint(*args, noruleinit=True))
+    # the rows are part of the build statistics of the constraint
+    with measure_component(model, name):
+        setattr(model, name, Constraint(*args, noruleinit=True))
 
-    v = getattr(model, name)
+        v = getattr(model, name)
 
-    for i in v._index:
-        c = constraints[i]
-        v._data[i] = pyomo.core.base.constraint._GeneralConstraintData(None, v)
-        v._data[i]._body = pyomo.core.base.expr_coopr3._SumExpression()
-        v._data[i]._body._args = [item[1] for item in c[0]]
-        v._data[i]._body._coef = [item[0] for item in c[0]]
-        v._data[i]._body._const = 0.
-        if c[1] == "==":
-            v._data[i]._equality = True
-            v._data[i]._lower = pyomo.core.base.numvalue.NumericConstant(c[2])
-            v._data[i]._upper = pyomo.core.base.numvalue.NumericConstant(c[2])
-        elif c[1] == "<=":
-            v._data[i]._equality = False
-            v._data[i]._lower = None
-            v._data[i]._upper = pyomo.core.base.numvalue.NumericConstant(c[2])
-        elif c[1] == ">=":
-            v._data[i]._equality = False
-            v._data[i]._lower = pyomo.core.base.numvalue.NumericConstant(c[2])
-            v._data[i]._upper = None
+        for i in v._index:
+            c = constraints[i]
+            _set_linear_data(v, i, [item[0] for item in c[0]],
+                             [item[1] for item in c[0]], c[1], c[2])
     #v.construct()
 
 
+def sparse_constraint(model, name, index, terms, sense, rhs, *args):
+    r"""Builds a family of linear constraints from sparse coefficient arrays.
+
+    Instead of one python call per constraint row (see
+    :func:`l_constraint`) the whole family is described by coefficient,
+    row and column arrays in coordinate (COO) format plus a sense and a
+    right hand side vector. The arrays are sorted by row at once and only
+    afterwards the rows are attached to the pyomo model.
+
+    Call:
+    sparse_constraint(model, name, index, terms, sense, rhs, index1,...)
+
+    Parameters
+    ----------
+    model : pyomo.ConcreteModel() / SimpleBlock() instance
+        pyomo model or block with constructed components
+    name : string
+       Name of constraint to be constructed
+    index : list
+        Constraint indices, the i-th element is the index of row i.
+        Rows not listed in `index` are not constructed.
+    terms : list
+        List of tuples `(rows, coeffs, variables)` with array_like elements
+        of the same shape (scalars and arrays broadcastable to the shape of
+        `rows` are allowed for `coeffs` and `variables`). `variables` holds
+        pyomo variable data objects, e.g. a slice of an array returned by
+        :func:`variable_array`.
+    sense : string or array_like
+        Sense of all rows or of every single row ("==", "<=", ">=").
+    rhs : float or array_like
+        Constant right hand side of all rows or of every single row.
+    *args :
+       arguments passed to the pyomo.Constraint() class.
+
+    Example
+    -------
+    Three rows of x(i) - 2 * y(i) <= 0 with the variable data objects stored
+    in the arrays `x` and `y`:
+
+    sparse_constraint(block, 'c', [0, 1, 2],
+                      [(np.arange(3), 1, x), (np.arange(3), -2, y)],
+                      "<=", 0., block.indexset)
+    """
+    n = len(index)
+    rows, coeffs, variables = [], [], []
+    for r, c, x in terms:
+        r = np.asarray(r, dtype=np.int64)
+        rows.append(r.ravel())
+        coeffs.append(np.broadcast_to(np.asarray(c, dtype=float),
+                                      r.shape).ravel())
+        variables.append(np.broadcast_to(np.asarray(x, dtype=object),
+                                         r.shape).ravel())
+    # terms with zero coefficients are dropped, as pyomo drops them when
+    # it builds an expression
+    coeffs = np.concatenate(coeffs)
+    nonzero = coeffs != 0
+    rows = np.concatenate(rows)[nonzero]
+    # stable sort keeps the order of the terms inside of every row
+    order = np.argsort(rows, kind='mergesort')
+    coeffs = coeffs[nonzero][order].tolist()
+    variables = np.concatenate(variables)[nonzero][order].tolist()
+    start = np.searchsorted(rows[order], np.arange(n + 1)).tolist()
+    sense = np.broadcast_to(np.asarray(sense), (n,)).tolist()
+    rhs = np.broadcast_to(np.asarray(rhs, dtype=float), (n,)).tolist()
+
+    # the rows are part of the build statistics of the constraint
+    with measure_component(model, name):
+        setattr(model, name, Constraint(*args, noruleinit=True))
+
+        v = getattr(model, name)
+
+        for row, i in enumerate(index):
+            a, b = start[row], start[row + 1]
+            _set_linear_data(v, i, coeffs[a:b], variables[a:b], sense[row],
+                             rhs[row])
+
+
+def _set_linear_data(v, i, coeffs, variables, sense, constant):
+    r"""Sets the linear constraint data of index `i` of constraint `v`."""
+    v._data[i] = pyomo.core.base.constraint._GeneralConstraintData(None, v)
+    v._data[i]._body = linear_expression(coeffs, variables)
+    if sense == "==":
+        v._data[i]._equality = True
+        v._data[i]._lower = pyomo.core.base.numvalue.NumericConstant(constant)
+        v._data[i]._upper = pyomo.core.base.numvalue.NumericConstant(constant)
+    elif sense == "<=":
+        v._data[i]._equality = False
+        v._data[i]._lower = None
+        v._data[i]._upper = pyomo.core.base.numvalue.NumericConstant(constant)
+    elif sense == ">=":
+        v._data[i]._equality = False
+        v._data[i]._lower = pyomo.core.base.numvalue.NumericConstant(constant)
+        v._data[i]._upper = None
+
+
+def linear_expression(coeffs, variables, constant=0.):
+    r"""Returns the linear expression sum(coeffs * variables) + constant as
+    pyomo sum expression without building it term by term.
+
+    Parameters
+    ----------
+    coeffs : list
+        coefficients of the variables
+    variables : list
+        pyomo variable data objects
+    constant : float
+        constant term
+    """
+    expr = pyomo.core.base.expr_coopr3._SumExpression()
+    expr._args = variables
+    expr._coef = coeffs
+    expr._const = constant
+    return expr
+
+
+def set_rhs(constraint, index, rhs):
+    r"""Sets the right hand side of existing rows of a constraint in place.
+
+    Only rows built by :func:`sparse_constraint` or :func:`l_constraint`
+    can be altered, i.e. rows without constant term in the body.
+
+    Parameters
+    ----------
+    constraint : pyomo.core.base.constraint.Constraint() object
+        constraint with the rows to alter
+    index : list
+        indices of the rows
+    rhs : float or array_like
+        new right hand side of all rows or of every single row
+    """
+    rhs = np.broadcast_to(np.asarray(rhs, dtype=float), (len(index),))
+    for i, value in zip(index, rhs.tolist()):
+        c = constraint[i]
+        value = pyomo.core.base.numvalue.NumericConstant(value)
+        if c._equality:
+            c._lower = value
+            c._upper = value
+        elif c._upper is not None:
+            c._upper = value
+        else:
+            c._lower = value
+
+
+def variable_array(var, index):
+    r"""Returns the data objects of an indexed pyomo variable as numpy array.
+
+    The array is used to translate the column positions of
+    :func:`sparse_constraint` terms into pyomo variables by fancy indexing.
+
+    Parameters
+    ----------
+    var : pyomo.core.base.var.Var() object
+       constructed indexed pyomo variable
+    index : list
+       indices of `var` in the order of the columns
+
+    Returns
+    -------
+    numpy.ndarray with dtype object
+    """
+    columns = np.empty(len(index), dtype=object)
+    for k, i in enumerate(index):
+        columns[k] = var[i]
+    return columns
+
+
+def timestep_columns(ids, timesteps):
+    r"""Column positions of a variable indexed by (id, timestep).
+
+    Variables indexed by an id set times the timesteps (like the edge
+    variable `w` or block variables indexed by `block.indexset`) are laid
+    out id by id. The position of `(id, t)` is `id * len(timesteps) + t`.
+
+    Parameters
+    ----------
+    ids : array_like
+        integer positions of the ids, e.g. the edge ids of `model.w`
+    timesteps : list
+        the timesteps of the model
+
+    Returns
+    -------
+    numpy.ndarray of shape (len(ids), len(timesteps))
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    n = len(timesteps)
+    return ids[:, None] * n + np.arange(n)[None, :]
+
+
+def edge_variables(model, edges):
+    r"""Returns the edge variables `model.w` of `edges` for all timesteps.
+
+    Parameters
+    ----------
+    model : OptimizationModel() instance
+        model with the attributes `edge_ids` and `w_columns`
+    edges : list
+        list of tuples with the uids of the edges, e.g. [('coal', 'pp_coal')]
+
+    Returns
+    -------
+    numpy.ndarray of shape (len(edges), len(model.timesteps)) with the
+    pyomo variable data objects
+    """
+    return edge_id_variables(model, [model.edge_ids[e] for e in edges])
+
+
+def edge_id_variables(model, ids):
+    r"""Returns the edge variables `model.w` of the edges with the ids `ids`
+    (see :class:`GraphIndex <oemof.solph.graph_index.GraphIndex>`) for all
+    timesteps as array of shape (len(ids), len(model.timesteps)).
+    """
+    return model.w_columns[timestep_columns(ids, model.timesteps)]
+
+
+def block_variables(var, uids, timesteps):
+    r"""Returns a variable indexed by (uid, timestep) as 2-dimensional array.
+
+    Parameters
+    ----------
+    var : pyomo.core.base.var.Var() object
+       constructed pyomo variable indexed by uids and timesteps
+    uids : list
+       uids for the rows of the array
+    timesteps : list
+        the timesteps of the model
+
+    Returns
+    -------
+    numpy.ndarray of shape (len(uids), len(timesteps))
+    """
+    index = [(e, t) for e in uids for t in timesteps]
+    return variable_array(var, index).reshape(len(uids), len(timesteps))
+
+
+def indexed_values(component, ids, timesteps, value=None):
+    r"""Reads the values of a pyomo component indexed by (id, timestep) in
+    one pass over its data objects into an array.
+
+    Parameters
+    ----------
+    component : pyomo.core.base.indexed_component.IndexedComponent
+       constructed pyomo variable or constraint indexed by (id..., t), e.g.
+       `model.w` indexed by (i, o, t) with the id (i, o)
+    ids : dict
+       row position of every id, indices with other ids are skipped
+    timesteps : list
+        the timesteps of the model
+    value : function
+        Returns the value of a data object (default: the `value` attribute,
+        e.g. the solution of a variable). None is returned as nan.
+
+    Returns
+    -------
+    numpy.ndarray of shape (len(ids), len(timesteps))
+    """
+    values = np.full((len(ids), len(timesteps)), np.nan)
+    columns = {t: k for k, t in enumerate(timesteps)}
+    for index, data in component.items():
+        row = ids.get(index[0] if len(index) == 2 else index[:-1])
+        if row is None:
+            continue
+        v = data.value if value is None else value(data)
+        if v is not None:
+            values[row, columns[index[-1]]] = v
+    return values
+
+
+def indexed_vector(component, ids, timesteps, value=None):
+    r"""Reads the values of a pyomo component indexed by (id, timestep) in
+    one pass over its data objects into a vector, like
+    :func:`indexed_values` but without arranging them as array.
+
+    Returns
+    -------
+    tuple (numpy.ndarray, numpy.ndarray)
+        The values in the order of the data objects and the position of
+        the value of every id and timestep in this vector (shape (len(ids),
+        len(timesteps)), -1 if the value is missing).
+    """
+    values = []
+    positions = np.full((len(ids), len(timesteps)), -1, dtype=int)
+    columns = {t: k for k, t in enumerate(timesteps)}
+    for index, data in component.items():
+        row = ids.get(index[0] if len(index) == 2 else index[:-1])
+        if row is None:
+            continue
+        v = data.value if value is None else value(data)
+        if v is not None:
+            positions[row, columns[index[-1]]] = len(values)
+            values.append(v)
+    return np.array(values, dtype=float), positions
+
+
+def block_edges(model, block, side):
+    r"""Returns the ids of the incoming (side 'input') or outgoing (side
+    'output') edges of the entities of `block` as array with one row per
+    entity, padded with -1.
+
+    The block of a class of components takes the array of the class
+    (:attr:`GraphIndex.type_inputs
+    <oemof.solph.graph_index.GraphIndex.type_inputs>` or `type_outputs`),
+    other blocks (e.g. of buses or of some components of a class) the
+    incoming or outgoing edges of their entities.
+    """
+    graph = model.graph
+    objs = block.objs
+    if graph.by_type.get(type(objs[0])) is objs:
+        tables = graph.type_inputs if side == 'input' else graph.type_outputs
+        return tables[type(objs[0])]
+    if side == 'input':
+        ptr, edges = graph.in_ptr, graph.in_edges
+    else:
+        ptr, edges = graph.out_ptr, graph.out_edges
+    ids = np.array([graph.ids[obj.uid] for obj in objs], dtype=int)
+    counts = ptr[ids + 1] - ptr[ids]
+    table = np.full((len(ids), counts.max()), -1, dtype=int)
+    rows, columns = np.nonzero(np.arange(table.shape[1])[None, :] <
+                               counts[:, None])
+    table[rows, columns] = edges[ptr[ids][rows] + columns]
+    return table
+
+
+def block_edge_ids(model, block, side, idx=0):
+    r"""Returns the ids of the edges of the idx-th input (side 'input') or
+    output (side 'output') of the entities of `block` as array (a column
+    of :func:`block_edges`).
+    """
+    table = block_edges(model, block, side)
+    if idx >= table.shape[1] or (table[:, idx] < 0).any():
+        raise ValueError("An entity of {0} has no {1} {2}.".format(
+            block.name, side, idx))
+    return table[:, idx]
+
+
+def inflow_variables(model, block):
+    r"""Returns the edge variables w(i_e, e, t) of the (first) input of the
+    components of `block` as array of shape (len(block.objs),
+    len(model.timesteps)).
+    """
+    return edge_id_variables(model, block_edge_ids(model, block, 'input'))
+
+
+def outflow_variables(model, block, idx=0):
+    r"""Returns the edge variables w(e, o_e, t) of the idx-th output of the
+    components of `block` as array of shape (len(block.objs),
+    len(model.timesteps)).
+    """
+    return edge_id_variables(model, block_edge_ids(model, block,
+                                                       'output', idx))
+
+
+def timestep_index(uids, timesteps):
+    r"""Constraint indices (uid, t) in the row order used together with
+    :func:`timestep_rows`.
+    """
+    return [(e, t) for e in uids for t in timesteps]
+
+
+def timestep_rows(uids, timesteps):
+    r"""Row positions of the indices of :func:`timestep_index` as array of
+    shape (len(uids), len(timesteps)).
+    """
+    return np.arange(len(uids) * len(timesteps)).reshape(len(uids),
+                                                         len(timesteps))
+
+
+def sequence(values, timesteps):
+    r"""Returns the values of a time series for all timesteps as float array.
+
+    Parameters
+    ----------
+    values : list, pandas.Series or numpy.ndarray
+        time series indexed by the timesteps
+    timesteps : list
+        the timesteps of the model
+    """
+    return np.asarray(values, dtype=float)[np.asarray(timesteps)]
+
+
+def sequences(values, uids, timesteps):
+    r"""Returns the time series values[e] of all `uids` as float array of
+    shape (len(uids), len(timesteps)).
+
+    Parameters
+    ----------
+    values : dict
+        time series (see :func:`sequence`) keyed by uid
+    uids : list
+        uids for the rows of the array
+    timesteps : list
+        the timesteps of the model
+    """
+    return np.array([sequence(values[e], timesteps) for e in uids],
+                    dtype=float).reshape(len(uids), len(timesteps))
+
+
+def fix_values(variables, values):
+    r"""Sets the value of all variable data objects in `variables` and fixes
+    them ("set variable to parameter").
+
+    Parameters
+    ----------
+    variables : array_like
+        pyomo variable data objects, e.g. taken from :func:`variable_array`
+    values : array_like
+        values of the variables
+    """
+    for var, value in zip(np.ravel(variables), np.ravel(values).tolist()):
+        var.value = value
+        var.fix()
+
+
 def mutate_variable(var=None, value=None, bounds=(0, None), fix=False,
                     index=None):
     r""" Mutates existing pyomo variable, could be used to extend an emtpy
@@ -116,3 +519,31 @@ def mutate_variable(var=None, value=None, bounds=(0, None), fix=False,
 
         if fix[i]:
             var._data[i].fix()
+
+
+def set_bounds(variables, lower=None, upper=None):
+    r"""Sets lower and/or upper bounds of all variable data objects in
+    `variables`.
+
+    Parameters
+    ----------
+    variables : array_like
+        pyomo variable data objects, e.g. taken from :func:`variable_array`
+    lower : array_like
+        lower bounds with the shape of `variables` (None: not altered)
+    upper : array_like
+        upper bounds with the shape of `variables` (None: not altered)
+
+    Bounds are broadcast to the shape of `variables`, e.g. a column vector
+    sets one bound per row.
+    """
+    shape = np.shape(variables)
+    variables = np.ravel(variables)
+    if lower is not None:
+        lower = np.broadcast_to(lower, shape).ravel().tolist()
+        for var, lb in zip(variables, lower):
+            var.setlb(lb)
+    if upper is not None:
+        upper = np.broadcast_to(upper, shape).ravel().tolist()
+        for var, ub in zip(variables, upper):
+            var.setub(ub)
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Reduction of the topology of an energy system before the optimization model
+is built.
+
+Chains: A bus with exactly one input and one output, without price, slacks
+(excess, shortage) and output limit, which connects two simple transformers
+or transports (:class:`transformers.Simple
+<oemof.core.network.entities.components.transformers.Simple>`,
+:class:`transports.Simple
+<oemof.core.network.entities.components.transports.Simple>`) with constant
+efficiency, is eliminated. Both components are merged to one component with
+the product of the efficiencies. Chains of any length are merged step by
+step.
+
+Sinks: All simple sinks (:class:`sinks.Simple
+<oemof.core.network.entities.components.sinks.Simple>`) of a bus are
+aggregated to one sink with the sum of their values.
+
+The reduction works on copies of the entities, the entities of the energy
+system are not altered. Every flow of the original energy system is a
+multiple of one flow of the reduced system (e.g. the input flow of a merged
+chain times the efficiencies up to the flow, a sink flow times its share of
+the aggregated sink), so the results of the reduced system are expanded to
+the original entities (see :meth:`TopologyReduction.expand`).
+
+"""
+
+import copy
+import logging
+import numbers
+
+import numpy as np
+
+from ..core.network import Entity, Entities
+from ..core.network.entities import Bus
+from ..core.network.entities.components import sinks as sink
+from ..core.network.entities.components import transformers as transformer
+from ..core.network.entities.components import transports as transport
+
+
+class TopologyReduction:
+    r"""Reduced copy of the entities of an energy system.
+
+    Parameters
+    ----------
+    entities : list
+        The entities of the energy system (not altered).
+
+    Attributes
+    ----------
+    entities : :class:`Entities <oemof.core.network.Entities>`
+        The entities of the reduced system (copies and merged entities).
+    original : dict
+        Original entity of every copy.
+    mapping : dict
+        Original flows of every flow (s, t) of the reduced system: list of
+        (original edge, factor), the factor is a number or an array with one
+        value per timestep of the horizon.
+    merged_chains : int
+        Number of eliminated buses.
+    merged_sinks : int
+        Number of sinks aggregated into other sinks.
+    """
+    def __init__(self, entities):
+        self.original = {}
+        copies = {}
+        for entity in entities:
+            copies[entity] = copy.copy(entity)
+            self.original[copies[entity]] = entity
+        for entity, c in copies.items():
+            c.inputs = [copies[e] for e in entity.inputs]
+            c.outputs = [copies[e] for e in entity.outputs]
+        self.entities = Entities(copies.values())
+        self.mapping = {}
+        for entity in self.entities:
+            if isinstance(entity, Bus):
+                continue
+            for i in entity.inputs:
+                self.mapping[i, entity] = [(
+                    (self.original[i], self.original[entity]), 1.)]
+            for o in entity.outputs:
+                self.mapping[entity, o] = [(
+                    (self.original[entity], self.original[o]), 1.)]
+        self.merged_chains = self.merged_sinks = 0
+
+        # new entities must not be added to the energy system
+        registry, Entity.registry = Entity.registry, None
+        try:
+            for bus in list(self.entities.groups.get(Bus, [])):
+                self._aggregate_sinks(bus)
+            for bus in list(self.entities.groups.get(Bus, [])):
+                if _pass_through(bus):
+                    self._merge_chain(bus)
+        finally:
+            Entity.registry = registry
+        logging.info("Topology reduction: {0} buses eliminated, {1} sinks "
+                     "aggregated.".format(self.merged_chains,
+                                          self.merged_sinks))
+
+    def _aggregate_sinks(self, bus):
+        sinks = [s for s in bus.outputs if _simple_sink(s)]
+        if len(sinks) < 2 or len({len(s.val) for s in sinks}) != 1:
+            return
+        values = np.array([np.asarray(s.val, dtype=float) for s in sinks])
+        total = values.sum(axis=0)
+        shares = np.divide(values, total, out=np.zeros_like(values),
+                           where=total != 0)
+        aggregated = sink.Simple(
+            uid="+".join(str(s.uid) for s in sinks), inputs=[bus],
+            val=total)
+        self.entities.append(aggregated)
+        self.mapping[bus, aggregated] = [
+            (edge, factor * share)
+            for s, share in zip(sinks, shares)
+            for edge, factor in self.mapping.pop((bus, s))]
+        self._remove(sinks)
+        self.merged_sinks += len(sinks) - 1
+
+    def _merge_chain(self, bus):
+        a, b = bus.inputs[0], bus.outputs[0]
+        source, target = a.inputs[0], b.outputs[0]
+        eta_a, eta_b = _constant(a.eta), _constant(b.eta)
+        out_a, out_b = _constant(a.out_max), _constant(b.out_max)
+        out_max = None
+        if out_a is not None or out_b is not None:
+            out_max = min(np.inf if out_a is None else out_a * eta_b,
+                          np.inf if out_b is None else out_b)
+        uid = "{0}+{1}".format(a.uid, b.uid)
+        if out_max is not None:
+            out_max = [out_max]
+        if isinstance(a, transport.Simple) and isinstance(b,
+                                                          transport.Simple):
+            merged = transport.Simple(
+                uid=uid, inputs=[source], outputs=[target],
+                eta=[eta_a * eta_b], out_max=out_max,
+                in_max=None if out_max is None else
+                [out_max[0] / (eta_a * eta_b)])
+        else:
+            # opex_var is charged on the output of transformers only
+            opex_var = sum(c.opex_var * f for c, f in [(a, 1 / eta_b),
+                                                        (b, 1)]
+                           if isinstance(c, transformer.Simple))
+            merged = transformer.Simple(
+                uid=uid, inputs=[source], outputs=[target],
+                eta=[eta_a * eta_b], out_max=out_max, opex_var=opex_var)
+        self.entities.append(merged)
+        # all flows of the chain are multiples of its input flow
+        self.mapping[source, merged] = (
+            self.mapping.pop((source, a)) +
+            [(edge, factor * eta_a)
+             for key in [(a, bus), (bus, b)]
+             for edge, factor in self.mapping.pop(key)] +
+            [(edge, factor * eta_a * eta_b)
+             for edge, factor in self.mapping.pop((b, target))])
+        self.mapping[merged, target] = []
+        self._remove([a, bus, b])
+        self.merged_chains += 1
+
+    def _remove(self, entities):
+        for entity in entities:
+            for e in entity.inputs:
+                e.outputs.remove(entity)
+            for e in entity.outputs:
+                e.inputs.remove(entity)
+        # one assignment, the indexes are rebuilt once
+        removed = set(map(id, entities))
+        self.entities[:] = [e for e in self.entities if id(e) not in removed]
+
+    def expand(self, results, timesteps):
+        r"""Expands the results of the reduced system to the entities of the
+        original system.
+
+        Flows are the flows of the reduced system multiplied by their
+        factors. All other time series (e.g. storage levels, duals) are
+        taken over for the original entities; duals of eliminated buses are
+        not available. Reduced costs of merged flows are nan.
+
+        Parameters
+        ----------
+        results : :class:`Results <oemof.solph.results.Results>`
+            Results of the reduced system.
+        timesteps : list
+            Positions of the timesteps of the results in the horizon.
+
+        Returns
+        -------
+        :class:`Results <oemof.solph.results.Results>`
+        """
+        positions = list(timesteps)
+        index, rows, factors, identical = [], [], [], []
+        for k, key in enumerate(results.index[:results.n_edges]):
+            for edge, factor in self.mapping[key]:
+                if isinstance(factor, np.ndarray):
+                    factor = factor[positions]
+                index.append(edge)
+                rows.append(k)
+                factors.append(factor)
+                identical.append(len(self.mapping[key]) == 1 and
+                                 not isinstance(factor, np.ndarray) and
+                                 factor == 1)
+        n_edges = len(index)
+        flows = np.array([results.array[k] * f
+                          for k, f in zip(rows, factors)]).reshape(
+                              n_edges, results.array.shape[1])
+        for k, (s, t) in enumerate(results.index[results.n_edges:]):
+            index.append((self.original.get(s, s), self.original.get(t, t)))
+            rows.append(results.n_edges + k)
+        array = np.vstack([flows, results.array[rows[n_edges:]]])
+        reduced_costs = None
+        if results.reduced_costs is not None:
+            reduced_costs = np.full(flows.shape, np.nan)
+            for k, (row, same) in enumerate(zip(rows, identical)):
+                if same:
+                    reduced_costs[k] = results.reduced_costs.array[row]
+        attributes = {self.original.get(e, e): a
+                      for e, a in results.attributes.items()}
+        return type(results)(index, array, n_edges, results.objective,
+                             attributes, reduced_costs,
+                             solver_status=results.solver_status)
+
+
+def reduce_topology(entities):
+    r"""Returns the :class:`TopologyReduction` of `entities`."""
+    return TopologyReduction(entities)
+
+
+def _constant(value):
+    """The number `value` or the only element of `value` (None if `value`
+    is None or no constant).
+    """
+    if (isinstance(value, (list, tuple, np.ndarray)) and len(value) == 1):
+        value = value[0]
+    if isinstance(value, numbers.Number) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def _simple_component(c):
+    """True if `c` can be merged with its neighbour of a chain."""
+    return (type(c) in (transformer.Simple, transport.Simple) and
+            not type(c).optimization_options and
+            len(c.inputs) == 1 and len(c.outputs) == 1 and
+            _constant(c.eta) not in (None, 0) and
+            (c.out_max is None or _constant(c.out_max) is not None) and
+            not c.ub_out and not c.opex_fix)
+
+
+def _pass_through(bus):
+    """True if `bus` only passes the flow of one simple component to
+    another one.
+    """
+    return (type(bus) is Bus and bus.balanced and not bus.price and
+            not bus.excess and not bus.shortage and
+            bus.sum_out_limit == float("+inf") and
+            len(bus.inputs) == 1 and len(bus.outputs) == 1 and
+            bus.inputs[0] is not bus.outputs[0] and
+            all(_simple_component(c) for c in bus.inputs + bus.outputs))
+
+
+def _simple_sink(s):
+    """True if `s` can be aggregated with the other sinks of its bus."""
+    return (type(s) is sink.Simple and not type(s).optimization_options and
+            len(s.inputs) == 1 and s.val is not None)
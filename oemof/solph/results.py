@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar container for the results of an optimization model.
+
+"""
+
+from collections import UserDict as UD
+import logging
+import os
+import tempfile
+import weakref
+
+import numpy as np
+
+
+class Results(UD):
+    r"""Results of an optimization model stored as one array.
+
+    All time series are rows of the 2-dimensional float array `array`
+    (series x timesteps). The first `n_edges` rows are the flows of the
+    edges, followed by the time series belonging to one object (e.g. storage
+    levels, dispatch values of dispatch sources, duals of balanced buses and
+    excess or shortage of buses).
+
+    The results can be used as the nested dictionary returned by
+    :meth:`om.results() <oemof.solph.optimization_model.OptimizationModel.results>`:
+    `results[s][t]` is a view (no copy) of the row of the key (s, t) and
+    `results[s].add_cap` is the value of an investment variable.
+
+    Parameters
+    ----------
+    index : list
+        Key (s, t) of every row of `array`: (s, t) for the flow from entity
+        s to entity t, (s, s) for a time series of object s and
+        (s, 'excess') or (s, 'shortage') for the slacks of bus s.
+    array : array like
+        The time series as 2-dimensional array, one row per key of `index`.
+    n_edges : int
+        Number of the leading rows holding flows.
+    objective : float
+        Value of the objective function.
+    attributes : dict
+        Attributes of the entities, e.g. {storage: {'add_cap': 10}}.
+    reduced_costs : array like
+        Reduced costs of the flows (n_edges x timesteps), stored as
+        :class:`Results` in the attribute `reduced_costs` (None if not
+        given).
+    directory : string
+        If given, the arrays of results derived from these results (e.g. by
+        :meth:`take`) are memory-mapped files in this directory (see
+        :func:`stack`). The files are deleted with the arrays (see
+        :func:`allocate`).
+    solver_status : dict
+        'status' and 'termination_condition' of the solver (as strings).
+
+    Attributes
+    ----------
+    rows : dict
+        Row of every key of `index`.
+    lazy : boolean
+        False: The mapping of every entity is built at once (see
+        :class:`LazyResults`).
+    """
+    lazy = False
+
+    def __init__(self, index, array, n_edges=0, objective=None,
+                 attributes=None, reduced_costs=None, directory=None,
+                 solver_status=None):
+        super().__init__()
+        self.index = list(index)
+        # a numpy.memmap stays mapped, no copy is made
+        self.array = np.asarray(array, dtype=float)
+        self.n_edges = n_edges
+        self.directory = directory
+        self.solver_status = solver_status
+        self.objective = objective
+        self.attributes = attributes or {}
+        self.rows = {key: k for k, key in enumerate(self.index)}
+        # rows of the targets of every source
+        self._targets = {}
+        for k, (s, t) in enumerate(self.index):
+            self._targets.setdefault(s, []).append((t, k))
+        for entity in self.attributes:
+            self._targets.setdefault(entity, [])
+        if not self.lazy:
+            for entity in self._targets:
+                self.data[entity] = self._series(entity)
+        self.reduced_costs = None
+        if reduced_costs is not None:
+            self.reduced_costs = type(self)(
+                self.index[:n_edges], reduced_costs, n_edges,
+                directory=directory)
+
+    @classmethod
+    def allocate(cls, index, n_timesteps, n_edges=0, reduced_costs=False,
+                 directory=None):
+        """Returns results of nan for `n_timesteps` timesteps, to be filled
+        with :meth:`put` (e.g. window by window).
+        """
+        rc = None
+        if reduced_costs:
+            rc = allocate((n_edges, n_timesteps), directory)
+        return cls(index, allocate((len(index), n_timesteps), directory),
+                   n_edges, attributes={}, reduced_costs=rc,
+                   directory=directory)
+
+    @property
+    def flows(self):
+        """The flows of all edges (view of the first `n_edges` rows)."""
+        return self.array[:self.n_edges]
+
+    @property
+    def edges(self):
+        """The edges (s, t) of the rows of :attr:`flows`."""
+        return self.index[:self.n_edges]
+
+    def take(self, positions):
+        """Returns new results with the timesteps at `positions` (e.g. a
+        range or the timesteps of typical periods repeated).
+        """
+        positions = np.asarray(positions, dtype=int)
+        reduced_costs = None
+        if self.reduced_costs is not None:
+            reduced_costs = _take(self.reduced_costs.array, positions,
+                                  self.directory)
+        return type(self)(self.index, _take(self.array, positions,
+                                            self.directory),
+                          self.n_edges, self.objective, self.attributes,
+                          reduced_costs, self.directory, self.solver_status)
+
+    def append(self, other):
+        """Returns new results with the timesteps of `other` appended. The
+        objective values are added, the attributes of `other` replace those
+        of these results.
+        """
+        n = self.array.shape[1]
+        m = other.array.shape[1]
+        results = type(self).allocate(
+            self.index, n + m, self.n_edges,
+            self.reduced_costs is not None and
+            other.reduced_costs is not None, self.directory)
+        results.put(0, self)
+        results.put(n, other)
+        return results
+
+    def put(self, position, other, n=None):
+        """Writes the first `n` timesteps of `other` (default: all) to the
+        timesteps from `position` on (in place). The rows are matched by
+        key, the objective values are added and the attributes of `other`
+        replace those of these results, as does the solver status of `other`
+        unless it terminated optimal and these results did not.
+        """
+        if n is None:
+            n = other.array.shape[1]
+        rows = [other.rows[key] for key in self.index]
+        self.array[:, position:position + n] = other.array[rows, :n]
+        if self.reduced_costs is not None and other.reduced_costs is not None:
+            self.reduced_costs.put(position, other.reduced_costs, n)
+        if self.objective is not None or other.objective is not None:
+            self.objective = (self.objective or 0) + (other.objective or 0)
+        if other.solver_status is not None and (
+                self.solver_status is None or
+                self.solver_status['termination_condition'] == 'optimal'):
+            self.solver_status = dict(other.solver_status)
+        self.attributes = {e: dict(a) for e, a in self.attributes.items()}
+        for entity, values in other.attributes.items():
+            self.attributes.setdefault(entity, {}).update(values)
+            self._targets.setdefault(entity, [])
+            if entity in self.data:
+                for name, value in values.items():
+                    setattr(self.data[entity], name, value)
+            elif not self.lazy:
+                self.data[entity] = self._series(entity)
+        return self
+
+    def _series(self, entity):
+        """Returns the mapping target -> row (view) of `entity` with the
+        attributes of `entity` set.
+        """
+        series = UD({t: self._row(k) for t, k in self._targets[entity]})
+        for name, value in self.attributes.get(entity, {}).items():
+            setattr(series, name, value)
+        return series
+
+    def _row(self, k):
+        return self.array[k]
+
+    def __reduce__(self):
+        # the views in the mapping are rebuilt instead of pickled as copies
+        return (type(self), (self.index, self.array, self.n_edges,
+                             self.objective, self.attributes,
+                             None if self.reduced_costs is None
+                             else self.reduced_costs.array, self.directory,
+                             self.solver_status))
+
+
+class LazyResults(Results):
+    r"""Results building the mapping `results[entity]` on first access.
+
+    No reference to the optimization model is held. If `positions` is
+    given, `array` is the raw solution vector (1-dimensional) and
+    `positions[k]` are the positions of the values of row k in it (-1:
+    the last value, nan, see :func:`solution_vector`): the series of an entity are sliced from the
+    vector when the entity is accessed first and then cached (as copies,
+    not views). The array of all rows is only gathered if :attr:`array` is
+    used, e.g. by :meth:`take` or a :class:`ResultsStore
+    <oemof.outputlib.to_store.ResultsStore>`.
+
+    Iterating over the results (or `len`, `in`) does not build any
+    mapping, `values()` and `items()` build the mappings of all entities.
+
+    See :class:`Results` for the other parameters.
+    """
+    lazy = True
+
+    def __init__(self, index, array, n_edges=0, objective=None,
+                 attributes=None, reduced_costs=None, directory=None,
+                 solver_status=None, positions=None):
+        self.positions = positions
+        super().__init__(index, array, n_edges, objective, attributes,
+                         reduced_costs, directory, solver_status)
+
+    @property
+    def array(self):
+        if self.positions is not None:
+            self._array = _gather(self.vector, self.positions,
+                                  self.directory)
+            self.vector = self.positions = None
+        return self._array
+
+    @array.setter
+    def array(self, array):
+        if self.positions is None:
+            self.vector, self._array = None, array
+        else:
+            self.vector, self._array = np.asarray(array, dtype=float), None
+
+    def _row(self, k):
+        if self.positions is None:
+            return self.array[k]
+        return self.vector[self.positions[k]]
+
+    def __missing__(self, entity):
+        if entity not in self._targets:
+            raise KeyError(entity)
+        self.data[entity] = self._series(entity)
+        return self.data[entity]
+
+    def __contains__(self, entity):
+        return entity in self._targets
+
+    def __iter__(self):
+        return iter(self._targets)
+
+    def __len__(self):
+        return len(self._targets)
+
+    def __reduce__(self):
+        if self.positions is None:
+            return super().__reduce__()
+        # the solution vector is pickled, not the gathered array
+        return (type(self), (self.index, self.vector, self.n_edges,
+                             self.objective, self.attributes,
+                             None if self.reduced_costs is None
+                             else self.reduced_costs.array, self.directory,
+                             self.solver_status, self.positions))
+
+
+def solution_vector(segments):
+    r"""Concatenates the segments of a solution to one vector.
+
+    Parameters
+    ----------
+    segments : list
+        Tuples (vector, positions): a vector of values and the positions of
+        the values of some rows in it (2-dimensional, -1 for missing
+        values). The same vector may be used by several segments.
+
+    Returns
+    -------
+    tuple (numpy.ndarray, numpy.ndarray)
+        The vector and the positions of the values of all rows in it,
+        missing values point to a trailing nan.
+    """
+    vectors, rows, offsets = [], [], {}
+    n = 0
+    for vector, positions in segments:
+        if id(vector) not in offsets:
+            offsets[id(vector)] = n
+            vectors.append(vector)
+            n += len(vector)
+        rows.append(np.where(positions < 0, -1,
+                             positions + offsets[id(vector)]))
+    vectors.append([np.nan])
+    return np.concatenate(vectors), np.vstack(rows)
+
+
+def allocate(shape, directory=None):
+    r"""Returns a float array of nan. If `directory` is given, the array is
+    a :class:`numpy.memmap` of a new file in this directory, i.e. it is
+    held on disk instead of in memory. The file is deleted at once on POSIX
+    systems (the mapping stays valid), else when the array is garbage
+    collected.
+
+    Parameters
+    ----------
+    shape : tuple
+    directory : string
+        Scratch directory of the memory-mapped files (created if missing).
+
+    Returns
+    -------
+    numpy.ndarray or numpy.memmap
+    """
+    if directory is None or 0 in shape:
+        return np.full(shape, np.nan)
+    os.makedirs(directory, exist_ok=True)
+    fd, filename = tempfile.mkstemp(suffix='.dat', prefix='results_',
+                                    dir=directory)
+    os.close(fd)
+    array = np.memmap(filename, dtype=float, mode='w+', shape=shape)
+    # the mapping stays valid without the file name, the space on disk is
+    # freed with the last reference to the array
+    if os.name == 'posix':
+        os.remove(filename)
+    else:
+        weakref.finalize(array, _remove, filename)
+    array[:] = np.nan
+    return array
+
+
+def _remove(filename):
+    try:
+        os.remove(filename)
+    except OSError:
+        logging.warning("Could not remove {0}".format(filename))
+
+
+def stack(blocks, directory=None):
+    r"""Stacks 2-dimensional blocks of rows (see :func:`numpy.vstack`). If
+    `directory` is given, the blocks are written one after another into a
+    memory-mapped file (see :func:`allocate`).
+    """
+    if directory is None:
+        return np.vstack(blocks)
+    array = allocate((sum(len(b) for b in blocks), blocks[0].shape[1]),
+                     directory)
+    k = 0
+    for block in blocks:
+        array[k:k + len(block)] = block
+        k += len(block)
+    return array
+
+
+def _take(array, positions, directory, chunk=256):
+    """Columns at `positions` of all rows, copied in chunks of rows into a
+    memory-mapped file if `directory` is given.
+    """
+    if directory is None:
+        return array[:, positions]
+    taken = allocate((len(array), len(positions)), directory)
+    for k in range(0, len(array), chunk):
+        taken[k:k + chunk] = array[k:k + chunk, positions]
+    return taken
+
+
+def _gather(vector, positions, directory, chunk=256):
+    """Values of `vector` at `positions` (2-dimensional), copied in chunks
+    of rows into a memory-mapped file if `directory` is given.
+    """
+    if directory is None:
+        return vector[positions]
+    gathered = allocate(positions.shape, directory)
+    for k in range(0, len(positions), chunk):
+        gathered[k:k + chunk] = vector[positions[k:k + chunk]]
+    return gathered
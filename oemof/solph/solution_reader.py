@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Native reader for the solution files of glpk and cbc.
+
+A problem file written by :func:`write_problem
+<oemof.solph.problem_writer.write_problem>` is handed to the solver
+executable directly and the solution file is parsed into arrays aligned
+with the columns and rows of the problem file. Pyomo's result objects and
+symbol maps are not used.
+
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+
+
+class Solution:
+    r"""Solution of a problem file as arrays in the order of its columns
+    (variables) and rows (constraints).
+
+    Parameters
+    ----------
+    problem : :class:`ProblemFile <oemof.solph.problem_writer.ProblemFile>`
+    values : numpy.ndarray
+        Value of every column.
+    objective : float
+    status : string
+        'ok', 'warning' or 'error'
+    termination_condition : string
+        E.g. 'optimal', 'infeasible', 'unbounded' or 'other'.
+    reduced_costs : numpy.ndarray
+        Reduced cost of every column (None if not read).
+    duals : numpy.ndarray
+        Dual value of every row (None if not read).
+    """
+    def __init__(self, problem, values, objective, status='ok',
+                 termination_condition='optimal', reduced_costs=None,
+                 duals=None):
+        self.problem = problem
+        self.values = values
+        self.objective = objective
+        self.status = status
+        self.termination_condition = termination_condition
+        self.reduced_costs = reduced_costs
+        self.duals = duals
+        self._columns = None
+        self._rows = None
+
+    def load(self):
+        """Sets the values of the variables of the problem."""
+        for var, value in zip(self.problem.variables, self.values.tolist()):
+            var.value = value
+
+    def value(self, var):
+        """Value of a variable (the value of the variable if it is fixed)."""
+        k = self._column(var)
+        return var.value if k is None else self.values[k]
+
+    def reduced_cost(self, var):
+        """Reduced cost of a variable (None for fixed variables)."""
+        k = self._column(var)
+        return None if k is None else self.reduced_costs[k]
+
+    def dual(self, con):
+        """Dual value of a constraint (the sum over both rows of a ranged
+        constraint, None for constraints not written).
+        """
+        if self._rows is None:
+            self._rows = {}
+            for k, c in enumerate(self.problem.constraints):
+                self._rows.setdefault(id(c), []).append(k)
+        rows = self._rows.get(id(con))
+        return None if rows is None else self.duals[rows].sum()
+
+    def _column(self, var):
+        if self._columns is None:
+            self._columns = {id(v): k
+                             for k, v in enumerate(self.problem.variables)}
+        return self._columns.get(id(var))
+
+
+def solve(problem, solver='glpk', duals=False, options=None,
+          executable=None, verbose=False):
+    r"""Solves a problem file with the glpk or cbc executable and reads the
+    solution file.
+
+    Parameters
+    ----------
+    problem : :class:`ProblemFile <oemof.solph.problem_writer.ProblemFile>`
+    solver : string
+        'glpk' or 'cbc'
+    duals : boolean
+        If True, duals and reduced costs are read as well.
+    options : dict
+        Command line options of the solver, e.g. {'mipgap': 0.01} results in
+        '--mipgap 0.01' (glpk) or '-mipgap 0.01' (cbc).
+    executable : string
+        Path of the executable (default: 'glpsol' or 'cbc').
+    verbose : boolean
+        If True, the output of the solver is logged.
+
+    Returns
+    -------
+    :class:`Solution`
+    """
+    if solver not in ('glpk', 'cbc'):
+        raise ValueError("The oemof solution reader supports glpk and cbc " +
+                         "only, not {0}.".format(solver))
+    options = options or {}
+    tmpdir = tempfile.mkdtemp(prefix='oemof_')
+    solution_file = os.path.join(tmpdir, 'solution.sol')
+    try:
+        if solver == 'glpk':
+            command = [executable or 'glpsol',
+                       '--lp' if problem.file_format == 'lp' else '--freemps',
+                       problem.filename, '--write', solution_file]
+            for key, value in options.items():
+                command.append('--' + key)
+                if str(value).strip():
+                    command.append(str(value))
+        else:
+            command = [executable or 'cbc', problem.filename]
+            for key, value in options.items():
+                command.append('-' + key)
+                if str(value).strip():
+                    command.append(str(value))
+            command.extend(['-solve', '-printingOptions', 'all',
+                            '-solution', solution_file])
+        logging.info("Solving {0}".format(" ".join(command)))
+        process = subprocess.run(command, stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT,
+                                 universal_newlines=True)
+        if verbose:
+            logging.info(process.stdout)
+        if not os.path.isfile(solution_file):
+            raise RuntimeError("{0} wrote no solution file:\n{1}".format(
+                solver, process.stdout))
+        if solver == 'glpk':
+            return read_glpk(problem, solution_file, duals)
+        return read_cbc(problem, solution_file, duals)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def read_glpk(problem, filename, duals=False):
+    r"""Reads a solution file written by `glpsol --write` (the plain text
+    format of glpk 4.57 or newer as well as the raw format of older
+    versions).
+
+    Glpk numbers the columns in the order of their first appearance in the
+    problem file, i.e. in the order of the column labels except for the
+    column of the objective constant (see `constant_column` of
+    :class:`ProblemFile <oemof.solph.problem_writer.ProblemFile>`).
+
+    Returns
+    -------
+    :class:`Solution`
+    """
+    with open(filename) as f:
+        lines = [l.split() for l in f if l.strip() and l[0] != 'c']
+    if lines[0][0] == 's':
+        # s bas|mip m n ... (glpk >= 4.57)
+        kind, objective = lines[0][1], float(lines[0][-1])
+        if kind == 'mip':
+            condition = {'o': 'optimal', 'f': 'feasible',
+                         'n': 'infeasible'}.get(lines[0][4], 'other')
+        else:
+            condition = ('optimal' if lines[0][4:6] == ['f', 'f'] else
+                         {'n': 'infeasible', 'i': 'infeasible'}.get(
+                             lines[0][4], 'unbounded' if lines[0][5] == 'n'
+                             else 'other'))
+        rows = [l[2:] for l in lines if l[0] == 'i']
+        cols = [l[2:] for l in lines if l[0] == 'j']
+        if kind == 'bas':
+            # status, primal and dual value
+            rows = [l[1:] for l in rows]
+            cols = [l[1:] for l in cols]
+    else:
+        # m n / status(es) objective / rows / columns (glpk < 4.57)
+        m, n = int(lines[0][0]), int(lines[0][1])
+        kind = 'mip' if len(lines[1]) == 2 else 'bas'
+        objective = float(lines[1][-1])
+        # GLP_OPT = 5, GLP_FEAS = 2, GLP_NOFEAS = 4, GLP_UNBND = 6
+        condition = {5: 'optimal', 2: 'feasible', 4: 'infeasible',
+                     6: 'unbounded'}.get(int(lines[1][0]), 'other')
+        if kind == 'bas' and condition == 'feasible':
+            condition = {'2': 'optimal', '4': 'unbounded'}.get(lines[1][1],
+                                                              'other')
+        rows = [l[-2:] if kind == 'bas' else l for l in lines[2:2 + m]]
+        cols = [l[-2:] if kind == 'bas' else l
+                for l in lines[2 + m:2 + m + n]]
+    # glpk keeps the objective row of an mps file as first row
+    rows = rows[len(rows) - len(problem.constraints):]
+    values = np.array([c[0] for c in cols], dtype=float)
+    reduced_costs = row_duals = None
+    if duals and kind == 'bas':
+        reduced_costs = np.array([c[1] for c in cols], dtype=float)
+        row_duals = np.array([r[1] for r in rows], dtype=float)
+    return Solution(problem, _columns(problem, values), objective,
+                    'ok' if condition in ('optimal', 'feasible') else
+                    'warning', condition,
+                    None if reduced_costs is None
+                    else _columns(problem, reduced_costs), row_duals)
+
+
+def read_cbc(problem, filename, duals=False):
+    r"""Reads a solution file written by `cbc -printingOptions all
+    -solution`. Rows and columns are identified by their labels ('c1',
+    'x1', ...).
+
+    Returns
+    -------
+    :class:`Solution`
+    """
+    values = np.zeros(len(problem.variables))
+    reduced_costs = np.zeros(len(problem.variables))
+    row_duals = np.zeros(len(problem.constraints))
+    with open(filename) as f:
+        header = f.readline()
+        for line in f:
+            tokens = line.split()
+            if tokens and tokens[0] == '**':
+                tokens = tokens[1:]
+            if len(tokens) < 4:
+                continue
+            label = tokens[1]
+            if label[0] == 'x' and label[1:].isdigit():
+                k = int(label[1:]) - 1
+                values[k] = float(tokens[2])
+                reduced_costs[k] = float(tokens[3])
+            elif label[0] == 'c' and label[1:].isdigit():
+                row_duals[int(label[1:]) - 1] = float(tokens[3])
+    status = header.split(' - ')[0].strip().lower()
+    condition = {'optimal': 'optimal', 'infeasible': 'infeasible',
+                 'integer infeasible': 'infeasible',
+                 'unbounded': 'unbounded'}.get(status, 'other')
+    objective = float(header.split()[-1]) if 'objective value' in header \
+        else np.nan
+    return Solution(problem, values, objective,
+                    'ok' if condition == 'optimal' else 'warning', condition,
+                    reduced_costs if duals else None,
+                    row_duals if duals else None)
+
+
+def _columns(problem, values):
+    """Drops the column of the objective constant from the glpk order."""
+    if problem.constant_column is None:
+        return values
+    return np.delete(values, problem.constant_column)
@@ -10,6 +10,8 @@ import pyomo.environ as po
 import numpy as np
 import logging
 
+from . import pyomo_fastbuild as pofast
+
 
 def add_binary(model, block, relaxed=False):
     """ Creates all status variables (binary) for `block.objs`
@@ -119,7 +121,7 @@ def set_bounds(model, block, side='output'):
     exist_ub_out = False
     for e in block.objs:
         if side == 'output':
-            output_uids = [o.uid for o in e.outputs[:]]
+            output_uids = model.graph.outputs(e.uid)
             # ** Time depended bound
             if e.ub_out:
                 ub_out[e.uid] = dict(zip(output_uids, e.ub_out))
@@ -137,11 +139,38 @@ def set_bounds(model, block, side='output'):
                     output_uids,
                     [[x] * len(model.timesteps) for x in e.out_max]))
         if side == 'input':
-            input_uids = [i.uid for i in e.inputs[:]]
+            input_uids = model.graph.inputs(e.uid)
             ub_in[e.uid] = dict(zip(input_uids, e.in_max))
 
+    fast_build = model.energysystem.simulation.fast_build
+    uids = [obj.uid for obj in block.objs]
+
     # *** No investment - set upper bound to maximal output***
-    if not block.optimization_options.get('investment', False):
+    # (an empty block has no bounds, the arrays of its edges can not be
+    # reshaped)
+    if (not block.optimization_options.get('investment', False) and
+            fast_build and uids):
+        if side == 'output':
+            values = np.array([pofast.sequence(ub_out[e][o], model.timesteps)
+                               for e in uids for o in ub_out[e]])
+            pofast.set_bounds(
+                pofast.edge_id_variables(model, _bounded_edges(
+                    model, block, 'output', [len(ub_out[e]) for e in uids])),
+                upper=values.reshape(-1, len(model.timesteps)))
+        if side == 'input':
+            for e in uids:
+                for i in model.graph.inputs(e):
+                    if i not in ub_in[e]:
+                        logging.warning("No upper bound for input (%s,%s)",
+                                        i, e)
+            values = np.array([ub_in[e][i] for e in uids for i in ub_in[e]],
+                              dtype=float)
+            pofast.set_bounds(
+                pofast.edge_id_variables(model, _bounded_edges(
+                    model, block, 'input', [len(ub_in[e]) for e in uids])),
+                upper=values[:, None])
+
+    elif not block.optimization_options.get('investment', False):
         # edges for simple transformers ([('coal', 'pp_coal'),...])
         ee = model.edges(block.objs)
         for (e1, e2) in ee:
@@ -180,7 +209,27 @@ def set_bounds(model, block, side='output'):
                     1 + block.add_out[e] / out_max[e][model.O[e][0]])
                 return(lhs <= rhs)
 
-            if exist_ub_out:
+            if fast_build:
+                rows = pofast.timestep_rows(uids, model.timesteps)
+                ub = np.array([pofast.sequence(ub_out[e][model.O[e][0]],
+                                               model.timesteps)
+                               for e in uids]).reshape(rows.shape)
+                if exist_ub_out:
+                    # w <= ub * (1 + add_out / out_max)
+                    coeff = ub / np.array([out_max[e][model.O[e][0]]
+                                           for e in uids])[:, None]
+                else:
+                    # w <= ub + add_out
+                    coeff = 1
+                terms = [(rows, 1,
+                          pofast.outflow_variables(model, block, 0)),
+                         (rows, -coeff, pofast.variable_array(
+                             block.add_out, uids)[:, None])]
+                pofast.sparse_constraint(
+                    block, 'output_bound',
+                    pofast.timestep_index(uids, model.timesteps), terms,
+                    "<=", ub.ravel(), block.indexset)
+            elif exist_ub_out:
                 block.output_bound = po.Constraint(
                         block.indexset,
                         rule=add_output_rule_time_depended_bound)
@@ -194,6 +243,17 @@ def set_bounds(model, block, side='output'):
                              ' not possible for investment models')
 
 
+def _bounded_edges(model, block, side, counts):
+    """Ids of the first `counts[k]` inputs or outputs of the k-th component
+    of `block`, component by component (the edges with bounds, see
+    :func:`set_bounds`).
+    """
+    edges = pofast.block_edges(model, block, side)
+    bounded = (np.arange(edges.shape[1])[None, :] <
+               np.array(counts, dtype=int)[:, None])
+    return edges[bounded]
+
+
 def set_storage_cap_bounds(model, block):
     """ Alters/sets upper and lower bounds for variables that represent the
     absolut state of charge e.g. filling level of a storage component.
@@ -235,7 +295,20 @@ def set_storage_cap_bounds(model, block):
     cap_max = {obj.uid: obj.cap_max for obj in block.objs}
     cap_min = {obj.uid: obj.cap_min for obj in block.objs}
 
-    if not block.optimization_options.get('investment', False):
+    if model.periods is not None:
+        _set_storage_period_bounds(model, block, cap_max, cap_min)
+        return
+
+    fast_build = model.energysystem.simulation.fast_build
+    uids = [obj.uid for obj in block.objs]
+
+    if (not block.optimization_options.get('investment', False) and
+            fast_build):
+        cap = pofast.block_variables(block.cap, uids, model.timesteps)
+        pofast.set_bounds(
+            cap, upper=np.array([cap_max[e] for e in uids])[:, None],
+            lower=np.array([cap_min[e] for e in uids])[:, None])
+    elif not block.optimization_options.get('investment', False):
         # loop over all uids (storages) and timesteps to set the upper bound
         for e in block.uids:
             for t in model.timesteps:
@@ -248,6 +321,19 @@ def set_storage_cap_bounds(model, block):
         for e in block.uids:
             block.add_cap[e].setub(add_cap_limit[e])
 
+        if fast_build:
+            rows = pofast.timestep_rows(uids, model.timesteps)
+            terms = [(rows, 1, pofast.block_variables(block.cap, uids,
+                                                      model.timesteps)),
+                     (rows, -1, pofast.variable_array(block.add_cap,
+                                                      uids)[:, None])]
+            pofast.sparse_constraint(
+                block, 'cap_bound',
+                pofast.timestep_index(uids, model.timesteps), terms, "<=",
+                np.array([cap_max[e] for e in uids], dtype=float).repeat(
+                    len(model.timesteps)), block.indexset)
+            return
+
         # constraint for additional capacity in investment models
         def add_cap_rule(block, e, t):
             lhs = block.cap[e, t]
@@ -257,6 +343,68 @@ def set_storage_cap_bounds(model, block):
                                         rule=add_cap_rule)
 
 
+def _set_storage_period_bounds(model, block, cap_max, cap_min):
+    """ Storage level bounds for timesteps made of typical periods (see
+    :func:`add_storage_balance
+    <oemof.solph.linear_constraints.add_storage_balance>`).
+
+    The maximum and minimum of the relative level inside of every typical
+    period k are added to the level at the beginning of all periods p
+    represented by k:
+
+    .. math:: \\underline{L}_e \\leq l^{inter}_e(p) + \\underline{l}_e(k(p)),
+    \\quad l^{inter}_e(p) + \\overline{l}_e(k(p)) \\leq \\overline{L}_e, \
+    \\qquad \\forall e, \\forall p
+
+    The losses inside of a period are neglected for these bounds. For
+    investment models the additional capacity is added to
+    :math:`\\overline{L}_e`.
+    """
+    periods = model.periods
+    n = periods.period_length
+    position = {t: k for k, t in enumerate(model.timesteps)}
+    investment = block.optimization_options.get('investment', False)
+    if investment:
+        add_cap_limit = {obj.uid: obj.add_cap_limit for obj in block.objs}
+        for e in block.uids:
+            block.add_cap[e].setub(add_cap_limit[e])
+
+    n_typical = len(periods.weights)
+    if block.component('cap_intra_max') is None:
+        block.cap_intra_max = po.Var(block.uids, range(n_typical))
+        block.cap_intra_min = po.Var(block.uids, range(n_typical))
+
+    def intra_max_rule(block, e, t):
+        k = position[t] // n
+        return(block.cap[e, t] <= block.cap_intra_max[e, k])
+    block.cap_intra_max_bound = po.Constraint(block.indexset,
+                                              rule=intra_max_rule)
+
+    def intra_min_rule(block, e, t):
+        k = position[t] // n
+        return(block.cap[e, t] >= block.cap_intra_min[e, k])
+    block.cap_intra_min_bound = po.Constraint(block.indexset,
+                                              rule=intra_min_rule)
+
+    def max_rule(block, e, p):
+        k = periods.order[p]
+        lhs = block.cap_inter[e, p] + block.cap_intra_max[e, k]
+        rhs = cap_max[e]
+        if investment:
+            rhs += block.add_cap[e]
+        return(lhs <= rhs)
+    block.cap_bound = po.Constraint(block.uids, range(len(periods.order)),
+                                    rule=max_rule)
+
+    def min_rule(block, e, p):
+        k = periods.order[p]
+        lhs = block.cap_inter[e, p] + block.cap_intra_min[e, k]
+        return(lhs >= (cap_min[e] or 0))
+    block.cap_bound_min = po.Constraint(block.uids,
+                                        range(len(periods.order)),
+                                        rule=min_rule)
+
+
 def set_outages(model, block, outagetype='period', side='output'):
     """ Fixes component input/output to zeros for modeling outages.
 
@@ -331,6 +479,15 @@ def set_fixed_sink_value(model, block):
     """
 
     val = {obj.uid: obj.val for obj in block.objs}
+    if model.energysystem.simulation.fast_build:
+        inputs = pofast.block_edges(model, block, 'input')
+        # all inputs of the sinks, sink by sink
+        rows = np.nonzero(inputs >= 0)[0]
+        values = pofast.sequences(val, [obj.uid for obj in block.objs],
+                                  model.timesteps)[rows]
+        pofast.fix_values(pofast.edge_id_variables(model, inputs[inputs >= 0]),
+                          values)
+        return
     ee = model.edges(block.objs)
     for (e1, e2) in ee:
         for t in model.timesteps:
@@ -3,6 +3,10 @@
 
 @author: Simon Hilpert simon.hilpert@fh-flensburg.de
 """
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 import logging
 from ..core.network.entities import Bus
@@ -12,18 +16,33 @@ from ..core.network.entities.components import transformers as transformer
 from ..core.network.entities.components import transports as transport
 
 
+def _buses(busses, *uids):
+    r"""Returns the buses with the uids `uids` (missing uids are skipped).
+
+    Parameters
+    ----------
+    busses : dict or list
+        Existing busses by uid (constant time lookup) or list of existing
+        busses (scanned).
+    """
+    if not isinstance(busses, Mapping):
+        busses = {b.uid: b for b in busses}
+    return [busses[uid] for uid in dict.fromkeys(uids) if uid in busses]
+
+
 def add_bus(row, **kwargs):
-    r""" Adds bus object ot list of busses. The function is used
-    by apply() method of pandas data frames.
+    r""" Adds bus object ot list of busses. The function is called for
+    every row of the bus file by :func:`entities_from_csv`.
 
     Parameters
     ----------
-    row : row of pandas.DataFrame()
+    row : dict
+        row of the csv file (column name: value)
     busses : list
         list of existing busses
-    busprices : pandas.DataFrame()
-       data frame containting the values for the busprices. Column index is
-       the uid of bus to create.
+    busprices : dict
+       price time series by uid of the bus (numpy views of the columns of
+       the bus price file)
     """
     busprices = kwargs.get('busprices', None)
     busses = kwargs.get('busses', [])
@@ -50,19 +69,20 @@ def add_bus(row, **kwargs):
 
 
 def add_source(row, **kwargs):
-    r""" Adds source object ot list of source. The function is used
-    by apply() method of pandas data frames.
+    r""" Adds source object ot list of source. The function is called for
+    every row of the source file by :func:`entities_from_csv`.
 
     Parameters
     ----------
-    row : row of pandas.DataFrame()
-    busses : list
-        list of existing busses
-    sink : list
+    row : dict
+        row of the csv file (column name: value)
+    busses : dict or list
+        existing busses by uid or list of existing busses
+    sources : list
         list of sources where object are appended
-    sourcevalues : pandas.DataFrame()
-       data frame containting the values for the source column index is uid of
-       source to create.
+    sourcevalues : dict
+       time series by uid of the source (numpy views of the columns of the
+       source value file)
     """
     sourcevalues = kwargs.get('sourcevalues', None)
     busses = kwargs.get('busses', None)
@@ -77,7 +97,7 @@ def add_source(row, **kwargs):
 
     # set special kwargs (conversion to list etc. )
     kwargs['out_max'] = [row.get('out_max', None)]
-    kwargs['outputs'] = [b for b in busses if b.uid == row['output']]
+    kwargs['outputs'] = _buses(busses, row['output'])
     kwargs['val'] = sourcevalues[row['uid']]
 
     obj = cls(**kwargs)
@@ -85,19 +105,20 @@ def add_source(row, **kwargs):
 
 
 def add_sink(row, **kwargs):
-    r""" Adds sink object ot list of transformers. The function is used
-    by apply() method of pandas data frames.
+    r""" Adds sink object ot list of sinks. The function is called for
+    every row of the sink file by :func:`entities_from_csv`.
 
     Parameters
     ----------
-    row : row of pandas.DataFrame()
-    busses : list
-        list of existing busses
-    sink : list
+    row : dict
+        row of the csv file (column name: value)
+    busses : dict or list
+        existing busses by uid or list of existing busses
+    sinks : list
         list of sinks where object are appended
-    sinkvalues : pandas.DataFrame()
-       data frame containting the values for the sink column index is uid of
-       sink
+    sinkvalues : dict
+       time series by uid of the sink (numpy views of the columns of the
+       sink value file)
     """
     sinkvalues = kwargs.get('sinkvalues', None)
     busses = kwargs.get('busses', None)
@@ -106,7 +127,7 @@ def add_sink(row, **kwargs):
     cls = getattr(sink, row['class'])
 
     # set special kwargs (conversion to list etc. )
-    inputs = [b for b in busses if b.uid == row['input']]
+    inputs = _buses(busses, row['input'])
 
     # instantiate sink object
     obj = cls(uid=row['uid'],
@@ -116,14 +137,15 @@ def add_sink(row, **kwargs):
 
 
 def add_transformer(row, **kwargs):
-    r""" Adds transformer objects ot list of transformers. The function is used
-    by apply() method of pandas data frames.
+    r""" Adds transformer objects ot list of transformers. The function is
+    called for every row of the transformer file by :func:`entities_from_csv`.
 
     Parameters
     ----------
-    row : row of pandas.DataFrame()
-    busses : list
-        list of existing busses
+    row : dict
+        row of the csv file (column name: value)
+    busses : dict or list
+        existing busses by uid or list of existing busses
     transformers : list
         list of transformers where object are appended
     """
@@ -142,8 +164,8 @@ def add_transformer(row, **kwargs):
         kwargs['eta'] = [row['eta']]
         kwargs['out_max'] = [row['out_max']]
         kwargs['output_price'] = [row.get('output_price')]
-        kwargs['outputs'] = [bus for bus in busses if bus.uid == row["output"]]
-        kwargs['inputs'] = [b for b in busses if b.uid == row['input']]
+        kwargs['outputs'] = _buses(busses, row["output"])
+        kwargs['inputs'] = _buses(busses, row['input'])
         opex_var = kwargs['inputs'][0].price / kwargs['eta'][0]
         kwargs['opex_var'] = opex_var
         kwargs['out_min'] = [row['out_max']*row.get('out_min', 0)]
@@ -154,14 +176,15 @@ def add_transformer(row, **kwargs):
 
 
 def add_storage(row, **kwargs):
-    r""" Adds storage objects ot list of storages. The function is used by
-    apply() method of pandas data frames.
+    r""" Adds storage objects ot list of storages. The function is called for
+    every row of the storage file by :func:`entities_from_csv`.
 
     Parameters
     ----------
-    row : row of pandas.DataFrame()
-    busses : list
-        list of existing busses
+    row : dict
+        row of the csv file (column name: value)
+    busses : dict or list
+        existing busses by uid or list of existing busses
     transformers : list
         list of transformers where object are appended
     """
@@ -177,8 +200,8 @@ def add_storage(row, **kwargs):
         # set special kwargs (conversion to list etc. )
         kwargs['out_max'] = [row.get('out_max')]
         kwargs['in_max'] = [row.get('in_max')]
-        kwargs['outputs'] = [bus for bus in busses if bus.uid == row["output"]]
-        kwargs['inputs'] = [b for b in busses if b.uid == row['input']]
+        kwargs['outputs'] = _buses(busses, row["output"])
+        kwargs['inputs'] = _buses(busses, row['input'])
 
         # instantiate storage object from class
         obj = cls(**kwargs)
@@ -186,14 +209,15 @@ def add_storage(row, **kwargs):
 
 
 def add_chp(row, **kwargs):
-    r""" Adds chps objects ot list of transformers. The function is used by
-    apply() method of pandas data frames.
+    r""" Adds chps objects ot list of transformers. The function is called for
+    every row of the chp file by :func:`entities_from_csv`.
 
     Parameters
     ----------
-    row : row of pandas.DataFrame()
-    busses : list
-        list of existing busses
+    row : dict
+        row of the csv file (column name: value)
+    busses : dict or list
+        existing busses by uid or list of existing busses
     transformers : list
         list of transformers where object are appended
     """
@@ -208,10 +232,9 @@ def add_chp(row, **kwargs):
             kwargs.update({k: row[k]})
 
         # special kwargs where transformation of type is necessary (e.g. list)
-        kwargs['inputs'] = [b for b in busses if b.uid == row['input']]
-        kwargs['outputs'] = [bus for bus in busses if
-                             any([bus.uid == row["output_el"],
-                                  bus.uid == row["output_th"]])]
+        kwargs['inputs'] = _buses(busses, row['input'])
+        kwargs['outputs'] = _buses(busses, row["output_el"],
+                                     row["output_th"])
         kwargs['out_max'] = [row['out_max_el'], row.get('out_max_th', None)]
         kwargs['out_min'] = [row['out_min']]
         kwargs['eta_min'] = [row['eta_el_min'], row.get('eta_th_min', None)]
@@ -224,9 +247,17 @@ def add_chp(row, **kwargs):
 
 
 def add_transport(row, **kwargs):
-    r""" Adds transpport objects ot list of transports. The function is used by
-    apply() method of pandas data frames.
+    r""" Adds transpport objects ot list of transports. The function is
+    called for every row of the transport file by :func:`entities_from_csv`.
 
+    Parameters
+    ----------
+    row : dict
+        row of the csv file (column name: value)
+    busses : dict or list
+        existing busses by uid or list of existing busses
+    transports : list
+        list of transports where object are appended
     """
     if not row['skip']:
         busses = kwargs.get('busses', None)
@@ -241,17 +272,58 @@ def add_transport(row, **kwargs):
         kwargs['eta'] = [row['eta']]
         kwargs['out_max'] = [row['out_max']]
         kwargs['in_max'] = [row.get('in_max')]
-        kwargs['inputs'] = [b for b in busses if b.uid == row['input']]
+        kwargs['inputs'] = _buses(busses, row['input'])
 
-        kwargs['outputs'] = [b for b in busses if b.uid == row['output']]
+        kwargs['outputs'] = _buses(busses, row['output'])
 
         # instantiate object with kwargs
         obj = cls(**kwargs)
         transports.append(obj)
 
 
-def entities_from_csv(files, entities_dict=None):
-    r""" Creates 'oemof-objects' from csv files by the use of pandas dataframes
+# columns referring to entities (or classes) are read as strings
+_REFERENCES = ['uid', 'class', 'type', 'input', 'output', 'output_el',
+               'output_th']
+# files of the components in the order of the creation of the entities
+# (table, function adding an entity, list of entities_dict)
+_TABLES = [('transformers', add_transformer, 'transformers'),
+           ('transports', add_transport, 'transports'),
+           ('storages', add_storage, 'transformers'),
+           ('sources', add_source, 'sources'),
+           ('sinks', add_sink, 'sinks'),
+           ('chps', add_chp, 'transformers')]
+# files of the time series: one column per entity
+_TIME_SERIES = ['busprices', 'sourcevalues', 'sinkvalues']
+
+
+def _read_csv(file, time_series=False):
+    """Reads a csv file with explicit dtypes (float64 for time series)."""
+    if time_series:
+        return pd.read_csv(file, dtype=np.float64)
+    return pd.read_csv(file, dtype={c: str for c in _REFERENCES})
+
+
+def _columns(df):
+    """Columns of a time series data frame as views of one float array."""
+    values = np.asfortranarray(df.to_numpy(dtype=np.float64))
+    return {column: values[:, k] for k, column in enumerate(df.columns)}
+
+
+def _records(frames, key):
+    """Rows of the table `key` as dicts (no rows if it was not read)."""
+    if key not in frames:
+        return []
+    return frames[key].to_dict('records')
+
+
+def entities_from_csv(files, entities_dict=None, max_workers=None):
+    r""" Creates 'oemof-objects' from csv files (read with pandas)
+
+    All files are read in parallel threads, the time series with dtype
+    float64. Every time series file is converted to one array and the
+    entities get views of its columns (e.g. `val` of sinks and sources, the
+    price of busses) instead of copies. The busses of the components are
+    looked up by uid.
 
     Parameters
     ----------
@@ -261,6 +333,9 @@ def entities_from_csv(files, entities_dict=None):
         'sinks', 'sinkvalues', 'busprices'
     entities_dict : dict
         dictionary containing lists of oemof base class objects
+    max_workers : int
+        Maximal number of threads reading the files (default of
+        :class:`concurrent.futures.ThreadPoolExecutor` if None).
     """
     if entities_dict is None:
         entities_dict = {'busses': [],
@@ -268,64 +343,33 @@ def entities_from_csv(files, entities_dict=None):
                          'sinks': [],
                          'sources': [],
                          'transports': []}
-    # first create busses
-    file = files.get('busses')
-    if file is not None:
-        bus_df = pd.read_csv(file)
-        file = files.get('busprices')
-        if file is not None:
-            busprices = pd.read_csv(file)
-        else:
-            logging.info('No csv data for bus prices!')
-            busprices = pd.DataFrame()
-        bus_df.apply(add_bus, axis=1, busprices=busprices,
-                     busses=entities_dict['busses'])
-    # transformers
-    file = files.get('transformers')
-    if file is not None:
-        df = pd.read_csv(file)
-        df.apply(add_transformer, axis=1, busses=entities_dict['busses'],
-                 transformers=entities_dict['transformers'])
-
-    file = files.get('transports')
-    if file is not None:
-        df = pd.read_csv(file)
-        df.apply(add_transport, axis=1, busses=entities_dict['busses'],
-                 transports=entities_dict['transports'])
-
-    file = files.get('storages')
-    if file is not None:
-        df = pd.read_csv(file)
-        df.apply(add_storage, axis=1, busses=entities_dict['busses'],
-                 transformers=entities_dict['transformers'])
-
-    file = files.get('sources')
-    if file is not None:
-        df = pd.read_csv(file)
-        values_csv = files.get('sourcevalues')
-        if values_csv is not None:
-            sourcevalues = pd.read_csv(values_csv)
-        else:
-            raise ValueError('No csv data found for source values!')
-        df.apply(add_source, axis=1, busses=entities_dict['busses'],
-                 sources=entities_dict['sources'], sourcevalues=sourcevalues)
-
-    file = files.get('sinks')
-    if file is not None:
-        df = pd.read_csv(file)
-        values_csv = files.get('sinkvalues')
-        if values_csv is not None:
-            sinkvalues = pd.read_csv(values_csv)
-        else:
-            raise ValueError('No csv data found for sink values!')
-        df.apply(add_sink, axis=1, busses=entities_dict['busses'],
-                 sinks=entities_dict['sinks'], sinkvalues=sinkvalues)
-
-    file = files.get('chps', None)
-    if file is not None:
-        chp_df = pd.read_csv(file)
-        chp_df.apply(add_chp, axis=1, busses=entities_dict['busses'],
-                     transformers=entities_dict['transformers'])
+    if files.get('sources') is not None and files.get('sourcevalues') is None:
+        raise ValueError('No csv data found for source values!')
+    if files.get('sinks') is not None and files.get('sinkvalues') is None:
+        raise ValueError('No csv data found for sink values!')
+    if files.get('busses') is not None and files.get('busprices') is None:
+        logging.info('No csv data for bus prices!')
+
+    keys = ['busses'] + [key for key, add, target in _TABLES] + _TIME_SERIES
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {key: executor.submit(_read_csv, files[key],
+                                        key in _TIME_SERIES)
+                   for key in keys if files.get(key) is not None}
+        frames = {key: future.result() for key, future in futures.items()}
+    values = {key: _columns(frames[key]) if key in frames else {}
+              for key in _TIME_SERIES}
+
+    for row in _records(frames, 'busses'):
+        add_bus(row, busses=entities_dict['busses'],
+                busprices=values['busprices'])
+    # look up the busses of the components by uid
+    busses = {b.uid: b for b in entities_dict['busses']}
+    for key, add, target in _TABLES:
+        kwargs = {target: entities_dict[target], 'busses': busses,
+                  'sourcevalues': values['sourcevalues'],
+                  'sinkvalues': values['sinkvalues']}
+        for row in _records(frames, key):
+            add(row, **kwargs)
 
     entities = sum([entities_dict[k] for k in entities_dict.keys()], [])
     entities_dict['entities'] = entities
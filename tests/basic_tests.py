@@ -1,17 +1,166 @@
 from nose.tools import ok_, eq_
+from nose.plugins.skip import SkipTest
 
+import ast
+import csv
+import filecmp
+import gc
+import json
+import numpy as np
 import pandas as pd
 import logging
-import filecmp
+import os
+import pickle
+import tempfile
 import os.path as ospath
+from pyomo.opt import SolverFactory
 
 from oemof.core.network.entities.components import transformers as transformer
 from oemof.solph import predefined_objectives as predefined_objectives
 from oemof.core import energy_system as es
-from oemof.core.network import Entity
-from oemof.core.network.entities import Bus
+from oemof.core.network import Entity, Entities
+from oemof.core.network.entities import Bus, Component
 from oemof.solph import optimization_model as om
+from oemof.solph import matrix_model as mm
+from oemof.solph import aggregation
+from oemof.solph import reduction
+from oemof.solph import pyomo_fastbuild as pofast
+from oemof.solph.graph_index import GraphIndex
+from oemof.solph import problem_writer as pw
+from oemof.solph import solution_reader as sr
+from oemof.solph.results import LazyResults, Results, solution_vector
+from oemof.outputlib import to_pandas as tpd
+from oemof.outputlib import to_store
+from oemof.tools.entities_from_csv import entities_from_csv
 from oemof.core.network.entities.components import sources as source
+from oemof.core.network.entities.components import sinks as sink
+from oemof.core.network.entities.components import transports as transport
+
+
+def installed_solver():
+    """Returns the name of an installed solver, skips the test if there is
+    none.
+    """
+    for solver in ['glpk', 'cbc']:
+        if SolverFactory(solver).available(exception_flag=False):
+            return solver
+    raise SkipTest("Neither glpk nor cbc installed.")
+
+
+def dump_matrices(matrices, filename):
+    """Writes the canonical matrices (see :meth:`ProblemMatrices.canonical
+    <oemof.solph.problem_writer.ProblemMatrices.canonical>`) of a model to
+    a json file, the labels are written as their repr.
+    """
+    matrices = matrices.canonical()
+    columns = [repr(label) for label in matrices.column_labels]
+
+    def bound(value):
+        return None if np.isinf(value) else float(value)
+    rows = []
+    for k, label in enumerate(matrices.row_labels):
+        row = matrices.A.getrow(k)
+        rows.append({'label': repr(label), 'sense': matrices.senses[k],
+                     'rhs': float(matrices.rhs[k]),
+                     'coefficients': [[columns[j], float(a)] for j, a in
+                                      zip(row.indices, row.data)]})
+    columns = [{'label': label, 'lower': bound(matrices.lower[j]),
+                'upper': bound(matrices.upper[j]),
+                'c': float(matrices.c[j]),
+                'integer': bool(matrices.integer[j])}
+               for j, label in enumerate(columns)]
+    # one row or column per line
+    with open(filename, 'w') as f:
+        f.write('{{"sense": {0}, "constant": {1},\n'.format(
+            json.dumps(matrices.sense), json.dumps(matrices.constant)))
+        for key, items in [('columns', columns), ('rows', rows)]:
+            f.write(' "{0}": [\n  '.format(key))
+            f.write(',\n  '.join(json.dumps(x) for x in items))
+            f.write('\n ]' + (',\n' if key == 'columns' else '}\n'))
+
+
+def load_matrices(filename):
+    """Reads matrices written by :func:`dump_matrices`."""
+    with open(filename) as f:
+        data = json.load(f)
+    columns = {c['label']: j for j, c in enumerate(data['columns'])}
+    row, col, coefs = [], [], []
+    for k, r in enumerate(data['rows']):
+        for label, a in r['coefficients']:
+            row.append(k)
+            col.append(columns[label])
+            coefs.append(a)
+    A = pw.sparse.csr_matrix((coefs, (row, col)), shape=(
+        len(data['rows']), len(data['columns'])))
+
+    def array(key, default, items):
+        return np.array([default if x[key] is None else x[key]
+                         for x in items], dtype=float)
+
+    def labels(items):
+        return pw._object_array([ast.literal_eval(x['label'])
+                                 for x in items])
+    return pw.ProblemMatrices(
+        A, array('rhs', 0, data['rows']),
+        np.array([r['sense'] for r in data['rows']], dtype=object),
+        array('lower', -np.inf, data['columns']),
+        array('upper', np.inf, data['columns']),
+        array('c', 0, data['columns']), data['constant'],
+        np.array([c['integer'] for c in data['columns']], dtype=bool),
+        labels(data['rows']), labels(data['columns']), data['sense'])
+
+
+def parity_system(backend, solver, investment=False):
+    """Optimizes the components of the fast build tests with `backend` and
+    returns the objective value."""
+    invest = [transformer.Simple, source.FixedSource, transformer.Storage]
+    for cls in invest:
+        cls.optimization_options['investment'] = investment
+    try:
+        simulation = es.Simulation(
+            timesteps=range(6), solver=solver, backend=backend,
+            objective_options={
+                'function': predefined_objectives.minimize_cost})
+        ensys = es.EnergySystem(simulation=simulation)
+        bgas = Bus(uid="bgas", type="gas", price=70, balanced=True,
+                   excess=False)
+        bel = Bus(uid="bel", type="el", excess=True, shortage=True,
+                  shortage_costs=1000)
+        bth = Bus(uid="bth", type="th", excess=True)
+        source.Commodity(uid='rgas', outputs=[bgas], opex_var=30,
+                         sum_out_limit=1000)
+        transformer.Simple(uid='pp_gas', inputs=[bgas], outputs=[bel],
+                           opex_var=50, out_max=[100], add_out_limit=100,
+                           capex=500, eta=[0.58])
+        source.FixedSource(uid="wind", outputs=[bel],
+                           val=[0.5, 0.8, 0.3, 0, 0.1, 0.2], out_max=[100],
+                           add_out_limit=50, capex=1000, opex_fix=20,
+                           lifetime=25, crf=0.08)
+        source.DispatchSource(uid="pv", outputs=[bel],
+                              val=[0, 0.2, 0.5, 0.7, 0.3, 0],
+                              out_max=[100], curtail_costs=5)
+        transformer.Storage(uid='storage', inputs=[bel], outputs=[bel],
+                            eta_in=0.9, eta_out=0.8, cap_loss=0.01,
+                            cap_max=0 if investment else 100,
+                            cap_initial=0 if investment else 50,
+                            add_cap_limit=1000, capex=1000,
+                            c_rate_in=1/6, c_rate_out=1/6)
+        transformer.CHP(uid='chp', inputs=[bgas], outputs=[bel, bth],
+                        out_max=[30, 40], eta=[0.4, 0.3])
+        transformer.SimpleExtractionCHP(uid='chp_ext', inputs=[bgas],
+                                        outputs=[bel, bth],
+                                        out_max=[30, 40], eta=[0.4, 0.3],
+                                        beta=0.15, sigma=0.8)
+        transport.Simple(uid='line', inputs=[bel], outputs=[bth],
+                         out_max=[50], in_max=[60], eta=[0.9])
+        sink.Simple(uid="demand", inputs=[bel],
+                    val=[60, 80, 100, 120, 90, 70])
+        sink.Simple(uid="heat", inputs=[bth], val=[30, 20, 10, 10, 20, 30])
+        ensys.optimize()
+    finally:
+        for cls in invest:
+            cls.optimization_options.pop('investment', None)
+    return ensys.results.objective
 
 
 class EnergySystem_Tests:
@@ -35,6 +184,681 @@ class EnergySystem_Tests:
         ensys.simulation = self.simulation
         ok_(len(ensys.simulation.timesteps) == 5)
 
+    def test_entity_indexes(self):
+        ensys = es.EnergySystem()
+        bgas = Bus(uid='bgas', type='gas')
+        bel = Bus(uid='bel', type='el')
+        bel2 = Bus(uid='bel2', type='el')
+        pp = transformer.Simple(uid='pp', inputs=[bgas], outputs=[bel])
+        eq_(ensys.by_uid['pp'], pp)
+        eq_(ensys.groups[Bus], [bgas, bel, bel2])
+        eq_(ensys.groups[Component], [pp])
+        eq_(ensys.bus_types['el'], [bel, bel2])
+        del ensys.entities[1]
+        ok_('bel' not in ensys.by_uid)
+        eq_(ensys.groups[Bus], [bgas, bel2])
+        # a list extending itself
+        ensys.entities += ensys.entities
+        eq_(len(ensys.entities), 6)
+        eq_(len(ensys.groups[Component]), 2)
+        # slices, copies, sums and products are indexed
+        for entities in (ensys.entities[:2], ensys.entities.copy(),
+                         ensys.entities[:1] + [pp], 2 * ensys.entities[:1]):
+            ok_(isinstance(entities, Entities))
+            eq_(entities.by_uid['bgas'], bgas)
+        ok_('pp' not in ensys.entities[:2].by_uid)
+        ensys.entities *= 0
+        eq_(ensys.groups, {})
+        ensys.entities = [pp]
+        eq_(list(ensys.groups), list(type(pp).__mro__[:-1]))
+
+    def test_rolling_horizon_window(self):
+        eq_(es._window([1, 2, 3, 4, 5], 5, slice(1, 3)), [2, 3])
+        eq_(es._window([[1, 2, 3, 4, 5], [0.5] * 5], 5, slice(3, 5)),
+            [[4, 5], [0.5, 0.5]])
+        part = es._window(pd.Series(range(5)), 5, slice(2, 5))
+        eq_(part[0], 2)
+        eq_(list(part), [2, 3, 4])
+        eq_(es._window([1, 2, 3, 4, 5], 5, [0, 4]), [1, 5])
+        eq_(es._window(pd.Series([1, 2, 3, 4, 5]), 5, [0, 4])[1], 5)
+        eq_(es._window([1, 2, 3, 4, 5], 5, [slice(0, 3), slice(3, 5)]),
+            [2, 4.5])
+        eq_(es._window(pd.Series([1, 2, 3, 4, 5]), 5,
+                       [slice(0, 3), slice(3, 5)])[1], 4.5)
+        # no time series
+        eq_(es._window([0.58], 5, slice(0, 2)), [0.58])
+        eq_(es._window(100, 5, slice(0, 2)), 100)
+
+    def test_rolling_horizon(self):
+        simulation = es.Simulation(
+            timesteps=range(6), solver=installed_solver(),
+            objective_options={
+                'function': predefined_objectives.minimize_cost})
+        ensys = es.EnergySystem(simulation=simulation)
+        bel = Bus(uid='bel', type='el', excess=True, shortage=True,
+                  shortage_costs=1000)
+        wind = source.FixedSource(uid='wind', outputs=[bel],
+                                  val=pd.Series([0, 0, 0, 0.1, 0, 0]),
+                                  out_max=[100])
+        storage = transformer.Storage(uid='storage', inputs=[bel],
+                                      outputs=[bel], cap_max=100,
+                                      cap_initial=50, c_rate_in=1,
+                                      c_rate_out=1)
+        demand = sink.Simple(uid='demand', inputs=[bel],
+                             val=pd.Series([10, 20, 30, 40, 50, 60]))
+        ensys.optimize(window=3)
+        eq_(ensys.results[bel][demand].tolist(), [10, 20, 30, 40, 50, 60])
+        eq_(ensys.results[wind][bel].tolist(), [0, 0, 0, 10, 0, 0])
+        level = ensys.results[storage][storage]
+        # the storage is emptied in the first window, the level is handed
+        # over to the second window and fixed at the end of the horizon
+        eq_(level[2], 0)
+        ok_(abs(level[3] - level[2] - ensys.results[bel][storage][3] +
+                ensys.results[storage][bel][3]) < 1e-6)
+        eq_(level[5], 50)
+        eq_(storage.cap_initial, 50)
+        ok_(storage.cap_final is None)
+        eq_(list(demand.val.index), list(range(6)))
+
+    def test_rolling_horizon_objective(self):
+        simulation = es.Simulation(
+            timesteps=range(12), solver=installed_solver(),
+            objective_options={
+                'function': predefined_objectives.minimize_cost})
+        ensys = es.EnergySystem(simulation=simulation)
+        bgas = Bus(uid='bgas', type='gas', excess=False)
+        bel = Bus(uid='bel', type='el', excess=True, shortage=True,
+                  shortage_costs=1000)
+        rgas = source.Commodity(uid='rgas', outputs=[bgas], opex_var=30)
+        pp = transformer.Simple(uid='pp', inputs=[bgas], outputs=[bel],
+                                opex_var=50, opex_fix=2, out_max=[30],
+                                eta=[0.5])
+        transformer.Storage(uid='storage', inputs=[bel], outputs=[bel],
+                            cap_max=20, cap_initial=10, c_rate_in=0.5,
+                            c_rate_out=0.5)
+        source.FixedSource(uid='wind', outputs=[bel],
+                           val=[0, 1, 0, 0, 1, 1, 0, 0, 0, 1, 0, 0],
+                           out_max=[20])
+        sink.Simple(uid='demand', inputs=[bel],
+                    val=[10, 20, 40, 30, 10, 5, 35, 40, 20, 10, 30, 25])
+        backends = ['pyomo'] + (['scipy'] if mm.sp is not None else [])
+        for backend in backends:
+            simulation.backend = backend
+            for window, overlap in [(4, 2), (6, 6), (5, 3)]:
+                ensys.optimize(window=window, overlap=overlap)
+                results = ensys.results
+                # the overlap is counted once, the fixed costs as well
+                cost = (30 * sum(results[rgas][bgas]) +
+                        50 * sum(results[pp][bel]) +
+                        1000 * sum(results[bel]['shortage']) + 2 * 30)
+                ok_(abs(results.objective - cost) < 1e-6)
+
+    def test_results_by_uid(self):
+        ensys = es.EnergySystem()
+        bus = Bus(uid='bus')
+        pp = transformer.Simple(uid='pp', inputs=[bus], outputs=[bus])
+        results = Results([(pp, bus), (bus, 'excess')],
+                          np.array([[1, 2], [0, 1]]), 1, 10,
+                          {pp: {'add_out': 5}}, np.array([[0, 3]]),
+                          solver_status={'status': 'ok',
+                                         'termination_condition': 'optimal'})
+        # results keyed by uids can be passed between processes
+        restored = es._results_from_uids(es._results_by_uid(results),
+                                         {e.uid: e for e in ensys.entities})
+        eq_(restored.reduced_costs[pp][bus].tolist(), [0, 3])
+        eq_(restored.objective, 10)
+        eq_(restored[pp][bus].tolist(), [1, 2])
+        eq_(restored[pp].add_out, 5)
+        eq_(restored[bus]['excess'].tolist(), [0, 1])
+        eq_(restored.solver_status['termination_condition'], 'optimal')
+
+    def test_results(self):
+        results = Results([('a', 'b'), ('b', 'b'), ('b', 'excess')],
+                          np.array([[1, 2, 3], [4, 5, 6], [0, 0, 1]]), 1, 10,
+                          {'b': {'add_cap': 2}})
+        eq_(results.edges, [('a', 'b')])
+        eq_(results['b'].add_cap, 2)
+        # rows of the mapping are views of the array
+        results['a']['b'][0] = 7
+        eq_(results.flows.tolist(), [[7, 2, 3]])
+        taken = results.take([2, 2, 0])
+        eq_(taken['b']['b'].tolist(), [6, 6, 4])
+        other = Results([('b', 'excess'), ('b', 'b'), ('a', 'b')],
+                        np.array([[1], [8], [9]]), 1, 5)
+        appended = taken.append(other)
+        eq_(appended['a']['b'].tolist(), [3, 3, 7, 9])
+        eq_(appended['b']['excess'].tolist(), [1, 1, 0, 1])
+        eq_(appended.objective, 15)
+        eq_(appended['b'].add_cap, 2)
+
+    def test_lazy_results(self):
+        results = LazyResults([('a', 'b'), ('b', 'excess')],
+                              np.array([[1, 2], [0, 1]]), 1, 3,
+                              {'c': {'add_cap': 4}})
+        eq_(len(results.data), 0)
+        ok_('b' in results)
+        eq_(sorted(results), ['a', 'b', 'c'])
+        eq_(results['a']['b'].tolist(), [1, 2])
+        eq_(results['c'].add_cap, 4)
+        # only the accessed entities are built
+        eq_(sorted(results.data), ['a', 'c'])
+        # the series are sliced from a solution vector
+        vector, positions = solution_vector(
+            [(np.array([0, 1, 2]), np.array([[1, 2]])),
+             (np.array([5]), np.array([[0, -1]]))])
+        eq_(vector.shape, (5,))
+        results = LazyResults([('a', 'b'), ('b', 'excess')], vector, 1,
+                              positions=positions)
+        eq_(results['a']['b'].tolist(), [1, 2])
+        ok_(results.positions is not None)
+        restored = pickle.loads(pickle.dumps(results))
+        eq_(restored.vector.tolist()[:4], [0, 1, 2, 5])
+        eq_(restored['b']['excess'][0], 5)
+        ok_(np.isnan(restored['b']['excess'][1]))
+        # the array of all rows is gathered on demand
+        eq_(results.array[0].tolist(), [1, 2])
+        ok_(results.positions is None and results.vector is None)
+        eq_(results.take([1])['a']['b'].tolist(), [2])
+
+    def test_lazy_results_of_model(self):
+        solver = installed_solver()
+        simulation = es.Simulation(
+            timesteps=range(3), solver=solver,
+            objective_options={
+                'function': predefined_objectives.minimize_cost})
+        ensys = es.EnergySystem(simulation=simulation)
+        bgas = Bus(uid='bgas', type='gas', excess=False)
+        bel = Bus(uid='bel', type='el', excess=True)
+        source.Commodity(uid='rgas', outputs=[bgas])
+        transformer.Simple(uid='pp', inputs=[bgas], outputs=[bel],
+                           opex_var=50, out_max=[30], eta=[0.5])
+        transformer.Storage(uid='storage', inputs=[bel], outputs=[bel],
+                            cap_max=10, cap_initial=5, c_rate_in=1,
+                            c_rate_out=1)
+        source.DispatchSource(uid='pv', outputs=[bel], val=[0.5, 1, 0],
+                              out_max=[10])
+        sink.Simple(uid='demand', inputs=[bel], val=[10, 20, 30])
+        model = om.OptimizationModel(energysystem=ensys)
+        model.solve(solver=solver)
+        results = model.results()
+        lazy = model.results(lazy=True)
+        model.release()
+        eq_(len(lazy.data), 0)
+        ok_(lazy.vector.ndim == 1)
+        for s in results:
+            for t in results[s]:
+                ok_(np.allclose(lazy[s][t], results[s][t], equal_nan=True))
+        eq_(lazy.objective, results.objective)
+        ok_(np.allclose(lazy.array, results.array, equal_nan=True))
+
+    def test_release_model(self):
+        solver = installed_solver()
+        simulation = es.Simulation(
+            timesteps=range(3), solver=solver,
+            objective_options={
+                'function': predefined_objectives.minimize_cost})
+        ensys = es.EnergySystem(simulation=simulation)
+        bgas = Bus(uid='bgas', type='gas', excess=False)
+        bel = Bus(uid='bel', type='el', excess=True)
+        source.Commodity(uid='rgas', outputs=[bgas])
+        pp = transformer.Simple(uid='pp', inputs=[bgas], outputs=[bel],
+                                opex_var=50, out_max=[30], eta=[0.5])
+        demand = sink.Simple(uid='demand', inputs=[bel], val=[10, 20, 30])
+        model = om.OptimizationModel(energysystem=ensys)
+        ensys.optimize(om=model)
+        flows = ensys.results[pp][bel].tolist()
+        objective = ensys.results.objective
+        model = om.OptimizationModel(energysystem=ensys)
+        ensys.optimize(om=model, keep_model=False)
+        # the results stay available, the pyomo components are gone
+        eq_(ensys.results[pp][bel].tolist(), flows)
+        eq_(ensys.results[bel][demand].tolist(), [10, 20, 30])
+        eq_(ensys.results.objective, objective)
+        eq_(ensys.results.solver_status['termination_condition'], 'optimal')
+        eq_(list(model.component_objects()), [])
+        ok_(model.component('w') is None)
+        ok_(not hasattr(model, 'graph'))
+
+    def test_memory_mapped_results(self):
+        directory = tempfile.mkdtemp()
+        window = Results([('a', 'b'), ('b', 'excess')],
+                         np.array([[1, 2, 3], [0, 0, 1]]), 1, 5)
+        results = Results.allocate(window.index, 4, 1, directory=directory)
+        ok_(np.isnan(results['a']['b']).all())
+        results.put(0, window, 2)
+        results.put(2, window, 2)
+        eq_(results['a']['b'].tolist(), [1, 2, 1, 2])
+        eq_(results.objective, 10)
+        # derived results are memory-mapped as well
+        taken = results.take([3, 0])
+        eq_(taken.directory, results.directory)
+        eq_(taken['b']['excess'].tolist(), [0, 0])
+        appended = results.append(taken)
+        eq_(appended['a']['b'].tolist(), [1, 2, 1, 2, 2, 1])
+        # no files are left behind in the scratch directory
+        del results, taken, appended
+        gc.collect()
+        eq_(os.listdir(directory), [])
+
+    def test_results_dataframe(self):
+        ensys = es.EnergySystem(time_idx=pd.date_range('1/1/2012',
+                                                       periods=2, freq='H'))
+        bgas = Bus(uid='bgas', type='gas')
+        bel = Bus(uid='bel', type='el')
+        pp = transformer.Simple(uid='pp', inputs=[bgas], outputs=[bel])
+        ensys.results = Results([(bgas, pp), (pp, bel), (bel, 'excess')],
+                                np.array([[2, 4], [1, 2], [0, 1]]), 2)
+        df = tpd.ResultsDataFrame(energy_system=ensys)
+        ok_(df.index.is_monotonic_increasing)
+        eq_(df.slice_by(bus_uid='bel', type='input')['val'].tolist(), [1, 2])
+        eq_(df.slice_by(bus_uid='bgas', type='output',
+                        obj_uid='pp')['val'].tolist(), [2, 4])
+        eq_(df.slice_by(obj_uid='excess')['val'].tolist(), [0, 1])
+
+    def test_results_store(self):
+        backends = [backend for backend, module in [
+            ('parquet', to_store.pq), ('hdf5', to_store.tables)]
+            if module is not None]
+        if not backends:
+            raise SkipTest("Neither pyarrow nor PyTables installed.")
+        time_idx = pd.date_range('1/1/2012', periods=2, freq='H')
+        for backend in backends:
+            path = ospath.join(tempfile.mkdtemp(), 'store.' + backend)
+            store = to_store.ResultsStore(path, backend=backend,
+                                          float32=True)
+            for scenario, factor in [('a', 1), ('b', 2)]:
+                store.append(scenario, Results(
+                    [('pp', 'bel'), ('bel', 'excess')],
+                    np.array([[1, 2], [0, 1]]) * factor, 1, 10 * factor),
+                    time_idx)
+            eq_(store.scenarios(), ['a', 'b'])
+            flows = store.read('pp', 'bel')
+            eq_(flows['b'].tolist(), [2, 4])
+            eq_(list(flows.index), list(time_idx))
+            eq_(store.read_scenario('a')['bel|excess'].tolist(), [0, 1])
+            eq_(store.objectives().tolist(), [10, 20])
+            # uids giving the same column name
+            try:
+                store.append('c', Results([(1, 'bel'), ('1', 'bel')],
+                                          np.zeros((2, 2)), 2))
+                ok_(False)
+            except ValueError:
+                pass
+
+    def test_results_store_many_columns(self):
+        if to_store.tables is None:
+            raise SkipTest("PyTables not installed.")
+        path = ospath.join(tempfile.mkdtemp(), 'store.h5')
+        store = to_store.ResultsStore(path)
+        n = 5000
+        index = [('transformer_{0}'.format(k), 'bus_{0}'.format(k))
+                 for k in range(n)]
+        store.append('a', Results(index, np.arange(2. * n).reshape(n, 2), n))
+        eq_(store.read('transformer_4321', 'bus_4321')['a'].tolist(),
+            [8642, 8643])
+        eq_(store.read_scenario('a').shape, (2, n))
+
+    def test_problem_writer(self):
+        solver = installed_solver()
+        simulation = es.Simulation(
+            timesteps=range(3), solver=solver,
+            objective_options={
+                'function': predefined_objectives.minimize_cost})
+        ensys = es.EnergySystem(simulation=simulation)
+        bgas = Bus(uid='bgas', type='gas', excess=False)
+        bel = Bus(uid='bel', type='el', excess=True)
+        source.Commodity(uid='rgas', outputs=[bgas])
+        pp = transformer.Simple(uid='pp', inputs=[bgas], outputs=[bel],
+                                opex_var=50, out_max=[30], eta=[0.5])
+        transformer.Storage(uid='storage', inputs=[bel], outputs=[bel],
+                            cap_max=10, cap_initial=5, c_rate_in=1,
+                            c_rate_out=1)
+        sink.Simple(uid='demand', inputs=[bel], val=[10, 20, 30])
+        model = om.OptimizationModel(energysystem=ensys)
+        model.solve(solver=solver)
+        objective = model.objective()
+        flows = [model.w['pp', 'bel', t].value for t in range(3)]
+        # the problem files of the oemof writer have the same solution
+        for problem_format in ['lp', 'mps']:
+            model = om.OptimizationModel(energysystem=ensys)
+            model.solve(solver=solver, problem_writer='oemof',
+                        problem_format=problem_format)
+            ok_(abs(model.objective() - objective) < 1e-6)
+            eq_([model.w['pp', 'bel', t].value for t in range(3)], flows)
+        # the names of the label map contain commas
+        problem = pw.write_problem(
+            model, ospath.join(tempfile.mkdtemp(), 'problem.lp'))
+        with open(problem.labels_file, newline='') as f:
+            labels = dict(csv.reader(f))
+        eq_(labels.pop('label'), 'name')
+        eq_(len(labels), len(problem.variables) + len(problem.constraints))
+        eq_(labels['x1'], pw._name(problem.variables[0]))
+        eq_(labels['c1'], pw._name(problem.constraints[0]))
+        ok_(any(',' in name for name in labels.values()))
+
+    def test_to_matrices(self):
+        if pw.sparse is None:
+            raise SkipTest("scipy is not installed")
+        po = pw.po
+        model = po.ConcreteModel()
+        model.x = po.Var([0, 1], bounds=(0, 10))
+        model.y = po.Var(within=po.Binary)
+        model.z = po.Var()
+        model.z.fix(2)
+        model.obj = po.Objective(expr=3 * model.x[0] + model.x[1] + 4 *
+                                 model.z)
+        model.balance = po.Constraint(expr=0 == model.x[1] - model.x[0] -
+                                      model.z)
+        model.limit = po.Constraint(expr=(1, model.x[0] + model.y, 5))
+        model.trivial = po.Constraint(expr=model.z <= 3)
+        matrices = pw.to_matrices(model)
+        eq_(matrices.shape, (3, 3))
+        eq_(matrices.sense, 'min')
+        # the fixed variable is part of the constant and the right hand side
+        eq_(matrices.constant, 8)
+        eq_(list(matrices.column_labels), [('x', 0), ('x', 1), ('y',)])
+        eq_(list(matrices.c), [3, 1, 0])
+        eq_(list(matrices.lower), [0, 0, 0])
+        eq_(list(matrices.upper), [10, 10, 1])
+        eq_(list(matrices.integer), [False, False, True])
+        # the range gives two rows, the trivial constraint none
+        eq_(list(matrices.row_labels),
+            [('balance',), ('limit',), ('limit',)])
+        eq_(list(matrices.senses), ['=', '>=', '<='])
+        eq_(list(matrices.rhs), [2, 1, 5])
+        eq_(matrices.A.toarray().tolist(),
+            [[-1, 1, 0], [1, 0, 1], [1, 0, 1]])
+        # the canonical rows have a positive first coefficient
+        canonical = matrices.canonical()
+        eq_(list(canonical.senses), ['=', '<=', '>='])
+        eq_(list(canonical.rhs), [-2, 5, 1])
+        eq_(canonical.A.toarray()[0].tolist(), [1, -1, 0])
+        ok_(matrices.equals(canonical))
+        model.balance.deactivate()
+        ok_(not matrices.equals(pw.to_matrices(model)))
+
+    def test_solution_reader(self):
+        class Var:
+            value = None
+        variables = [Var(), Var(), Var()]
+        # the second constraint is ranged and written as two rows
+        problem = pw.ProblemFile('problem.lp', 'lp', variables,
+                                 ['c1', 'c2', 'c2'], constant_column=1)
+        filename = ospath.join(tempfile.mkdtemp(), 'solution.sol')
+        with open(filename, 'w') as f:
+            f.write("c glpk\ns bas 3 4 f f 12.5\ni 1 b 3 0.5\n" +
+                    "i 2 u 4 -1\ni 3 l 4 2\nj 1 b 1 0\nj 2 f 1 0\n" +
+                    "j 3 l 0 3\nj 4 b 2 0\ne o f\n")
+        solution = sr.read_glpk(problem, filename, duals=True)
+        eq_(solution.termination_condition, 'optimal')
+        eq_(solution.objective, 12.5)
+        solution.load()
+        eq_([v.value for v in variables], [1, 0, 2])
+        eq_(solution.reduced_cost(variables[1]), 3)
+        eq_(solution.dual('c2'), 1)
+        with open(filename, 'w') as f:
+            f.write("Optimal - objective value 12.5\n" +
+                    "  0 c1  3  0.5\n  1 c2  4  -1\n  2 c3  4  2\n" +
+                    "  0 x1  1  0\n**  1 x2  0  3\n  2 x3  2  0\n" +
+                    "  3 ONE_VAR_CONSTANT  1  0\n")
+        solution = sr.read_cbc(problem, filename, duals=True)
+        eq_(solution.values.tolist(), [1, 0, 2])
+        eq_(solution.reduced_costs.tolist(), [0, 3, 0])
+        eq_(solution.dual('c2'), 1)
+
+    def test_matrix_model(self):
+        if mm.sp is None:
+            raise SkipTest("scipy not installed.")
+        simulation = es.Simulation(
+            timesteps=range(3), backend='scipy', duals=True,
+            objective_options={
+                'function': predefined_objectives.minimize_cost})
+        ensys = es.EnergySystem(simulation=simulation)
+        bgas = Bus(uid='bgas', type='gas', excess=False)
+        bel = Bus(uid='bel', type='el', excess=True)
+        source.Commodity(uid='rgas', outputs=[bgas])
+        pp = transformer.Simple(uid='pp', inputs=[bgas], outputs=[bel],
+                                opex_var=50, out_max=[30], eta=[0.5])
+        source.FixedSource(uid='wind', outputs=[bel], val=[1, 0, 0],
+                           out_max=[20])
+        sink.Simple(uid='demand', inputs=[bel], val=[10, 20, 30])
+        ensys.optimize()
+        eq_(ensys.results[pp][bel].tolist(), [0, 20, 30])
+        eq_(ensys.results[bgas][pp].tolist(), [0, 40, 60])
+        eq_(ensys.results[bel]['excess'].tolist(), [10, 0, 0])
+        eq_(ensys.results.objective, 2500)
+        # duals of the bus balance
+        eq_(ensys.results[bel][bel].tolist(), [0, 50, 50])
+        eq_(ensys.results.solver_status['termination_condition'], 'optimal')
+
+    def test_matrix_model_parity(self):
+        # the matrix model has the optimum of the pyomo model
+        if mm.sp is None:
+            raise SkipTest("scipy >= 1.6 not installed.")
+        solver = installed_solver()
+        for investment in [False, True]:
+            objectives = [parity_system(backend, solver, investment)
+                          for backend in ['pyomo', 'scipy']]
+            ok_(abs(objectives[0] - objectives[1]) <=
+                1e-6 * abs(objectives[0]))
+
+    def test_storage_charge_limit(self):
+        # charging 10 at c_rate_in 0.1 needs a capacity of 100, discharging
+        # 5 at c_rate_out 1 only a capacity of 10
+        builds = [('pyomo', False), ('pyomo', True)] + (
+            [('scipy', False)] if mm.sp is not None else [])
+        solver = installed_solver()
+        transformer.Storage.optimization_options['investment'] = True
+        try:
+            for backend, fast_build in builds:
+                simulation = es.Simulation(
+                    timesteps=range(3), solver=solver, backend=backend,
+                    fast_build=fast_build, objective_options={
+                        'function': predefined_objectives.minimize_cost})
+                ensys = es.EnergySystem(simulation=simulation)
+                bel = Bus(uid='bel', type='el', excess=True, shortage=True,
+                          shortage_costs=1000)
+                source.FixedSource(uid='wind', outputs=[bel], val=[1, 0, 0],
+                                   out_max=[10])
+                storage = transformer.Storage(
+                    uid='storage', inputs=[bel], outputs=[bel], eta_in=1,
+                    eta_out=1, cap_loss=0, cap_max=0, cap_initial=0,
+                    add_cap_limit=1000, capex=1, crf=1, c_rate_in=0.1,
+                    c_rate_out=1)
+                sink.Simple(uid='demand', inputs=[bel], val=[0, 5, 5])
+                ensys.optimize()
+                eq_(ensys.results[bel][storage].tolist(), [10, 0, 0])
+                ok_(abs(ensys.results.objective - 100) <= 1e-6)
+        finally:
+            transformer.Storage.optimization_options.pop('investment', None)
+
+    def test_optimize_simulation_without_new_options(self):
+        # e.g. a pickled simulation of an older version
+        simulation = es.Simulation(
+            timesteps=range(3), solver=installed_solver(),
+            objective_options={
+                'function': predefined_objectives.minimize_cost})
+        for name in ['problem_writer', 'solution_reader', 'results_dir',
+                     'backend', 'presolve', 'build_stats', 'periods',
+                     'timestep_weights', 'timestep_durations']:
+            delattr(simulation, name)
+        ensys = es.EnergySystem(simulation=simulation)
+        bel = Bus(uid='bel', type='el', shortage=True, shortage_costs=100)
+        source.FixedSource(uid='wind', outputs=[bel], val=[1, 0, 1],
+                           out_max=[5])
+        demand = sink.Simple(uid='demand', inputs=[bel], val=[2, 2, 2])
+        for options in [{}, {'window': 2}, {'merge_tolerance': 0.1}]:
+            ensys.optimize(**options)
+            eq_(list(ensys.results[bel][demand]), [2, 2, 2])
+
+    def test_topology_reduction(self):
+        if mm.sp is None:
+            raise SkipTest("scipy not installed.")
+        simulation = es.Simulation(
+            timesteps=range(3), backend='scipy',
+            objective_options={
+                'function': predefined_objectives.minimize_cost})
+        ensys = es.EnergySystem(simulation=simulation)
+        bgas = Bus(uid='bgas', type='gas', excess=False)
+        b1 = Bus(uid='b1', type='el', excess=False)
+        b2 = Bus(uid='b2', type='el', excess=False)
+        bel = Bus(uid='bel', type='el', excess=True)
+        source.Commodity(uid='rgas', outputs=[bgas])
+        pp = transformer.Simple(uid='pp', inputs=[bgas], outputs=[b1],
+                                opex_var=10, out_max=[100], eta=[0.5])
+        line1 = transport.Simple(uid='line1', inputs=[b1], outputs=[b2],
+                                 eta=[0.9], out_max=[80], in_max=[90])
+        line2 = transport.Simple(uid='line2', inputs=[b2], outputs=[bel],
+                                 eta=[0.8], out_max=[70], in_max=[90])
+        d1 = sink.Simple(uid='d1', inputs=[bel], val=[10, 20, 30])
+        d2 = sink.Simple(uid='d2', inputs=[bel], val=[30, 20, 0])
+        entities = list(ensys.entities)
+        reduced = reduction.reduce_topology(ensys.entities)
+        eq_(reduced.merged_chains, 2)
+        eq_(reduced.merged_sinks, 1)
+        eq_(len(reduced.entities), 5)
+        eq_(ensys.entities, entities)
+        eq_(bel.inputs, [line2])
+        ensys.optimize()
+        full = ensys.results
+        ensys.optimize(reduce_topology=True)
+        ok_(abs(ensys.results.objective - full.objective) < 1e-6)
+        for s, t in [(bgas, pp), (pp, b1), (b1, line1), (line1, b2),
+                     (line2, bel), (bel, d1), (bel, d2)]:
+            ok_(np.allclose(ensys.results[s][t], full[s][t]))
+        eq_(ensys.results[bel][d2].tolist(), [30, 20, 0])
+
+    def test_graph_index(self):
+        ensys = es.EnergySystem(simulation=self.simulation)
+        bgas = Bus(uid='bgas', type='gas')
+        bel = Bus(uid='bel', type='el')
+        source.Commodity(uid='rgas', outputs=[bgas])
+        transformer.Simple(uid='pp', inputs=[bgas], outputs=[bel])
+        source.FixedSource(uid='wind', outputs=[bel])
+        sink.Simple(uid='demand', inputs=[bel])
+        graph = GraphIndex(ensys.entities)
+        eq_([c.uid for c in graph.components],
+            ['rgas', 'pp', 'wind', 'demand'])
+        eq_(graph.edges, [('rgas', 'bgas'), ('bgas', 'pp'), ('pp', 'bel'),
+                          ('wind', 'bel'), ('bel', 'demand')])
+        eq_(graph.inputs('bel'), ['pp', 'wind'])
+        eq_(graph.outputs('bel'), ['demand'])
+        eq_(graph.inflows('pp'), [('bgas', 'pp')])
+        eq_(graph.in_ptr.tolist(), [0, 1, 3, 3, 4, 4, 5])
+        eq_(graph.in_edges.tolist(), [0, 2, 3, 1, 4])
+        eq_(graph.out_ptr.tolist(), [0, 1, 2, 3, 4, 5, 5])
+        eq_(graph.edges_of(graph.by_type[sink.Simple]), [('bel', 'demand')])
+        eq_(graph.type_edges[transformer.Simple].tolist(), [1, 2])
+        eq_(graph.type_inputs[transformer.Simple].tolist(), [[1]])
+        eq_(graph.type_outputs[source.FixedSource].tolist(), [[3]])
+        eq_(graph.type_inputs[source.Commodity].shape, (1, 0))
+        # the edges of components with fewer outputs are padded
+        transformer.Simple(uid='chp', inputs=[bgas], outputs=[bel, bgas])
+        graph = GraphIndex(ensys.entities)
+        eq_(graph.type_edges[transformer.Simple].tolist(), [1, 2, 5, 6, 7])
+        eq_(graph.type_outputs[transformer.Simple].tolist(),
+            [[2, -1], [6, 7]])
+
+    def test_entities_from_csv(self):
+        es.EnergySystem()
+        path = tempfile.mkdtemp()
+        tables = {
+            'busses': "uid,type,price,timeseries\nbgas,gas,20,False\n" +
+                      "bel,el,0,False\nbth,th,0,True\n",
+            'busprices': "bth\n1\n2\n3\n",
+            'transformers': "uid,class,input,output,eta,out_max,skip\n" +
+                            "pp,Simple,bgas,bel,0.5,30,False\n",
+            'chps': "uid,class,input,output_el,output_th,out_max_el," +
+                    "out_min,eta_el_min,eta_el,eta_th,skip\n" +
+                    "chp,CHP,bgas,bel,bth,10,0.5,0.3,0.4,0.5,False\n",
+            'sinks': "uid,class,input\ndemand,Simple,bel\n",
+            'sinkvalues': "demand\n10\n20\n30\n"}
+        files = {}
+        for key, content in tables.items():
+            files[key] = ospath.join(path, key + '.csv')
+            with open(files[key], 'w') as f:
+                f.write(content)
+        entities = {e.uid: e for e in
+                    entities_from_csv(files)['entities']}
+        eq_(entities['pp'].inputs, [entities['bgas']])
+        eq_(entities['pp'].opex_var, 40)
+        eq_(entities['chp'].outputs, [entities['bel'], entities['bth']])
+        eq_(entities['bth'].price.tolist(), [1, 2, 3])
+        # time series are views of one array per file
+        ok_(isinstance(entities['demand'].val, np.ndarray))
+        ok_(entities['demand'].val.base is not None)
+        eq_(entities['demand'].val.tolist(), [10, 20, 30])
+
+    def test_indexed_values(self):
+        class Data:
+            def __init__(self, value):
+                self.value = value
+        w = {('a', 'b', 0): Data(1), ('a', 'b', 1): Data(2),
+             ('b', 'c', 0): Data(3), ('b', 'c', 1): Data(None),
+             ('c', 'd', 0): Data(5), ('c', 'd', 1): Data(6)}
+        values = pofast.indexed_values(w, {('b', 'c'): 0, ('a', 'b'): 1},
+                                       [0, 1])
+        eq_(values[1].tolist(), [1, 2])
+        eq_(values[0, 0], 3)
+        ok_(np.isnan(values[0, 1]))
+        cap = {('s', 0): Data(4), ('s', 1): Data(7)}
+        eq_(pofast.indexed_values(cap, {'s': 0}, [0, 1],
+                                  value=lambda d: -d.value).tolist(),
+            [[-4, -7]])
+
+    def test_typical_periods(self):
+        low, high = [1, 2, 1], [5, 9, 6]
+        periods = aggregation.typical_periods(
+            [low + high + low + low + high], 2, period_length=3, seed=1)
+        eq_(periods.order, [0, 1, 0, 0, 1])
+        eq_(periods.representatives, [0, 1])
+        eq_(periods.weights, [3, 2])
+        eq_(periods.timesteps(), [0, 1, 2, 3, 4, 5])
+        eq_(periods.timestep_weights(), [3, 3, 3, 2, 2, 2])
+        eq_(periods.expand(low + high), low + high + low + low + high)
+
+    def test_optimize_typical_periods(self):
+        simulation = es.Simulation(
+            timesteps=range(9), solver=installed_solver(),
+            objective_options={
+                'function': predefined_objectives.minimize_cost})
+        ensys = es.EnergySystem(simulation=simulation)
+        bel = Bus(uid='bel', type='el', excess=True, shortage=True,
+                  shortage_costs=1000)
+        demand = sink.Simple(uid='demand', inputs=[bel], val=pd.Series(
+            [40, 40, 40, 10, 20, 30, 10, 20, 30]))
+        # the second period represents all periods
+        ensys.optimize(typical_periods=1, period_length=3)
+        eq_(ensys.results[bel][demand].tolist(), [10, 20, 30] * 3)
+        eq_(ensys.results.objective, 180000)
+        eq_(list(demand.val.index), list(range(9)))
+
+    def test_optimize_merged_timesteps(self):
+        simulation = es.Simulation(
+            timesteps=range(6), solver=installed_solver(),
+            objective_options={
+                'function': predefined_objectives.minimize_cost})
+        ensys = es.EnergySystem(simulation=simulation)
+        bel = Bus(uid='bel', type='el', excess=True, shortage=True,
+                  shortage_costs=1000)
+        demand = sink.Simple(uid='demand', inputs=[bel],
+                             val=pd.Series([10, 10, 10, 40, 40, 60]))
+        ensys.optimize(merge_tolerance=0.01)
+        eq_(ensys.results[bel][demand].tolist(), [10, 10, 10, 40, 40, 60])
+        eq_(ensys.results.objective, 170000)
+        eq_(list(demand.val.index), list(range(6)))
+
+    def test_merge_timesteps(self):
+        segments = aggregation.merge_timesteps(
+            [[0, 0, 0, 5, 5.02, 5, 10, 10], [1, 1, 1, 1, 1, 1, 1, 2]],
+            tolerance=0.01)
+        eq_(segments.durations, [3, 3, 1, 1])
+        eq_(segments.starts, [0, 3, 6, 7])
+        eq_(segments.expand([1, 2, 3, 4]), [1, 1, 1, 2, 2, 2, 3, 4])
+        eq_(segments.interpolate([3, 6, 6, 0], 0), [1, 2, 3, 4, 5, 6, 6, 0])
+        eq_(aggregation.merge_timesteps([[0] * 7], max_duration=3).durations,
+            [3, 3, 1])
+
 
 class Constraint_Tests:
 
@@ -43,22 +867,37 @@ class Constraint_Tests:
 
         self.time_index = pd.date_range('1/1/2012', periods=3, freq='H')
 
+        # the lp files were written by the fast build
         self.sim = es.Simulation(
             timesteps=range(len(self.time_index)), solver='glpk',
-            objective_options={
+            fast_build=True, objective_options={
                 'function': predefined_objectives.minimize_cost})
 
         self.energysystem = es.EnergySystem(time_idx=self.time_index,
                                             simulation=self.sim)
 
+    def tearDown(self):
+        # the options are class attributes shared with the other tests
+        transformer.Simple.optimization_options.pop('investment', None)
+        source.FixedSource.optimization_options.pop('investment', None)
+
     def compare_lp_files(self, energysystem, filename):
         self.opt_model = om.OptimizationModel(energysystem=energysystem)
-        self.opt_model.write_lp_file(
-            path=ospath.join("tests", "lp_files"), filename="tmp.lp")
+        path = tempfile.mkdtemp()
+        self.opt_model.write_lp_file(path=path, filename="tmp.lp")
         logging.info("Comparing with file: {0}".format(filename))
-        ok_(filecmp.cmp(ospath.join("tests", "lp_files", "tmp.lp"),
+        ok_(filecmp.cmp(ospath.join(path, "tmp.lp"),
                         ospath.join("tests", "lp_files", filename)))
 
+    def compare_matrices(self, filename):
+        # the matrices of the model built by compare_lp_files, they do not
+        # depend on the writer
+        if pw.sparse is None:
+            return
+        logging.info("Comparing with file: {0}".format(filename))
+        ok_(self.opt_model.to_matrices().equals(
+            load_matrices(ospath.join("tests", "matrices", filename))))
+
     def test_Transformer_Simple(self):
         "Test transformer.Simple with and without investment."
         self.energysystem.entities = []
@@ -83,6 +922,7 @@ class Constraint_Tests:
             eta=[0.58])
 
         self.compare_lp_files(self.energysystem, "transformer_simp.lp")
+        self.compare_matrices("transformer_simp.json")
 
         transformer.Simple.optimization_options.update({'investment': True})
 
@@ -97,6 +937,7 @@ class Constraint_Tests:
             eta=[0.58])
 
         self.compare_lp_files(self.energysystem, "transformer_simp_invest.lp")
+        self.compare_matrices("transformer_simp_invest.json")
 
     def test_source_fixed(self):
         self.energysystem.entities = []
@@ -117,6 +958,7 @@ class Constraint_Tests:
                            crf=0.08)
 
         self.compare_lp_files(self.energysystem, "source_fixed.lp")
+        self.compare_matrices("source_fixed.json")
 
         source.FixedSource.optimization_options.update({'investment': True})
 
@@ -133,3 +975,4 @@ class Constraint_Tests:
                            crf=0.08)
 
         self.compare_lp_files(self.energysystem, "source_fixed_invest.lp")
+        self.compare_matrices("source_fixed_invest.json")
@@ -0,0 +1,227 @@
+from nose.tools import eq_, ok_
+
+import csv
+import pandas as pd
+import logging
+import filecmp
+import os.path as ospath
+import shutil
+import tempfile
+import pyomo.environ as po
+
+from oemof.core import energy_system as es
+from oemof.core.network.entities import Bus
+from oemof.core.network.entities.components import sinks as sink
+from oemof.core.network.entities.components import sources as source
+from oemof.core.network.entities.components import transformers as transformer
+from oemof.core.network.entities.components import transports as transport
+from oemof.solph import linear_constraints as lc
+from oemof.solph import linear_mixed_integer_constraints as milc
+from oemof.solph import optimization_model as om
+from oemof.solph import predefined_objectives as predefined_objectives
+from oemof.solph import problem_writer as pw
+from oemof.solph import variables as var
+
+
+class FastBuild_Tests:
+    """Fast and standard build have to result in identical problems."""
+
+    def setup(self):
+        self.time_index = pd.date_range('1/1/2012', periods=6, freq='H')
+        self.sim = es.Simulation(
+            timesteps=range(len(self.time_index)), solver='glpk',
+            objective_options={
+                'function': predefined_objectives.minimize_cost})
+        self.energysystem = es.EnergySystem(time_idx=self.time_index,
+                                            simulation=self.sim)
+        self.bgas = Bus(uid="bgas", type="gas", price=70, balanced=True,
+                        excess=False)
+        self.bel = Bus(uid="bel", type="el", excess=True, shortage=True,
+                       shortage_costs=1000)
+
+    def teardown(self):
+        for cls in [transformer.Simple, transformer.Storage, transformer.CHP,
+                    transformer.VariableEfficiencyCHP, source.FixedSource]:
+            for option in ['investment', 'linear_constr', 'milp_constr']:
+                cls.optimization_options.pop(option, None)
+
+    def compare_builds(self, problem_writer="pyomo", extension="lp"):
+        path = tempfile.mkdtemp()
+        try:
+            filenames, names = [], []
+            for fast_build in [False, True]:
+                self.sim.fast_build = fast_build
+                model = om.OptimizationModel(energysystem=self.energysystem)
+                filename = "fast_build_{0}.{1}".format(fast_build, extension)
+                model.write_lp_file(path=path, filename=filename,
+                                    problem_writer=problem_writer)
+                filenames.append(ospath.join(path, filename))
+                if problem_writer == "oemof":
+                    with open(filenames[-1] + ".labels", newline='') as f:
+                        names.append(sorted(name for label, name in
+                                            csv.reader(f)))
+            logging.info("Comparing fast and standard build.")
+            if problem_writer == "pyomo":
+                ok_(filecmp.cmp(filenames[0], filenames[1], shallow=False))
+            else:
+                # the oemof writer numbers the rows and columns in the order
+                # of their construction, the files have the same names and
+                # the coefficients are compared by the matrices
+                eq_(names[0], names[1])
+            self.compare_matrices()
+        finally:
+            shutil.rmtree(path)
+
+    def remove_gas_bus(self):
+        """Removes the gas bus for tests without gas components: the balance
+        of an unconnected bus is a trivial row, which the standard build
+        cannot construct."""
+        self.energysystem.entities.remove(self.bgas)
+
+    def compare_matrices(self):
+        if pw.sparse is None:
+            return
+        matrices = []
+        for fast_build in [False, True]:
+            self.sim.fast_build = fast_build
+            model = om.OptimizationModel(energysystem=self.energysystem)
+            matrices.append(model.to_matrices())
+        logging.info("Comparing the matrices of fast and standard build.")
+        ok_(matrices[0].equals(matrices[1]))
+
+    def test_transformer_simple(self):
+        transformer.Simple(uid='pp_gas', inputs=[self.bgas],
+                           outputs=[self.bel], opex_var=50, out_max=[10e10],
+                           eta=[0.58])
+        sink.Simple(uid="demand", inputs=[self.bel],
+                    val=[10, 20, 30, 40, 50, 60])
+        self.compare_builds()
+
+    def test_transformer_simple_invest(self):
+        transformer.Simple.optimization_options.update({'investment': True})
+        transformer.Simple(uid='pp_gas', inputs=[self.bgas],
+                           outputs=[self.bel], opex_var=50, out_max=[10e10],
+                           add_out_limit=100, eta=[0.58])
+        self.compare_builds()
+
+    def test_source_fixed(self):
+        self.remove_gas_bus()
+        source.FixedSource(uid="wind", outputs=[self.bel],
+                           val=[50, 80, 30, 0, 10, 20], out_max=[1000000],
+                           add_out_limit=0, capex=1000, opex_fix=20,
+                           lifetime=25, crf=0.08)
+        self.compare_builds()
+
+    def test_source_fixed_invest(self):
+        self.remove_gas_bus()
+        source.FixedSource.optimization_options.update({'investment': True})
+        source.FixedSource(uid="wind", outputs=[self.bel],
+                           val=[50, 80, 30, 0, 10, 20], out_max=[1000000],
+                           add_out_limit=0, capex=1000, opex_fix=20,
+                           lifetime=25, crf=0.08)
+        self.compare_builds()
+
+    def test_source_dispatch_and_commodity(self):
+        source.DispatchSource(uid="pv", outputs=[self.bel],
+                              val=[0, 0.2, 0.5, 0.7, 0.3, 0],
+                              out_max=[100], curtail_costs=5)
+        source.Commodity(uid='rgas', outputs=[self.bgas],
+                         sum_out_limit=5000)
+        transformer.Simple(uid='pp_gas', inputs=[self.bgas],
+                           outputs=[self.bel], out_max=[100], eta=[0.58])
+        self.compare_builds()
+
+    def test_storage(self):
+        self.remove_gas_bus()
+        transformer.Storage(uid='storage', inputs=[self.bel],
+                            outputs=[self.bel], eta_in=0.9, eta_out=0.8,
+                            cap_loss=0.01, cap_max=100, cap_min=10,
+                            c_rate_in=1/6, c_rate_out=1/6)
+        self.compare_builds()
+
+    def test_storage_invest(self):
+        self.remove_gas_bus()
+        transformer.Storage.optimization_options.update({'investment': True})
+        transformer.Storage(uid='storage', inputs=[self.bel],
+                            outputs=[self.bel], eta_in=0.9, eta_out=0.8,
+                            cap_loss=0.01, cap_max=0, cap_initial=0,
+                            add_cap_limit=1000, capex=1000,
+                            c_rate_in=1/6, c_rate_out=1/6)
+        self.compare_builds()
+
+    def test_chps(self):
+        bth = Bus(uid="bth", type="th", excess=True)
+        transformer.CHP(uid='chp', inputs=[self.bgas],
+                        outputs=[self.bel, bth], out_max=[30, 40],
+                        eta=[0.4, 0.3], grad_pos=10, grad_neg=10)
+        transformer.SimpleExtractionCHP(uid='chp_ext', inputs=[self.bgas],
+                                        outputs=[self.bel, bth],
+                                        out_max=[30, 40], eta=[0.4, 0.3],
+                                        beta=0.15, sigma=0.8)
+        transport.Simple(uid='line', inputs=[self.bel], outputs=[bth],
+                         out_max=[50], in_max=[60], eta=[0.9])
+        self.compare_builds()
+
+    def test_chp_gradients(self):
+        bth = Bus(uid="bth", type="th", excess=True)
+
+        def linear_constraints(om, block):
+            lc.add_simple_io_relation(om, block)
+            lc.add_simple_chp_relation(om, block)
+            lc.add_output_gradient_calc(om, block)
+
+        transformer.CHP.optimization_options.update(
+            {'linear_constr': linear_constraints})
+        transformer.CHP(uid='chp', inputs=[self.bgas],
+                        outputs=[self.bel, bth], out_max=[30, 40],
+                        eta=[0.4, 0.3], grad_pos=10, grad_neg=10)
+        self.compare_builds()
+
+    def test_variable_efficiency_chp_milp(self):
+        bth = Bus(uid="bth", type="th", excess=True)
+
+        def milp_constraints(om, block):
+            milc.add_variable_linear_eta_relation(om, block)
+            milc.set_bounds(om, block, side="output")
+            milc.set_bounds(om, block, side="input")
+            milc.add_output_gradient_constraints(om, block)
+            milc.add_startup_constraints(om, block)
+            milc.add_shutdown_constraints(om, block)
+            milc.add_minimum_uptime(om, block)
+            milc.add_minimum_downtime(om, block)
+
+        transformer.VariableEfficiencyCHP.optimization_options.update(
+            {'milp_constr': milp_constraints})
+        transformer.VariableEfficiencyCHP(
+            uid='chp_var', inputs=[self.bgas], outputs=[self.bel, bth],
+            out_max=[30, 40], out_min=[10], eta=[0.4, 0.3],
+            eta_min=[0.3, 0.3], grad_pos=10, grad_neg=10, t_min_on=2,
+            t_min_off=3, start_costs=20)
+        self.compare_builds()
+
+    def test_empty_block_bounds(self):
+        self.remove_gas_bus()
+        sink.Simple(uid="demand", inputs=[self.bel],
+                    val=[10, 20, 30, 40, 50, 60])
+        for fast_build in [False, True]:
+            self.sim.fast_build = fast_build
+            model = om.OptimizationModel(energysystem=self.energysystem)
+            model.empty = po.Block()
+            model.empty.objs = []
+            model.empty.uids = []
+            model.empty.optimization_options = {}
+            var.set_bounds(model, model.empty, side="output")
+            var.set_bounds(model, model.empty, side="input")
+
+    def test_problem_writer(self):
+        transformer.Simple(uid='pp_gas', inputs=[self.bgas],
+                           outputs=[self.bel], opex_var=50, out_max=[10e10],
+                           eta=[0.58])
+        transformer.Storage(uid='storage', inputs=[self.bel],
+                            outputs=[self.bel], eta_in=0.9, eta_out=0.8,
+                            cap_loss=0.01, cap_max=100, cap_min=10,
+                            c_rate_in=1/6, c_rate_out=1/6)
+        sink.Simple(uid="demand", inputs=[self.bel],
+                    val=[10, 20, 30, 40, 50, 60])
+        self.compare_builds(problem_writer="oemof", extension="lp")
+        self.compare_builds(problem_writer="oemof", extension="mps")
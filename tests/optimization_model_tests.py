@@ -0,0 +1,184 @@
+from nose.tools import assert_raises, eq_, ok_
+
+import filecmp
+import os.path as ospath
+import pandas as pd
+import shutil
+import tempfile
+import time
+import tracemalloc
+import pyomo.environ as po
+
+from oemof.core import energy_system as es
+from oemof.core.network.entities import Bus
+from oemof.core.network.entities.components import sinks as sink
+from oemof.core.network.entities.components import sources as source
+from oemof.core.network.entities.components import transformers as transformer
+from oemof.solph import optimization_model as om
+from oemof.solph import predefined_objectives as predefined_objectives
+from oemof.solph.build_stats import BuildStats, measure_component
+
+
+class Model_Tests:
+    """Base class of the tests of an OptimizationModel built from a gas and
+    an electricity bus."""
+
+    def setup(self):
+        self.time_index = pd.date_range('1/1/2012', periods=6, freq='H')
+        self.sim = es.Simulation(
+            timesteps=range(len(self.time_index)), solver='glpk',
+            objective_options={
+                'function': predefined_objectives.minimize_cost})
+        self.energysystem = es.EnergySystem(time_idx=self.time_index,
+                                            simulation=self.sim)
+        self.bgas = Bus(uid="bgas", type="gas", price=70, balanced=True,
+                        excess=False)
+        self.bel = Bus(uid="bel", type="el", excess=True, shortage=True,
+                       shortage_costs=1000)
+
+
+class Update_Tests(Model_Tests):
+    """Updated models have to be identical to rebuilt models."""
+
+    def test_update(self):
+        pp = transformer.Simple(uid='pp_gas', inputs=[self.bgas],
+                                outputs=[self.bel], opex_var=50,
+                                out_max=[100], eta=[0.58])
+        wind = source.FixedSource(uid="wind", outputs=[self.bel],
+                                  val=[0.5, 0.8, 0.3, 0, 0.1, 0.2],
+                                  out_max=[100])
+        storage = transformer.Storage(
+            uid='storage', inputs=[self.bel], outputs=[self.bel],
+            eta_in=0.9, eta_out=0.8, cap_loss=0.01, cap_max=100,
+            cap_min=10, cap_initial=50, c_rate_in=1/6, c_rate_out=1/6)
+        demand = sink.Simple(uid="demand", inputs=[self.bel],
+                             val=[10, 20, 30, 40, 50, 60])
+        path = tempfile.mkdtemp()
+        try:
+            for fast_build in [False, True]:
+                self.sim.fast_build = fast_build
+                model = om.OptimizationModel(energysystem=self.energysystem)
+                pp.opex_var = 40
+                pp.out_max = [80]
+                wind.val = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6]
+                storage.cap_initial = 20
+                demand.val = [60, 50, 40, 30, 20, 10]
+                model.update()
+                model.write_lp_file(path=path, filename="updated.lp")
+                model = om.OptimizationModel(energysystem=self.energysystem)
+                model.write_lp_file(path=path, filename="rebuilt.lp")
+                ok_(filecmp.cmp(ospath.join(path, "updated.lp"),
+                                ospath.join(path, "rebuilt.lp"),
+                                shallow=False))
+                pp.opex_var, pp.out_max = 50, [100]
+                wind.val = [0.5, 0.8, 0.3, 0, 0.1, 0.2]
+                storage.cap_initial = 50
+                demand.val = [10, 20, 30, 40, 50, 60]
+        finally:
+            shutil.rmtree(path)
+
+    def test_update_variable_efficiency_chp(self):
+        bth = Bus(uid="bth", type="th", excess=True)
+        chp = transformer.VariableEfficiencyCHP(
+            uid='chp_var', inputs=[self.bgas], outputs=[self.bel, bth],
+            out_max=[30, 40], out_min=[10], eta=[0.4, 0.3],
+            eta_min=[0.3, 0.3])
+        path = tempfile.mkdtemp()
+        try:
+            for fast_build in [False, True]:
+                self.sim.fast_build = fast_build
+                model = om.OptimizationModel(energysystem=self.energysystem)
+                chp.out_max, chp.out_min = [40, 50], [5]
+                chp.eta, chp.eta_min = [0.45, 0.35], [0.35, 0.3]
+                model.update()
+                model.write_lp_file(path=path, filename="updated.lp")
+                model = om.OptimizationModel(energysystem=self.energysystem)
+                model.write_lp_file(path=path, filename="rebuilt.lp")
+                ok_(filecmp.cmp(ospath.join(path, "updated.lp"),
+                                ospath.join(path, "rebuilt.lp"),
+                                shallow=False))
+                chp.out_max, chp.out_min = [30, 40], [10]
+                chp.eta, chp.eta_min = [0.4, 0.3], [0.3, 0.3]
+        finally:
+            shutil.rmtree(path)
+
+    def test_update_without_updater(self):
+        # blocks of classes without updater can not be updated
+        transformer.Simple(uid='pp_gas', inputs=[self.bgas],
+                           outputs=[self.bel], out_max=[100], eta=[0.58])
+        model = om.OptimizationModel(energysystem=self.energysystem)
+        assert_raises(ValueError, om.updater, None, model,
+                      model.component(str(transformer.Simple)))
+
+
+class Presolve_Tests(Model_Tests):
+    """Presolved models have to describe the same problem."""
+
+    def test_presolve(self):
+        transformer.Simple(uid='pp_gas', inputs=[self.bgas],
+                           outputs=[self.bel], opex_var=50, out_max=[100],
+                           eta=[0.58])
+        source.FixedSource(uid="wind", outputs=[self.bel],
+                           val=[0.5, 0.8, 0.3, 0, 0.1, 0.2], out_max=[100])
+        sink.Simple(uid="demand", inputs=[self.bel],
+                    val=[10, 20, 30, 40, 50, 60])
+        for fast_build in [False, True]:
+            self.sim.fast_build = fast_build
+            self.sim.presolve = False
+            full = om.OptimizationModel(energysystem=self.energysystem)
+            self.sim.presolve = True
+            model = om.OptimizationModel(energysystem=self.energysystem)
+            ok_(model.presolved["fixed_columns"] == 12)
+            for con in model.component_data_objects(po.Constraint,
+                                                    active=True):
+                ok_(not any(v.fixed for v in con.body._args))
+            ok_(model.to_matrices().equals(full.to_matrices()))
+            ok_(model.w["wind", "bel", 1].value == 80)
+        self.sim.presolve = False
+
+
+class BuildStats_Tests(Model_Tests):
+    """Build statistics of the phases, blocks and components."""
+
+    def test_build_stats(self):
+        self.sim.build_stats = True
+        transformer.Simple(uid='pp_gas', inputs=[self.bgas],
+                           outputs=[self.bel], opex_var=50, out_max=[100],
+                           eta=[0.58])
+        sink.Simple(uid="demand", inputs=[self.bel],
+                    val=[10, 20, 30, 40, 50, 60])
+        for fast_build in [False, True]:
+            self.sim.fast_build = fast_build
+            model = om.OptimizationModel(energysystem=self.energysystem)
+            stats = model.build_stats
+            for phase in ["add_continuous", "build_component_constraints",
+                          "build_bus_constraints", "objective_assembler"]:
+                ok_(stats[phase]["time"] >= 0)
+            block = str(transformer.Simple)
+            ok_(stats[block + ".io_relation"]["rows"] == 6)
+            ok_(stats[block + ".io_relation"]["nonzeros"] == 12)
+            ok_(stats[block]["rows"] ==
+                sum(r["rows"] for r in stats.values()
+                    if r["block"] == block))
+            ok_(stats["w"]["columns"] == len(model.w))
+            ok_(list(stats.to_dataframe().columns) == stats.COLUMNS)
+            if hasattr(tracemalloc, 'reset_peak'):
+                ok_(stats[block + ".io_relation"]["peak_memory"] >= 0)
+                ok_(stats["w"]["peak_memory"] >= 0)
+        self.sim.build_stats = False
+
+    def test_build_stats_attached_rows(self):
+        # the rows attached after the constraint was added are part of its
+        # record and not of the next one
+        model = po.ConcreteModel()
+        model.build_stats = stats = BuildStats()
+        stats.start()
+        with stats.measure("phase", "phase", model):
+            with measure_component(model, "c"):
+                model.c = po.Constraint(noruleinit=True)
+                time.sleep(0.05)
+            model.x = po.Var()
+        stats.stop()
+        ok_(stats["c"]["time"] >= 0.05)
+        ok_(stats["x"]["time"] < 0.05)
+        eq_(list(stats), ["phase", "c", "x"])